@@ -1,34 +1,47 @@
-from src.Agents.agents import BaseAgent
-from src.Agents.agents import ArticleFrequentAskedQuestionAgent, ArticleTroubleshootingGuideAgent, ArticleTroubleshootingGuideAgent
-from typing import Optional, Dict, Any
+from src.Agents.agents import AgentRegistry, BaseAgent
+from src.Agents.agents import ArticleFrequentAskedQuestionAgent, ArticleTroubleshootingGuideAgent, ArticleStepByStepTutorialAgent
+from typing import Optional, Dict, Any, Callable
 # type 1 = 'FAQ'
 # type 2 = 'Troubleshooting'
 # type 3 = 'Tutorials'
 
 class ArticleAgentFactory:
-    def __init__(self, article_type: int = None, text:str = None, context: Optional[str] = None, history: Optional[str] = None):
+    agent_classes = {
+        1: ArticleFrequentAskedQuestionAgent,
+        2: ArticleTroubleshootingGuideAgent,
+        3: ArticleStepByStepTutorialAgent,
+    }
+
+    def __init__(self, article_type: int = None, text:str = None, context: Optional[str] = None, history: Optional[str] = None,
+                 previous: Optional[str] = None):
         self.article_type = article_type
         self.text = text
         self.context = context
         self.history = history
+        self.previous = previous # previous version of text, ranks its sections when the prompt is over budget
         self.agent : BaseAgent = None
 
     def generate_article(self):
         self.make_agent(self.article_type)
-        return self.agent.invoke(self.text, self.context, self.history)
+        return self.agent.invoke(self.text, self.context, self.history, self.previous)
+
+    async def agenerate_article(self):
+        self.make_agent(self.article_type)
+        return await self.agent.ainvoke(self.text, self.context, self.history, self.previous)
+
+    def stream_article(self, store, on_token: Callable[[str], None] = None) -> str:
+        """Stream the article straight into store; returns its hash."""
+        self.make_agent(self.article_type)
+        return self.agent.stream_to(store, self.text, self.context, self.history, on_token=on_token, previous=self.previous)
 
     def make_agent(self, type_id:int):
         if type_id is None:
             raise AttributeError("type not set")
 
-        if type_id == 1:
-            self.agent = ArticleFrequentAskedQuestionAgent()
-        elif type_id == 2:
-            self.agent = ArticleTroubleshootingGuideAgent()
-        elif type_id == 3:
-            self.agent = ArticleTroubleshootingGuideAgent()
-        else:
+        agent_class = self.agent_classes.get(type_id)
+        if agent_class is None:
             raise NotImplementedError
+        self.agent = AgentRegistry.get(agent_class)
 
     def set_text(self, text:str):
         self.text = text
@@ -1,13 +1,180 @@
 import os
+import json
+import asyncio
+import httpx
+import time
 import logging
+import sqlite3
+import threading
+from hashlib import sha256
+from pathlib import Path
 #from langchain.chat_models import ChatOpenAI
 from langchain_openai import ChatOpenAI
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Callable, Iterator
 from langchain.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from concurrent.futures import ThreadPoolExecutor
+from src.service.chunker import TextChunker, stitch_markdown
+from src.service.metrics import record_llm_call
+from src.service.ratelimit import LLMCallError, RateLimiter
+from src.service.budget import PromptBudget
+from src.service.tokens import count_tokens
+
+class UsageCallback(BaseCallbackHandler):
+    """Collects the token usage the provider reports for one call."""
+
+    def __init__(self):
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def on_llm_end(self, response: LLMResult, **kwargs):
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                self.prompt_tokens += usage.get("input_tokens", 0)
+                self.completion_tokens += usage.get("output_tokens", 0)
+        if not self.prompt_tokens:
+            usage = (response.llm_output or {}).get("token_usage") or {}
+            self.prompt_tokens = usage.get("prompt_tokens", 0)
+            self.completion_tokens = usage.get("completion_tokens", 0)
+
+
+class ResponseCache:
+    """Content-addressed LLM response cache stored in SQLite next to the documents database."""
+
+    def __init__(self, db_name: str = "llm_cache.db", max_entries: int = None, max_age: float = None):
+        db_dir = os.getenv("DB_PATH", ".")
+        self._path = Path(db_dir) / db_name
+        self.max_entries = max_entries if max_entries is not None else int(os.getenv("LLM_CACHE_MAX_ENTRIES", "10000"))
+        self.max_age = max_age if max_age is not None else float(os.getenv("LLM_CACHE_MAX_AGE", str(30 * 24 * 3600)))
+        self.hits = 0
+        self.misses = 0
+        self._puts = 0
+        self._lock = threading.Lock()
+
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self._path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS response_cache ("
+            " key TEXT PRIMARY KEY, agent TEXT NOT NULL, model TEXT NOT NULL, response TEXT NOT NULL,"
+            " created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_response_cache_accessed_at ON response_cache (accessed_at)")
+
+    @staticmethod
+    def enabled() -> bool:
+        return os.getenv("LLM_CACHE", "").strip().lower() in ("1", "true", "yes", "on")
+
+    @staticmethod
+    def make_key(agent: str, model: str, prompt: Dict[str, str], inputs: Dict[str, Any]) -> str:
+        digest = sha256()
+        for part in (agent, model, json.dumps(prompt, sort_keys=True)):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        for name in sorted(inputs):
+            value = inputs[name]
+            digest.update(name.encode("utf-8"))
+            digest.update(b"\1" if value is None else sha256(value.encode("utf-8")).digest())
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT response, created_at FROM response_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            response, created_at = row
+            if self.max_age and now - created_at > self.max_age:
+                self._conn.execute("DELETE FROM response_cache WHERE key = ?", (key,))
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE response_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return response
+
+    def put(self, key: str, agent: str, model: str, response: str):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO response_cache (key, agent, model, response, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, agent, model, response, now, now),
+            )
+            self._puts += 1
+            if self._puts % 100 == 0:
+                self._evict(now)
+
+    def evict(self):
+        with self._lock:
+            self._evict(time.time())
+
+    def _evict(self, now: float):
+        if self.max_age:
+            self._conn.execute("DELETE FROM response_cache WHERE created_at < ?", (now - self.max_age,))
+        if self.max_entries:
+            self._conn.execute(
+                "DELETE FROM response_cache WHERE key IN ("
+                " SELECT key FROM response_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM response_cache")
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM response_cache").fetchone()[0]
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": entries,
+        }
+
+
+_clients: Dict[tuple, ChatOpenAI] = {}
+_clients_lock = threading.Lock()
+
+
+def get_llm(model_name: str, api_key: str) -> ChatOpenAI:
+    """One chat client, and so one pooled HTTP connection pool, per model for the whole process."""
+    key = (model_name, api_key)
+    with _clients_lock:
+        llm = _clients.get(key)
+        if llm is None:
+            max_connections = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+            limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+            # retries are done by the shared RateLimiter, not again inside the OpenAI client
+            llm = ChatOpenAI(model=model_name, temperature=0, api_key=api_key, max_retries=0,
+                             base_url=os.getenv("OPENAI_BASE_URL") or None,
+                             http_client=httpx.Client(limits=limits),
+                             http_async_client=httpx.AsyncClient(limits=limits))
+            _clients[key] = llm
+        return llm
+
 
 class BaseAgent:
     _prompt = {}
+    # Shared opt-in response cache (set LLM_CACHE=1 or assign a ResponseCache instance)
+    cache: Optional[ResponseCache] = None
+    _cache_lock = threading.Lock()
+    # compiled prompt | llm | parser chains, per agent class
+    _chains: Dict[tuple, tuple] = {}
+    _chains_lock = threading.Lock()
+
     def __init__(self, session:str = "123", name = 'BaseAgent'):
         self.name = name
         self.session = session
@@ -16,40 +183,225 @@ class BaseAgent:
         if not self._api_key:
             raise ValueError("OPEN_API_KEY environment variable not set.")
 
-        self.llm = ChatOpenAI(model=self._model_name, temperature=0, api_key=self._api_key)
+        self.llm = get_llm(self._model_name, self._api_key)
+        self.limiter = RateLimiter.shared(self._model_name)
+        self.budget = PromptBudget.for_agent(self.name, self._model_name)
         self.logger = logging.getLogger(f"agents.{self.name}")
-        self.logger.setLevel(logging.DEBUG)
 
-    def invoke(self, text: str, context: Optional[str], history: Optional[str]):
-        try:
-            messages = []
-            inputs = {}
-            for key, value in self._prompt.items():
-                self.logger.info(f"BaseAgent. Key: {key}, Value:{value}")
-                if key == "system":
-                    messages.append(("system", value))
-                else:
-                    messages.append(("human", key + ":" + value))
-                    if key == "context":
-                        inputs["context"]= context
-                    elif key == "history":
-                        inputs["history"] = history
-                    elif key == "text":
-                        inputs["text"] = text
+        if BaseAgent.cache is None and ResponseCache.enabled():
+            with BaseAgent._cache_lock:
+                if BaseAgent.cache is None:
+                    BaseAgent.cache = ResponseCache()
+
+    def _chain(self, prompt: Dict[str, str] = None, variant: str = "default"):
+        """Compile the chain of a prompt once per agent class and llm client."""
+        key = (type(self), variant)
+        entry = BaseAgent._chains.get(key)
+        if entry is None or entry[0] is not self.llm:
+            with BaseAgent._chains_lock:
+                messages = []
+                for prompt_key, value in (prompt or self._prompt).items():
+                    if prompt_key == "system":
+                        messages.append(("system", value))
+                    elif prompt_key in ("context", "history", "text"):
+                        messages.append(("human", prompt_key + ":" + value))
                     else:
-                        raise ValueError(f"Invalid prompt key '{key}'. Valid keys are: system, text, context, history")
+                        raise ValueError(f"Invalid prompt key '{prompt_key}'. Valid keys are: system, text, context, history")
+                chain = ChatPromptTemplate.from_messages(messages) | self.llm | StrOutputParser()
+                entry = (self.llm, chain)
+                BaseAgent._chains[key] = entry
+        return entry[1]
 
-            self.logger.info(f"Processing with {self.name}: {messages}")
+    def _inputs(self, text: Optional[str], context: Optional[str], history: Optional[str], prompt: Dict[str, str] = None,
+                previous: Optional[str] = None) -> Dict[str, Any]:
+        """Prompt variables; text and history are trimmed to the agent's token budget (previous ranks the sections)."""
+        values = {"text": text, "context": context, "history": history}
+        inputs = {key: values[key] for key in (prompt or self._prompt) if key in values}
+        if self.budget.max_tokens:
+            inputs, _ = self.budget.fit(prompt or self._prompt, inputs, previous)
+        return inputs
 
-            prompt = ChatPromptTemplate.from_messages(messages)
-            chain = prompt | self.llm | StrOutputParser()
-            response = chain.invoke(inputs)
+    def invoke(self, text: str, context: Optional[str], history: Optional[str], previous: Optional[str] = None) -> str:
+        """Response of the model; raises LLMCallError once the rate limiter gives up on the call.
 
-            self.logger.info(f"{self.name} response: {response}")
-            return response
+        previous is the earlier version of text, used to keep its changed sections when the prompt must be trimmed.
+        """
+        return self._invoke(self._inputs(text, context, history, previous=previous))
+
+    def _invoke(self, inputs: Dict[str, Any], prompt: Dict[str, str] = None, variant: str = "default") -> str:
+        """invoke of prepared inputs, with another prompt of the agent when given (compiled once as variant)."""
+        started = time.perf_counter()
+        prompt = prompt or self._prompt
+        chain = self._chain(prompt, variant)
+        cache_key, cached = self._cached(started, inputs, prompt)
+        if cached is not None:
+            return cached
+
+        usage = UsageCallback()
+        estimated_tokens = self._estimate_tokens(inputs, prompt)
+        try:
+            response = self.limiter.call(
+                self.name, lambda: chain.invoke(inputs, config={"callbacks": [usage]}),
+                estimated_tokens=estimated_tokens, used_tokens=lambda: usage.total_tokens or estimated_tokens)
+        except LLMCallError as e:
+            record_llm_call(self.name, self._model_name, time.perf_counter() - started, outcome="error")
+            self.logger.error(f"Error in {self.name}: {e}")
+            raise
+        return self._finish(started, inputs, usage, response, prompt, cache_key)
+
+    async def ainvoke(self, text: str, context: Optional[str], history: Optional[str], previous: Optional[str] = None) -> str:
+        """Async counterpart of invoke: the call and the waits for the rate limiter do not block the event loop."""
+        return await self._ainvoke(self._inputs(text, context, history, previous=previous))
+
+    async def _ainvoke(self, inputs: Dict[str, Any], prompt: Dict[str, str] = None, variant: str = "default") -> str:
+        started = time.perf_counter()
+        prompt = prompt or self._prompt
+        chain = self._chain(prompt, variant)
+        cache_key, cached = self._cached(started, inputs, prompt)
+        if cached is not None:
+            return cached
+
+        usage = UsageCallback()
+        estimated_tokens = self._estimate_tokens(inputs, prompt)
+        try:
+            response = await self.limiter.acall(
+                self.name, lambda: chain.ainvoke(inputs, config={"callbacks": [usage]}),
+                estimated_tokens=estimated_tokens, used_tokens=lambda: usage.total_tokens or estimated_tokens)
+        except LLMCallError as e:
+            record_llm_call(self.name, self._model_name, time.perf_counter() - started, outcome="error")
+            self.logger.error(f"Error in {self.name}: {e}")
+            raise
+        return self._finish(started, inputs, usage, response, prompt, cache_key)
+
+    def _cached(self, started: float, inputs: Dict[str, Any], prompt: Dict[str, str]):
+        """(cache key, cached response); both None when the cache is off, the response None on a miss."""
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("Processing with %s: %s", self.name, inputs)
+        if self.cache is None:
+            return None, None
+        cache_key = ResponseCache.make_key(self.name, self._model_name, prompt, inputs)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            self.logger.debug("%s response served from cache", self.name)
+            record_llm_call(self.name, self._model_name, time.perf_counter() - started, outcome="cached")
+        return cache_key, cached
+
+    def _finish(self, started: float, inputs: Dict[str, Any], usage: "UsageCallback", response: str,
+                prompt: Dict[str, str], cache_key: Optional[str]) -> str:
+        self._record(started, inputs, usage, response, prompt=prompt)
+
+        # only successful responses reach the cache
+        if cache_key is not None:
+            self.cache.put(cache_key, self.name, self._model_name, response)
+
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("%s response: %s", self.name, response)
+        return response
+
+    def _prompt_tokens(self, inputs: Dict[str, Any], prompt: Dict[str, str] = None) -> int:
+        return sum(count_tokens(v, self._model_name) for v in list((prompt or self._prompt).values()) + list(inputs.values()))
+
+    def _estimate_tokens(self, inputs: Dict[str, Any], prompt: Dict[str, str] = None) -> int:
+        """Prompt plus expected completion tokens, only needed when a tokens/min budget is set."""
+        if self.limiter.tokens is None:
+            return 0
+        return self._prompt_tokens(inputs, prompt) + int(os.getenv("LLM_EXPECTED_COMPLETION_TOKENS", "1000"))
+
+    def _record(self, started: float, inputs: Dict[str, Any], usage: "UsageCallback", response: str = None,
+                completion_tokens: int = 0, prompt: Dict[str, str] = None):
+        """Latency, tokens and cost of one call; tokens come from the response metadata or are counted locally."""
+        prompt_tokens, reported_completion = usage.prompt_tokens, usage.completion_tokens
+        if not prompt_tokens:
+            prompt_tokens = self._prompt_tokens(inputs, prompt)
+        if not reported_completion:
+            reported_completion = completion_tokens or count_tokens(response, self._model_name)
+        record_llm_call(self.name, self._model_name, time.perf_counter() - started, prompt_tokens, reported_completion)
+
+    def stream(self, text: str, context: Optional[str], history: Optional[str], previous: Optional[str] = None) -> Iterator[str]:
+        """Yield the response piece by piece as the model produces it (a cached response is one piece).
+
+        Opening the stream goes through the rate limiter and is retried until the first piece arrives; a failure
+        after that cannot be retried transparently and raises LLMCallError. The call holds its rate limiter slot
+        until the last piece was read.
+        """
+        started = time.perf_counter()
+        inputs = self._inputs(text, context, history, previous=previous)
+        cache_key = None
+        if self.cache is not None:
+            cache_key = ResponseCache.make_key(self.name, self._model_name, self._prompt, inputs)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                record_llm_call(self.name, self._model_name, time.perf_counter() - started, outcome="cached")
+                yield cached
+                return
+        # the cache stores whole responses, so the pieces are only kept when it is on
+        pieces = [] if cache_key is not None else None
+        usage = UsageCallback()
+        completion_tokens = 0
+
+        def used_tokens() -> int:  # streamed responses rarely report usage, the pieces are counted instead
+            return usage.total_tokens or self._prompt_tokens(inputs) + completion_tokens
+
+        stream = self.limiter.stream(self.name, lambda: self._chain().stream(inputs, config={"callbacks": [usage]}),
+                                     estimated_tokens=self._estimate_tokens(inputs), used_tokens=used_tokens)
+        try:
+            for piece in stream:
+                if pieces is not None:
+                    pieces.append(piece)
+                completion_tokens += count_tokens(piece, self._model_name)
+                yield piece
         except Exception as e:
+            record_llm_call(self.name, self._model_name, time.perf_counter() - started, outcome="error")
             self.logger.error(f"Error in {self.name}: {e}")
-            return f"Error in {self.name}: {e}"
+            if isinstance(e, LLMCallError):
+                raise
+            raise LLMCallError(self.name, f"stream interrupted: {e}", cause=e) from e
+        finally:
+            stream.close()  # frees the call slot at once when the caller stops reading early
+        self._record(started, inputs, usage, completion_tokens=completion_tokens)
+        if cache_key is not None:
+            self.cache.put(cache_key, self.name, self._model_name, "".join(pieces))
+
+    def stream_to(self, store, text: str, context: Optional[str], history: Optional[str],
+                  on_token: Callable[[str], None] = None, previous: Optional[str] = None) -> str:
+        """Stream the response into a blob of store (BlobStore or MarkdownHandler) and return its hash.
+
+        on_token sees every piece as it arrives. On LLMCallError the partial blob is dropped.
+        """
+        with store.open_stream() as blob:
+            for piece in self.stream(text, context, history, previous):
+                blob.write(piece)
+                if on_token is not None:
+                    on_token(piece)
+            return blob.commit()
+
+
+class AgentRegistry:
+    """Process-wide agent instances; agents are stateless between calls and safe to share across threads."""
+
+    _agents: Dict[type, BaseAgent] = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def get(cls, agent_class: type) -> BaseAgent:
+        agent = cls._agents.get(agent_class)
+        if agent is None:
+            with cls._lock:
+                agent = cls._agents.get(agent_class)
+                if agent is None:
+                    agent = agent_class()
+                    cls._agents[agent_class] = agent
+        return agent
+
+    @classmethod
+    def clear(cls):
+        with cls._lock:
+            cls._agents.clear()
+        with _clients_lock:
+            _clients.clear()
+        with BaseAgent._chains_lock:
+            BaseAgent._chains.clear()
+        RateLimiter.reset()
 
 class FeatureDetectorAgent(BaseAgent):
     def __init__(self, session:str = "123"):
@@ -83,6 +435,40 @@ class FeatureDetectorAgent(BaseAgent):
             "context": "{context}",
             "text": "{text}"
         }
+        self._batch_prompt = {
+            "system": (
+                "You analyze several software product documents at once. For EACH document select exactly ONE Subject "
+                "and ONE Feature from the options provided in the context hierarchy.\n\n"
+                "CONTEXT FORMAT (hierarchy):\n"
+                "subject: <Subject A>\n"
+                "   feature: <Feature A1>\n"
+                "subject: <Subject B>\n"
+                "   feature: <Feature B1>\n"
+                "   ...\n\n"
+                "TEXT FORMAT: the documents follow each other, each one starts with a line\n"
+                "=== document <n> ===\n\n"
+                "INSTRUCTIONS (STRICT):\n"
+                "1) Classify every document on its own; documents do not influence each other.\n"
+                "2) You MUST choose from the provided Subjects and their listed Features ONLY, with their exact wording.\n"
+                "3) The chosen Feature MUST belong to the chosen Subject in the hierarchy.\n"
+                "4) Prefer exact phrase matches; if several candidates match, pick the one most central to the document.\n\n"
+                "OUTPUT FORMAT:\n"
+                "Return ONLY a valid JSON array with one object per document, in document order:\n"
+                "[{{\"document\": 1, \"subject\": \"<Subject Name>\", \"feature\": \"<Feature Name>\"}}, ...]\n"
+                "No explanations, no extra text, no markdown — JSON only."
+            ),
+            "context": "{context}",
+            "text": "{text}"
+        }
+
+    @staticmethod
+    def pack(texts: List[str]) -> str:
+        return "\n\n".join(f"=== document {i} ===\n{text}" for i, text in enumerate(texts, start=1))
+
+    def detect_many(self, texts: List[str], context: str) -> str:
+        """One call classifying all texts; the response is the JSON array described in the batch prompt."""
+        return self._invoke(self._inputs(self.pack(texts), context, None, prompt=self._batch_prompt),
+                            prompt=self._batch_prompt, variant="batch")
 
 class DocumentCleanerAgent(BaseAgent):
     def __init__(self, session:str = "123"):
@@ -106,6 +492,45 @@ class DocumentCleanerAgent(BaseAgent):
             "text": "{text}"
         }
 
+    def invoke(self, text: str, context: Optional[str], history: Optional[str], max_tokens: int = None, max_workers: int = None):
+        # large documents are cleaned as heading-aligned chunks in parallel and stitched back together
+        chunks = self._chunker(max_tokens).chunk(text) if text else [text]
+        if len(chunks) == 1:
+            return super().invoke(text, context, history)
+
+        max_workers = max_workers or int(os.getenv("CLEANER_MAX_WORKERS", "4"))
+        self.logger.info(f"{self.name}: cleaning {len(chunks)} chunks with {max_workers} workers")
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(chunks)), thread_name_prefix="cleaner") as pool:
+            parts = list(pool.map(lambda chunk: super(DocumentCleanerAgent, self).invoke(chunk, context, history), chunks))
+
+        return stitch_markdown(parts)
+
+    async def ainvoke(self, text: str, context: Optional[str], history: Optional[str], max_tokens: int = None,
+                      max_workers: int = None):
+        """Async counterpart of invoke: the chunks are cleaned as concurrent calls, at most max_workers at a time."""
+        chunks = self._chunker(max_tokens).chunk(text) if text else [text]
+        if len(chunks) == 1:
+            return await super().ainvoke(text, context, history)
+
+        slots = asyncio.Semaphore(max_workers or int(os.getenv("CLEANER_MAX_WORKERS", "4")))
+
+        async def clean(chunk: str) -> str:
+            async with slots:
+                return await super(DocumentCleanerAgent, self).ainvoke(chunk, context, history)
+
+        self.logger.info(f"{self.name}: cleaning {len(chunks)} chunks")
+        return stitch_markdown(await asyncio.gather(*(clean(chunk) for chunk in chunks)))
+
+    def _chunker(self, max_tokens: int = None) -> TextChunker:
+        """Chunker whose chunks also fit the agent's prompt budget; the raw text has no sections the budget could
+        outline or drop, so an oversized chunk would lose its end."""
+        chunker = TextChunker(max_tokens, self._model_name)
+        if self.budget.max_tokens:
+            room = self.budget.max_tokens - sum(self.budget.count(v) for v in self._prompt.values())
+            if room > 0:  # else the budget is misconfigured and PromptBudget.fit leaves the prompt alone
+                chunker.max_tokens = min(chunker.max_tokens, room)
+        return chunker
+
 class DocumentMergeAgent(BaseAgent):
     def __init__(self, session: str = "123"):
         super().__init__(session, name="DocumentMergeAgent")
@@ -0,0 +1,257 @@
+from __future__ import annotations
+
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+from pathlib import Path
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Dict, List, Optional, Iterable
+from transitions.extensions.asyncio import AsyncMachine
+
+from dotenv import load_dotenv
+from sqlmodel import Session
+from src.Agents.agents import AgentRegistry, DocumentCleanerAgent
+from src.batch import collect_pdfs
+from src.flow import FlowState
+from src.repository.DBConnection import DBConnection
+from src.repository.DBInit import DBInit
+from src.repository.FingerprintRepository import FingerprintRepository, file_digest, text_digest
+from src.service.articles import ArticleService, ArticleGenerationError
+from src.service.detection import FeatureDetectionService
+from src.service.metrics import metrics, record_stage
+from src.service.near_duplicates import MinHasher, NearDuplicateIndex, match_source
+from src.service.pipeline import DocumentResult, IngestionPipeline, extract_pdf
+from src.service.render import RenderQueue
+from src.service.taxonomy import Taxonomy
+
+
+class AsyncFlow:
+    """Flow of one PDF on an asyncio event loop, without the questions; many flows share one loop and process.
+
+    Every on_enter_* callback only does the work of its stage and run() drives the machine with next() until a
+    final state, instead of the callbacks chaining next() themselves. Agent calls are awaited, the PDF is extracted
+    in an executor, sessions are never held across an LLM call, and the texts are released as soon as no later
+    stage needs them (raw_text after well_forming, well_formed_text after generate_articles).
+    """
+
+    nodes = ["start", "pars_pdf", "well_forming", "feature_detecting", "generate_articles", "end", "failed"]
+
+    def __init__(self, connection: DBConnection, pdf_path, force: bool = False, max_workers: int = None,
+                 renderer: Optional[RenderQueue] = None, extractor: Optional[Executor] = None,
+                 feature_locks: Dict[int, asyncio.Lock] = None):
+        self.dbconnection = connection
+        self.flow_state = FlowState(pdf_path=Path(pdf_path))
+        self.result = DocumentResult(pdf_path=str(pdf_path))
+        self.force = force  # regenerate sources that did not change
+        self.max_workers = max_workers  # concurrent article types, defaults to ARTICLE_CONCURRENCY
+        self.renderer = renderer  # None only stores the Markdown
+        self.extractor = extractor  # None extracts in the loop's default thread pool
+        # two flows of the same feature must not race on the article versions
+        self.feature_locks = feature_locks if feature_locks is not None else {}
+        self.logger = logging.getLogger("AsyncFlow")
+        self._unchanged = False
+
+        self.machine = AsyncMachine(model=self, states=self.nodes, initial="start")
+        self.machine.add_transition("next", "start", "pars_pdf")
+        self.machine.add_transition("next", "pars_pdf", "end", conditions="source_unchanged")
+        self.machine.add_transition("next", "pars_pdf", "well_forming")
+        self.machine.add_transition("next", "well_forming", "feature_detecting")
+        self.machine.add_transition("next", "feature_detecting", "generate_articles")
+        self.machine.add_transition("next", "generate_articles", "end")
+        self.machine.add_transition("fail", "*", "failed")
+
+    async def run(self) -> DocumentResult:
+        while self.state not in ("end", "failed"):
+            started = time.perf_counter()
+            try:
+                await self.next()
+            except Exception as e:
+                # the state is already the stage whose on_enter callback failed
+                self.result.timings[self.state] = time.perf_counter() - started
+                self.result.error = f"{self.state}: {e}"
+                self.logger.error(f"{self.result.pdf_path} failed at {self.state}: {e}")
+                await self.fail()
+                break
+            if self.state not in ("end", "failed"):
+                self.result.timings[self.state] = time.perf_counter() - started
+        return self.result
+
+    # Callbacks =======================================================
+    async def on_enter_pars_pdf(self):
+        state = self.flow_state
+        loop = asyncio.get_running_loop()
+        state.pdf_hash = self.result.pdf_hash = await loop.run_in_executor(None, file_digest, state.pdf_path)
+        if self._current_source(pdf_hash=state.pdf_hash):  # nothing to extract
+            return
+        state.raw_text = await loop.run_in_executor(self.extractor, extract_pdf, str(state.pdf_path))
+        state.text_hash = self.result.text_hash = text_digest(state.raw_text)
+        if self._current_source(text_hash=state.text_hash):
+            return
+        with Session(self.dbconnection.read_engine) as session:
+            match = state.source_match = match_source(session, state.raw_text)
+        if match.duplicate is not None:
+            self.result.near_duplicate_of = match.duplicate.source_name
+            self.result.similarity = round(match.duplicate.similarity, 4)
+        if match.skip:
+            self._current_source(feature_id=match.feature_id)
+
+    async def on_enter_well_forming(self):
+        state = self.flow_state
+        state.well_formed_text = await AgentRegistry.get(DocumentCleanerAgent).ainvoke(
+            text=state.raw_text, context=None, history=None)
+        state.raw_text = ""
+
+    async def on_enter_feature_detecting(self):
+        state = self.flow_state
+        match = state.source_match
+        feature = None
+        with Session(self.dbconnection.read_engine) as session:
+            if match is not None and match.feature_id is not None:  # near duplicate of an ingested source
+                feature = Taxonomy.for_session(session).features.get(match.feature_id)
+            if feature is None:
+                feature = await FeatureDetectionService(session).adetect(state.well_formed_text)
+        if feature is None:
+            raise ValueError("Detected feature is not in the catalog")
+        state.feature = feature
+        self.result.feature, self.result.subject = feature.name, feature.subject.name
+
+    async def on_enter_generate_articles(self):
+        state = self.flow_state
+        feature = state.feature
+        writer = self.dbconnection.writer
+        engine = self.dbconnection.read_engine if writer else self.dbconnection.engine
+        service = ArticleService(engine, max_workers=self.max_workers, renderer=self.renderer, writer=writer)
+        lock = self.feature_locks.setdefault(feature.feature_id, asyncio.Lock())
+        async with lock:
+            try:
+                generated = await service.agenerate(feature, state.well_formed_text)
+            except ArticleGenerationError as e:
+                # the article types that succeeded are committed; keep them in the result
+                self.result.articles = IngestionPipeline._articles(e.generated)
+                raise
+        self.result.articles = IngestionPipeline._articles(generated)
+        self.remember_source()
+        state.well_formed_text = ""
+
+    def on_enter_end(self):
+        self.result.status = "unchanged" if self._unchanged else "ok"
+        self._release()
+
+    def on_enter_failed(self):
+        self.result.status = "error"
+        self._release()
+
+    def remember_source(self):
+        state = self.flow_state
+        with Session(self.dbconnection.engine) as session:
+            FingerprintRepository(session).add(state.feature.feature_id, state.pdf_hash, state.text_hash,
+                                               str(state.pdf_path), MinHasher.to_bytes(state.source_match.signature))
+            session.commit()
+            NearDuplicateIndex.for_session(session, check_interval=0)
+
+    # Guards functions ===============================================
+    def source_unchanged(self) -> bool:
+        return self._unchanged
+
+    # Utility functions ==============================================
+    def _current_source(self, pdf_hash: str = None, text_hash: str = None, feature_id: int = None) -> bool:
+        """Whether the source is still the last one ingested for a feature (or is a near duplicate of it)."""
+        if self.force:
+            return False
+        with Session(self.dbconnection.read_engine) as session:
+            if feature_id is None:
+                fingerprint = FingerprintRepository(session).find_current(pdf_hash=pdf_hash, text_hash=text_hash)
+                if fingerprint is None:
+                    return False
+                feature_id = fingerprint.feature_id
+            feature = Taxonomy.for_session(session).features.get(feature_id)
+        if feature is not None:
+            self.result.feature, self.result.subject = feature.name, feature.subject.name
+        metrics.inc("kb_documents_unchanged_total", help="Documents skipped because their source did not change")
+        self._unchanged = True
+        return True
+
+    def _release(self):
+        state = self.flow_state
+        state.raw_text = state.well_formed_text = ""
+        state.source_match = None
+
+
+async def run_flows(connection: DBConnection, pdf_paths: Iterable[Path], concurrency: int = None, force: bool = False,
+                    article_concurrency: int = None, renderer: Optional[RenderQueue] = None,
+                    extractor: Optional[Executor] = None) -> List[DocumentResult]:
+    """Run one AsyncFlow per PDF on the current event loop, at most concurrency (FLOW_CONCURRENCY) at a time.
+
+    A flow only exists while it holds one of the slots, so memory grows with concurrency, not with the number of
+    PDFs; the LLM calls of all flows share the rate limiter of their model.
+    """
+    slots = asyncio.Semaphore(concurrency or int(os.getenv("FLOW_CONCURRENCY", "100")))
+    feature_locks: Dict[int, asyncio.Lock] = {}
+
+    async def run(pdf_path) -> DocumentResult:
+        async with slots:
+            flow = AsyncFlow(connection, pdf_path, force=force, max_workers=article_concurrency, renderer=renderer,
+                             extractor=extractor, feature_locks=feature_locks)
+            result = await flow.run()
+        result.timings["total"] = sum(v for k, v in result.timings.items() if k != "total")
+        for stage, seconds in result.timings.items():
+            record_stage("async_flow", stage, seconds)
+        metrics.inc("kb_documents_total", help="Ingested documents by outcome", status=result.status)
+        return result
+
+    return list(await asyncio.gather(*(run(pdf_path) for pdf_path in pdf_paths)))
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Ingest many PDFs as concurrent flows on one event loop.")
+    parser.add_argument("sources", nargs="+", help="PDF files, directories or glob patterns")
+    parser.add_argument("-r", "--recursive", action="store_true", help="search directories recursively")
+    parser.add_argument("--concurrency", type=int, default=None, help="flows in progress at once (FLOW_CONCURRENCY)")
+    parser.add_argument("--extract-workers", type=int, default=None, help="PDF extraction processes (EXTRACT_WORKERS)")
+    parser.add_argument("--article-concurrency", type=int, default=None, help="article types per feature at once (ARTICLE_CONCURRENCY)")
+    parser.add_argument("--force", action="store_true", help="regenerate documents whose source did not change")
+    parser.add_argument("--manifest", type=Path, default=None, help="per-document results (JSON lines)")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    logging.getLogger("transitions").disabled = True
+    logging.getLogger("transitions.core").disabled = True
+    logging.getLogger("transitions.extensions.asyncio").disabled = True
+    logging.getLogger("agents").setLevel(logging.ERROR)
+    logging.getLogger("agents").propagate = False
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    logging.getLogger("openai").setLevel(logging.WARNING)
+    logging.basicConfig(level=logging.INFO, stream=sys.stdout, format=" -[%(levelname)s]: %(message)s")
+    logger = logging.getLogger("AsyncFlow")
+
+    pdf_paths = collect_pdfs(args.sources, args.recursive)
+    if not pdf_paths:
+        logger.error("No PDF found.")
+        return 1
+    dbconnection = DBConnection()
+    DBInit(dbconnection).initialize()
+
+    started = time.perf_counter()
+    workers = args.extract_workers or int(os.getenv("EXTRACT_WORKERS", str(os.cpu_count() or 1)))
+    with ProcessPoolExecutor(max_workers=max(1, min(workers, len(pdf_paths)))) as extractor:
+        results = asyncio.run(run_flows(dbconnection, pdf_paths, args.concurrency, args.force,
+                                        args.article_concurrency, extractor=extractor))
+    elapsed = time.perf_counter() - started
+
+    if args.manifest is not None:
+        args.manifest.parent.mkdir(parents=True, exist_ok=True)
+        args.manifest.write_text("".join(json.dumps(r.to_dict()) + "\n" for r in results), encoding="utf-8")
+    counts: Dict[str, int] = {}
+    for result in results:
+        counts[result.status] = counts.get(result.status, 0) + 1
+    logger.info(f"{len(results)} document(s) in {elapsed:.1f}s: "
+                + ", ".join(f"{n} {status}" for status, n in sorted(counts.items())))
+    return 1 if counts.get("error") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
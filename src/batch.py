@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import os
+import sys
+import glob
+import logging
+import argparse
+from pathlib import Path
+from typing import List
+
+from dotenv import load_dotenv
+from src.repository.DBConnection import DBConnection
+from src.repository.DBInit import DBInit
+from src.service.pipeline import IngestionPipeline
+from src.service.checkpoints import new_run_id
+from src.service.render import RenderQueue
+from src.service.metrics import MetricsExporter
+
+
+def collect_pdfs(sources: List[str], recursive: bool = False) -> List[Path]:
+    paths = []
+    for source in sources:
+        candidate = Path(source).expanduser()
+        if candidate.is_dir():
+            pattern = "**/*.pdf" if recursive else "*.pdf"
+            paths.extend(sorted(candidate.glob(pattern)))
+        elif candidate.is_file():
+            paths.append(candidate)
+        else:
+            paths.extend(Path(p) for p in sorted(glob.glob(str(candidate), recursive=recursive)))
+    unique = dict.fromkeys(p.resolve() for p in paths if p.suffix.lower() == ".pdf")
+    return list(unique)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Headless batch ingestion of Confluence PDF exports.")
+    parser.add_argument("sources", nargs="+", help="PDF files, directories or glob patterns")
+    parser.add_argument("-r", "--recursive", action="store_true", help="search directories recursively")
+    parser.add_argument("--manifest", default="batch_manifest.jsonl", help="per-document result manifest (JSON lines)")
+    parser.add_argument("--extract-workers", type=int, default=None, help="PDF extraction processes (EXTRACT_WORKERS)")
+    parser.add_argument("--llm-concurrency", type=int, default=None, help="documents in the LLM stages at once (LLM_CONCURRENCY)")
+    parser.add_argument("--article-concurrency", type=int, default=None, help="article types per feature at once (ARTICLE_CONCURRENCY)")
+    parser.add_argument("--detect-batch", type=int, default=None, help="documents per feature detection call (DETECT_BATCH_SIZE, 1 = off)")
+    parser.add_argument("--force", action="store_true", help="regenerate documents whose source did not change")
+    parser.add_argument("--run-id", default=None,
+                        help="resume the interrupted run with this id: its finished documents and stages are skipped")
+    parser.add_argument("--render", nargs="?", const="pdf", choices=["pdf", "html"], default=None,
+                        help="render generated articles in the background (pdf, or html for a fast review)")
+    parser.add_argument("--render-bundle", default=None, metavar="NAME",
+                        help="render all articles of the run into one document NAME (one pandoc/LaTeX start-up)")
+    parser.add_argument("--metrics", default=os.getenv("METRICS_PATH"), type=Path,
+                        help="directory for metrics.json and metrics.prom, refreshed during the run (METRICS_PATH)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    load_dotenv()
+    args = parse_args(argv)
+
+    logging.getLogger("agents").setLevel(logging.ERROR)
+    logging.getLogger("agents").propagate = False
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    logging.getLogger("openai").setLevel(logging.WARNING)
+    logging.basicConfig(level=logging.INFO, stream=sys.stdout, format=" -[%(levelname)s]: %(message)s")
+    logger = logging.getLogger("Batch")
+
+    pdf_paths = collect_pdfs(args.sources, args.recursive)
+    if not pdf_paths:
+        logger.error("No PDF found.")
+        return 1
+
+    dbconnection = DBConnection()
+    DBInit(dbconnection).initialize()
+
+    run_id = args.run_id or new_run_id()
+    logger.info(f"Ingesting {len(pdf_paths)} PDF(s) in run {run_id} (if interrupted, resume with --run-id {run_id}) ...")
+    pipeline = IngestionPipeline(dbconnection, extract_workers=args.extract_workers, llm_concurrency=args.llm_concurrency,
+                                 article_concurrency=args.article_concurrency, detect_batch_size=args.detect_batch,
+                                 force=args.force, run_id=run_id,
+                                 render_bundle=args.render_bundle,
+                                 renderer=RenderQueue(fmt=args.render) if args.render or args.render_bundle else None)
+    exporter = MetricsExporter(args.metrics).start() if args.metrics else None
+    try:
+        results = pipeline.run(pdf_paths, manifest_path=Path(args.manifest))
+    finally:
+        if exporter is not None:
+            logger.info(f"Metrics: {', '.join(map(str, exporter.stop()))}")
+
+    failed = [r for r in results if r.status == "error"]
+    unchanged = sum(r.status == "unchanged" for r in results)
+    resumed = sum("done" in r.resumed for r in results)
+    if resumed:
+        logger.info(f"{resumed} document(s) were already finished in run {run_id}.")
+    logger.info(f"Done: {len(results) - len(failed) - unchanged} succeeded, {unchanged} unchanged, {len(failed)} failed. "
+                f"Manifest: {args.manifest}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,62 @@
+import os
+import sys
+import csv
+import json
+import time
+import random
+import argparse
+import tempfile
+from pathlib import Path
+
+from src.repository.CatalogImporter import Catalog, CatalogImporter
+from src.repository.DBConnection import DBConnection
+from src.repository.DBInit import DBInit
+
+
+def write_catalog(path: Path, subjects: int, features: int, changed: float = 0.0, seed: int = 0):
+    """Synthetic CSV catalog; changed renames that share of the features."""
+    rng = random.Random(seed)
+    renamed = set(rng.sample(range(1, features + 1), int(features * changed)))
+    with open(path, "w", newline="", encoding="utf-8") as file:
+        writer = csv.writer(file)
+        writer.writerow(["subject_id", "subject", "subject_description", "feature_id", "feature", "types"])
+        for feature_id in range(1, features + 1):
+            subject_id = feature_id % subjects
+            name = f"Feature {feature_id}" + (" (renamed)" if feature_id in renamed else "")
+            types = "1;3" if feature_id % 4 == 0 else "3"
+            writer.writerow([subject_id, f"Subject {subject_id}", f"Area {subject_id}", feature_id, name, types])
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Catalog sync time for a synthetic taxonomy.")
+    parser.add_argument("--subjects", type=int, default=200)
+    parser.add_argument("--features", type=int, default=10000)
+    parser.add_argument("--changed", type=float, default=0.01, help="share of features renamed for the incremental sync")
+    args = parser.parse_args(argv)
+
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        os.environ["DB_PATH"] = work_dir
+        connection = DBConnection()
+        DBInit(connection).initialize()
+        importer = CatalogImporter(connection.engine)
+        full, incremental = Path(work_dir) / "full.csv", Path(work_dir) / "changed.csv"
+        write_catalog(full, args.subjects, args.features)
+        write_catalog(incremental, args.subjects, args.features, changed=args.changed)
+
+        for step, path, prune in (("initial", full, True), ("unchanged", full, True), ("incremental", incremental, True)):
+            started = time.perf_counter()
+            catalog = Catalog.load(path)
+            loaded = time.perf_counter()
+            diff = importer.sync(catalog, prune=prune)
+            done = time.perf_counter()
+            results.append({"step": step, "load_seconds": round(loaded - started, 3),
+                            "sync_seconds": round(done - loaded, 3), **diff.summary()})
+        connection.engine.dispose()
+
+    print(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
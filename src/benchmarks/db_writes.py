@@ -0,0 +1,97 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+from pathlib import Path
+from sqlmodel import Session
+
+from src.model.Article import Article
+from src.repository.ArticleRepository import ArticleRepository
+from src.repository.ArticleWriter import ArticleWrite
+from src.repository.DBConnection import DBConnection
+from src.repository.DBInit import DBInit
+
+# (feature_id, type_id) pairs seeded by DBInit
+TARGETS = [(feature_id, 3) for feature_id in range(1, 19)] + [(5, 1), (6, 1)]
+
+
+def direct_write(engine, write: ArticleWrite):
+    """What every worker did before the writer existed: its own session and commit."""
+    with Session(engine) as session:
+        repository = ArticleRepository(session)
+        article = repository.get_latest(write.feature_id, write.type_id) or Article(feature_id=write.feature_id, type_id=write.type_id)
+        article.hash_file_document = write.hash_file_document
+        article.hash_file_article = write.hash_file_article
+        article.version += 1
+        repository.add_version(article)
+        session.commit()
+
+
+def run(mode: str, producers: int, writes: int) -> dict:
+    with tempfile.TemporaryDirectory() as db_dir:
+        os.environ["DB_PATH"] = db_dir
+        connection = DBConnection(concurrent=(mode == "writer"))
+        DBInit(connection).initialize()
+        writer = connection.writer
+        errors = []
+
+        def produce(index: int):
+            for i in range(writes):
+                feature_id, type_id = TARGETS[(index + i) % len(TARGETS)]
+                write = ArticleWrite(feature_id, type_id, f"doc-{index}-{i}", f"art-{index}-{i}")
+                try:
+                    if writer is not None:
+                        writer.write(write)
+                    else:
+                        direct_write(connection.engine, write)
+                except Exception as e:
+                    errors.append(str(e).splitlines()[0])
+
+        threads = [threading.Thread(target=produce, args=(i,)) for i in range(producers)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        transactions = writer.transactions if writer is not None else producers * writes - len(errors)
+        if writer is not None:
+            writer.close()
+        connection.engine.dispose()
+        committed = producers * writes - len(errors)
+        return {
+            "mode": mode,
+            "producers": producers,
+            "writes": producers * writes,
+            "committed": committed,
+            "errors": len(errors),
+            "first_error": errors[0] if errors else None,
+            "transactions": transactions,
+            "seconds": round(elapsed, 3),
+            "writes_per_second": round(committed / elapsed, 1) if elapsed else None,
+        }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Article write throughput with N concurrent producers.")
+    parser.add_argument("--producers", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--writes", type=int, default=50, help="writes per producer")
+    parser.add_argument("--modes", nargs="+", default=["direct", "writer"], choices=["direct", "writer"])
+    parser.add_argument("--output", type=Path, default=None, help="also save the results as JSON")
+    args = parser.parse_args(argv)
+
+    results = [run(mode, n, args.writes) for n in args.producers for mode in args.modes]
+    for r in results:
+        print(f"{r['mode']:>6} producers={r['producers']:>3} committed={r['committed']:>5} errors={r['errors']:>4} "
+              f"transactions={r['transactions']:>5} {r['writes_per_second']:>8} writes/s")
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+from src.benchmarks import fake_llm, pdfs
+from src.repository.DBConnection import DBConnection
+from src.repository.DBInit import DBInit
+
+
+def pipeline(args) -> int:
+    """The batch pipeline over the same PDFs for each batch size, each into a fresh database: batching must not make
+    the documents wait longer for detection than the calls it saves."""
+    from pathlib import Path
+    from src.service.metrics import metrics
+    from src.service.pipeline import IngestionPipeline
+
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        os.environ.update(DB_PATH=work_dir, HASH_PATH=work_dir)
+        os.environ.setdefault("OPEN_API_KEY", "offline")
+        fake_llm.install(fake_llm.FakeChatModel(latency=args.latency, tokens_per_second=0))
+        paths = pdfs.generate(Path(work_dir) / "pdfs", "small", args.docs)
+        for batch_size in args.batch_sizes:
+            connection = DBConnection(db_name=f"batch-{batch_size}.db")
+            DBInit(connection).initialize()
+            metrics.reset()
+            started = time.perf_counter()
+            IngestionPipeline(connection, detect_batch_size=batch_size).run(paths)
+            elapsed = time.perf_counter() - started
+            registry = metrics.to_dict()
+            calls = sum(s["value"] for s in registry.get("kb_llm_calls_total", {}).get("series", [])
+                        if s["labels"]["agent"] == "FeatureDetectorAgent")
+            detecting = [s["mean"] for s in registry.get("kb_stage_seconds", {}).get("series", [])
+                         if s["labels"]["component"] == "pipeline" and s["labels"]["stage"] == "feature_detecting"]
+            results.append({"batch_size": batch_size, "seconds": round(elapsed, 3),
+                            "docs_per_minute": round(60 * args.docs / elapsed, 1), "detection_calls": calls,
+                            "feature_detecting_ms": round(1000 * detecting[0], 1) if detecting else None})
+            print(f"batch {batch_size:>3}: {results[-1]['docs_per_minute']:7.1f} docs/min  {calls:.0f} detection calls  "
+                  f"feature_detecting {results[-1]['feature_detecting_ms']} ms")
+    print(json.dumps(results, indent=2))
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Feature detection throughput for several batch sizes, with a fake chat model.")
+    parser.add_argument("--docs", type=int, default=64)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--latency", type=float, default=0.5, help="fake LLM seconds per call")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="run the batch pipeline over PDFs instead of detect_many over texts")
+    args = parser.parse_args(argv)
+    if args.pipeline:
+        return pipeline(args)
+
+    from sqlmodel import Session
+    from src.service.detection import FeatureDetectionService
+    from src.service.metrics import metrics
+
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        os.environ.update(DB_PATH=work_dir, HASH_PATH=work_dir, FEATURE_SKIP_CONFIDENCE="1")
+        os.environ.setdefault("OPEN_API_KEY", "offline")
+        fake_llm.install(fake_llm.FakeChatModel(latency=args.latency, tokens_per_second=0))
+        connection = DBConnection()
+        DBInit(connection).initialize()
+        texts = ["\n".join(line for page in pdfs.confluence_document("small", seed) for line in page)
+                 for seed in range(args.docs)]
+
+        reference = None
+        for batch_size in args.batch_sizes:
+            metrics.reset()
+            started = time.perf_counter()
+            with Session(connection.engine) as session:
+                features = FeatureDetectionService(session).detect_many(texts, batch_size)
+            elapsed = time.perf_counter() - started
+            ids = [f.feature_id if f else None for f in features]
+            reference = reference or ids
+            registry = metrics.to_dict()
+            calls = sum(s["value"] for s in registry.get("kb_llm_calls_total", {}).get("series", []))
+            fallbacks = sum(s["value"] for s in registry.get("kb_detection_fallbacks_total", {}).get("series", []))
+            results.append({"batch_size": batch_size, "seconds": round(elapsed, 3),
+                            "docs_per_second": round(args.docs / elapsed, 2), "llm_calls": calls,
+                            "fallbacks": fallbacks, "agreement": sum(a == b for a, b in zip(ids, reference)) / args.docs})
+            print(f"batch {batch_size:>3}: {results[-1]['docs_per_second']:7.2f} docs/s  {calls:.0f} calls  "
+                  f"{fallbacks:.0f} fallbacks  agreement {results[-1]['agreement']:.0%}")
+    print(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,139 @@
+import os
+import re
+import json
+import time
+import asyncio
+from hashlib import sha256
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from src.Agents import agents
+
+_word = re.compile(r"[A-Za-z][A-Za-z0-9'-]+")
+_document = re.compile(r"^=== document \d+ ===$", re.MULTILINE)
+
+
+class FakeChatModel(BaseChatModel):
+    """Offline stand-in for ChatOpenAI with a configurable speed and deterministic answers.
+
+    - a context listing "subject:"/"feature:" lines gets the JSON of the feature sharing most words with the text
+      (what FeatureDetectorAgent expects), or a JSON array of them for packed documents,
+    - cleanup and merge prompts get the text back (a well-formed document keeps its headings),
+    - every other prompt gets a Markdown article of output_tokens words taken from the text.
+    """
+
+    latency: float = 0.2  # seconds before the first token
+    tokens_per_second: float = 200.0  # 0 = the whole answer at once
+    output_tokens: int = 400
+    chunk_tokens: int = 8  # tokens per streamed chunk
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-benchmark"
+
+    # Answers =========================================================
+    def answer(self, messages: List[BaseMessage]) -> str:
+        parts: Dict[str, str] = {}
+        system = ""
+        for message in messages:
+            content = message.content if isinstance(message.content, str) else str(message.content)
+            if message.type == "system":
+                system = content
+            else:
+                key, _, value = content.partition(":")
+                parts[key] = value
+        text = parts.get("text", "")
+        context = parts.get("context", "")
+        if "feature:" in context:
+            documents = _document.split(text)
+            if len(documents) > 1:  # FeatureDetectorAgent.detect_many
+                return json.dumps([dict(json.loads(self._detect(doc, context)), document=i)
+                                   for i, doc in enumerate(documents[1:], start=1)])
+            return self._detect(text, context)
+        if re.search(r"cleanup|merge", system, re.IGNORECASE):
+            return text.strip()
+        return self._article(text)
+
+    @staticmethod
+    def _detect(text: str, context: str) -> str:
+        words = {w.casefold() for w in _word.findall(text)}
+        best, best_score, subject = None, -1, None
+        for line in context.splitlines():
+            line = line.strip()
+            if line.startswith("subject:"):
+                subject = line[len("subject:"):].strip()
+            elif line.startswith("feature:") and subject is not None:
+                feature = line[len("feature:"):].strip()
+                score = len(words & {w.casefold() for w in _word.findall(feature)})
+                if score > best_score:
+                    best, best_score = (subject, feature), score
+        return json.dumps({"subject": best[0], "feature": best[1]}) if best else "{}"
+
+    def _article(self, text: str) -> str:
+        words = _word.findall(text) or ["lorem", "ipsum"]
+        offset = int(sha256(text.encode("utf-8")).hexdigest()[:8], 16) % len(words)
+        body = [words[(offset + i) % len(words)] for i in range(self.output_tokens)]
+        paragraphs = [f"# {' '.join(words[:4]).title()}"]
+        for step, start in enumerate(range(0, len(body), 60), start=1):
+            paragraphs += [f"## Step {step}", " ".join(body[start:start + 60])]
+        return "\n\n".join(paragraphs)
+
+    def _chunks(self, answer: str) -> List[str]:
+        pieces = re.findall(r"\S+\s*|\s+", answer)
+        size = max(1, self.chunk_tokens)
+        return ["".join(pieces[i:i + size]) for i in range(0, len(pieces), size)] or [""]
+
+    def _delay(self, tokens: int) -> float:
+        return tokens / self.tokens_per_second if self.tokens_per_second else 0.0
+
+    def _usage(self, messages: List[BaseMessage], answer: str) -> Dict[str, int]:
+        prompt_tokens = sum(len(str(m.content).split()) for m in messages)
+        completion_tokens = len(answer.split())
+        return {"input_tokens": prompt_tokens, "output_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
+
+    # BaseChatModel ===================================================
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        answer = self.answer(messages)
+        time.sleep(self.latency + self._delay(len(answer.split())))
+        message = AIMessage(content=answer, usage_metadata=self._usage(messages, answer))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None,
+                         **kwargs: Any) -> ChatResult:
+        answer = self.answer(messages)
+        await asyncio.sleep(self.latency + self._delay(len(answer.split())))
+        message = AIMessage(content=answer, usage_metadata=self._usage(messages, answer))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None,
+                **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        answer = self.answer(messages)
+        time.sleep(self.latency)
+        for piece in self._chunks(answer):
+            time.sleep(self._delay(len(piece.split())))
+            yield ChatGenerationChunk(message=AIMessageChunk(content=piece))
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=self._usage(messages, answer)))
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None,
+                       **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        answer = self.answer(messages)
+        await asyncio.sleep(self.latency)
+        for piece in self._chunks(answer):
+            await asyncio.sleep(self._delay(len(piece.split())))
+            yield ChatGenerationChunk(message=AIMessageChunk(content=piece))
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=self._usage(messages, answer)))
+
+
+def install(model: FakeChatModel = None, model_name: str = None, api_key: str = None) -> FakeChatModel:
+    """Make every agent created from now on use model instead of ChatOpenAI (no network, no patching)."""
+    model = model or FakeChatModel()
+    model_name = model_name or os.getenv("PROMPTS_MODEL_NAME", "gpt-5-nano")
+    api_key = api_key or os.getenv("OPEN_API_KEY") or "offline"
+    os.environ.setdefault("OPEN_API_KEY", api_key)
+    agents.AgentRegistry.clear()
+    with agents._clients_lock:
+        agents._clients[(model_name, api_key)] = model
+    return model
@@ -0,0 +1,100 @@
+import sys
+import random
+import argparse
+import textwrap
+from pathlib import Path
+from typing import List
+
+# pages of body text between the stripped top and bottom blocks
+SIZES = {"small": 2, "medium": 12, "huge": 120}
+LINES_PER_PAGE = 60
+
+_topics = [
+    "Searching and Filtering", "Redacting Documents", "Index Features", "Navigating Projects",
+    "User Account Setup", "Question Role", "Using AI", "Batch Redacting Documents",
+]
+_vocabulary = (
+    "project data room document index folder permission user group upload download search filter result "
+    "export report question answer workflow notification setting role approval redaction term category "
+    "audit trail version preview viewer label tag metadata import spreadsheet template"
+).split()
+
+
+def write_pdf(path: Path, pages: List[List[str]]):
+    """Minimal PDF (one Helvetica text stream per page) that PyPDF2 extracts line by line."""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>"]
+    kids = " ".join(f"{4 + 2 * i} 0 R" for i in range(len(pages)))
+    objects.append(f"<< /Type /Pages /Kids [{kids}] /Count {len(pages)} >>".encode())
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    for i, lines in enumerate(pages):
+        escaped = (line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") for line in lines)
+        content = "BT /F1 10 Tf 40 810 Td 12 TL " + " ".join(f"({line}) '" for line in escaped) + " ET"
+        data = content.encode("latin-1", errors="replace")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>".encode())
+        objects.append(b"<< /Length %d >>\nstream\n" % len(data) + data + b"\nendstream")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += b"".join(f"{offset:010d} 00000 n \n".encode() for offset in offsets)
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    Path(path).write_bytes(bytes(out))
+
+
+def confluence_document(size: str = "small", seed: int = 0) -> List[List[str]]:
+    """Pages of a Confluence export: Contents/Important links/Project team before the Summary, body sections,
+    then Meeting summaries/Changelog/References, i.e. the blocks ConfluenceService strips."""
+    rng = random.Random(seed)
+    topic = _topics[seed % len(_topics)]
+    words = _vocabulary + topic.lower().split() * 6
+
+    def paragraph(sentences: int) -> List[str]:
+        text = " ".join(
+            " ".join(rng.choice(words) for _ in range(rng.randint(8, 18))).capitalize() + "."
+            for _ in range(sentences))
+        return textwrap.wrap(text, 95) + [""]
+
+    lines = [f"PROD-{topic}", "Contents", "1. Summary", "2. Overview", "3. Requirements", "",
+             "Important links", "Jira epic KB-1234", "Design in Figma", "",
+             "Project team (contact people)", "Product owner: Jane Doe", "Engineering: John Roe", "",
+             "Summary", *paragraph(3), "Overview", *paragraph(4)]
+    body_lines = SIZES[size] * LINES_PER_PAGE
+    section = 1
+    while len(lines) < body_lines:
+        lines += [f"{topic} requirement {section}", *paragraph(rng.randint(3, 8))]
+        section += 1
+    lines += ["Meeting summaries", *paragraph(2), "Changelog", "v1.0 initial version", "References", "KB-1234"]
+    return [lines[i:i + LINES_PER_PAGE] for i in range(0, len(lines), LINES_PER_PAGE)]
+
+
+def generate(directory: Path, size: str, count: int, seed: int = 0) -> List[Path]:
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for i in range(count):
+        path = directory / f"{size}-{seed + i:04d}.pdf"
+        if not path.exists():
+            write_pdf(path, confluence_document(size, seed + i))
+        paths.append(path)
+    return paths
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Generate synthetic Confluence-style PDF exports.")
+    parser.add_argument("directory", type=Path)
+    parser.add_argument("--size", choices=list(SIZES), default="small")
+    parser.add_argument("--count", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    for path in generate(args.directory, args.size, args.count, args.seed):
+        print(path)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
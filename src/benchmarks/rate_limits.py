@@ -0,0 +1,64 @@
+import os
+import sys
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Fire concurrent LLM calls at a throttling stub API and report how the rate limiter copes.")
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--server-rpm", type=int, default=600, help="requests/min the stub accepts (0 = unlimited)")
+    parser.add_argument("--throttle-rate", type=float, default=0.05, help="share of random 429 answers")
+    parser.add_argument("--error-rate", type=float, default=0.05, help="share of random 503 answers")
+    parser.add_argument("--latency", type=float, default=0.05, help="stub seconds per answer")
+    parser.add_argument("--client-rpm", type=float, default=None, help="LLM_RPM of the client (default: unlimited)")
+    parser.add_argument("--stream", action="store_true", help="stream the answers instead of invoking")
+    args = parser.parse_args(argv)
+
+    from src.benchmarks.stub_openai import StubOpenAI
+    server = StubOpenAI(rpm=args.server_rpm, throttle_rate=args.throttle_rate, error_rate=args.error_rate,
+                        latency=args.latency, retry_after=0.5).start()
+    os.environ.update(OPENAI_BASE_URL=server.base_url, LLM_BACKOFF_MAX=os.getenv("LLM_BACKOFF_MAX", "2"))
+    os.environ.setdefault("OPEN_API_KEY", "stub")
+    if args.client_rpm is not None:
+        os.environ["LLM_RPM"] = str(args.client_rpm)
+
+    from src.Agents.agents import AgentRegistry, BaseAgent
+    from src.service.metrics import metrics
+    from src.service.ratelimit import LLMCallError
+    AgentRegistry.clear()
+    agent = BaseAgent(name="LoadTest")
+    agent._prompt = {"system": "Answer ok.", "text": "{text}"}
+
+    def call(i: int) -> bool:
+        try:
+            if args.stream:
+                "".join(agent.stream(text=f"request {i}", context=None, history=None))
+            else:
+                agent.invoke(text=f"request {i}", context=None, history=None)
+            return True
+        except LLMCallError:
+            return False
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        succeeded = sum(pool.map(call, range(args.calls)))
+    elapsed = time.perf_counter() - started
+    server.stop()
+
+    retries = metrics.to_dict().get("kb_llm_retries_total", {}).get("series", [])
+    by_reason = {}
+    for series in retries:
+        reason = series["labels"]["reason"]
+        by_reason[reason] = by_reason.get(reason, 0) + series["value"]
+    print(f"{succeeded}/{args.calls} calls succeeded in {elapsed:.1f}s ({60 * succeeded / elapsed:.0f} calls/min)")
+    print(f"server answers: {server.counts}")
+    print(f"client retries: {by_reason or 'none'}, final concurrency limit {agent.limiter.concurrency.limit:.1f}")
+    return 0 if succeeded == args.calls else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from src.benchmarks import pdfs
+
+
+def worker(argv: List[str]) -> int:
+    """A batch run answered by the fake chat model: --worker --latency SECONDS followed by the arguments of src.batch."""
+    from src import batch
+    from src.benchmarks import fake_llm
+    fake_llm.install(fake_llm.FakeChatModel(latency=float(argv[2]), tokens_per_second=0))
+    return batch.main(argv[3:])
+
+
+def run_batch(work_dir: Path, db_dir: Path, pdf_dir: Path, name: str, latency: float, run_id: str,
+              kill_after: int = None) -> Optional[Dict[str, Any]]:
+    """Run one batch in a subprocess, SIGKILLed once kill_after documents are in its manifest; the LLM calls it
+    made and its manifest, None when it was killed."""
+    manifest, metrics_dir = work_dir / f"{name}.jsonl", work_dir / name
+    env = dict(os.environ, DB_PATH=str(db_dir), HASH_PATH=str(db_dir / "hash"), OPEN_API_KEY="offline")
+    (db_dir / "hash").mkdir(parents=True, exist_ok=True)
+    command = [sys.executable, "-m", "src.benchmarks.resume", "--worker", "--latency", str(latency), str(pdf_dir),
+               "--run-id", run_id, "--manifest", str(manifest), "--metrics", str(metrics_dir)]
+    with open(work_dir / f"{name}.log", "w") as log:
+        process = subprocess.Popen(command, env=env, stdout=log, stderr=subprocess.STDOUT)
+    while process.poll() is None:
+        time.sleep(0.05)
+        if kill_after and manifest.exists() and len(manifest.read_text().splitlines()) >= kill_after:
+            process.kill()  # no clean shutdown, like a crash or a lost machine
+            process.wait()
+            return None
+    registry = json.loads((metrics_dir / "metrics.json").read_text())
+    return {
+        "llm_calls": sum(s["value"] for s in registry.get("kb_llm_calls_total", {}).get("series", [])),
+        "results": [json.loads(line) for line in manifest.read_text().splitlines()],
+    }
+
+
+def main(argv=None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ["--worker"]:
+        return worker(argv)
+    parser = argparse.ArgumentParser(
+        description="Interrupt a batch run with the fake chat model and resume it from its stage checkpoints.")
+    parser.add_argument("--docs", type=int, default=50)
+    parser.add_argument("--interrupt-at", type=float, default=0.8, help="share of the documents finished when killed")
+    parser.add_argument("--latency", type=float, default=0.05, help="fake LLM seconds per call")
+    parser.add_argument("--size", choices=list(pdfs.SIZES), default="small")
+    args = parser.parse_args(argv)
+
+    work_dir = Path(tempfile.mkdtemp(prefix="kb-resume-"))
+    pdf_dir = work_dir / "pdfs"
+    pdfs.generate(pdf_dir, args.size, args.docs)
+    run_id = "resume-benchmark"
+
+    started = time.perf_counter()
+    run_batch(work_dir, work_dir / "db", pdf_dir, "interrupted", args.latency, run_id,
+              kill_after=max(1, int(args.docs * args.interrupt_at)))
+    interrupted = time.perf_counter() - started
+    finished_before = len((work_dir / "interrupted.jsonl").read_text().splitlines())
+
+    started = time.perf_counter()
+    resumed = run_batch(work_dir, work_dir / "db", pdf_dir, "resumed", args.latency, run_id)
+    resumed_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    fresh = run_batch(work_dir, work_dir / "fresh-db", pdf_dir, "fresh", args.latency, run_id)
+    fresh_seconds = time.perf_counter() - started
+
+    statuses: Dict[str, int] = {}
+    skipped: Dict[str, int] = {}
+    for result in resumed["results"]:
+        statuses[result["status"]] = statuses.get(result["status"], 0) + 1
+        for stage in result["resumed"]:
+            skipped[stage.split(":")[0]] = skipped.get(stage.split(":")[0], 0) + 1
+    print(f"interrupted after {interrupted:.1f}s with {finished_before}/{args.docs} documents finished")
+    print(f"resumed run: {resumed_seconds:.1f}s, {resumed['llm_calls']:.0f} LLM calls, {statuses}")
+    print(f"  restored from checkpoints: {skipped}")
+    print(f"fresh run of the same documents: {fresh_seconds:.1f}s, {fresh['llm_calls']:.0f} LLM calls")
+    print(f"LLM calls saved by resuming: {1 - resumed['llm_calls'] / max(fresh['llm_calls'], 1):.0%}")
+    return 0 if statuses.get("ok", 0) + statuses.get("unchanged", 0) == args.docs else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
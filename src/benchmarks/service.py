@@ -0,0 +1,97 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+import urllib.request
+from pathlib import Path
+from statistics import mean
+from typing import Any, Dict
+
+from src.benchmarks import pdfs
+
+
+def request(url: str, method: str = "GET", payload: Any = None, data: bytes = None,
+            content_type: str = "application/json") -> Dict[str, Any]:
+    if payload is not None:
+        data = json.dumps(payload).encode()
+    req = urllib.request.Request(url, data=data, method=method, headers={"content-type": content_type})
+    with urllib.request.urlopen(req, timeout=30) as response:
+        return json.loads(response.read())
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        description="End-to-end run of the ingestion service with the fake chat model: startup cost, job latency and priorities.")
+    parser.add_argument("--docs", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.2, help="fake LLM seconds per call")
+    parser.add_argument("--size", choices=list(pdfs.SIZES), default="small")
+    args = parser.parse_args(argv)
+
+    work_dir = Path(tempfile.mkdtemp(prefix="kb-service-"))
+    paths = pdfs.generate(work_dir / "pdfs", args.size, args.docs + 1)
+    env = dict(os.environ, DB_PATH=str(work_dir), HASH_PATH=str(work_dir / "hash"), OPEN_API_KEY="offline")
+    (work_dir / "hash").mkdir()
+
+    log_path = work_dir / "service.log"  # not a pipe: a full pipe would block the service's logging
+    started = time.perf_counter()
+    with open(log_path, "w") as log:
+        server = subprocess.Popen([sys.executable, "-m", "src.server", "--port", "0", "--workers", str(args.workers),
+                                   "--fake-llm", str(args.latency)], env=env, stdout=log, stderr=subprocess.STDOUT)
+    try:
+        url = None
+        while url is None:
+            if server.poll() is not None:
+                print(f"the service did not start:\n{log_path.read_text()[-2000:]}", file=sys.stderr)
+                return 1
+            time.sleep(0.02)
+            url = next((line.split()[-1] for line in log_path.read_text().splitlines()
+                        if line.startswith("Listening on")), None)
+        startup = time.perf_counter() - started
+        warmed_in = request(f"{url}/health")["warmed_in"]
+
+        # the last half is submitted with a higher priority and should overtake the first half
+        submitted = time.perf_counter()
+        jobs = []
+        for i, path in enumerate(paths[:args.docs]):
+            priority = 1 if i >= args.docs // 2 else 0
+            jobs.append(request(f"{url}/jobs", "POST", {"path": str(path), "priority": priority}))
+        jobs.append(request(f"{url}/jobs?name=upload&priority=1", "POST", data=paths[-1].read_bytes(),
+                            content_type="application/pdf"))
+
+        finished: Dict[str, Dict[str, Any]] = {}
+        while len(finished) < len(jobs):
+            time.sleep(0.05)
+            for job in jobs:
+                if job["job_id"] not in finished:
+                    state = request(f"{url}/jobs/{job['job_id']}")
+                    if state["status"] in ("ok", "unchanged", "error", "cancelled"):
+                        finished[job["job_id"]] = state
+        elapsed = time.perf_counter() - submitted
+
+        # resubmitted PDFs that are still the last source of their feature are answered from the fingerprints
+        again = [request(f"{url}/jobs", "POST", {"path": str(path)}) for path in paths[:args.docs]]
+        while any(request(f"{url}/jobs/{job['job_id']}")["status"] in ("queued", "running") for job in again):
+            time.sleep(0.05)
+        unchanged = sum(request(f"{url}/jobs/{job['job_id']}")["status"] == "unchanged" for job in again)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+    results = list(finished.values())
+    latency = {p: [r["finished_at"] - r["submitted_at"] for r in results if r["priority"] == p] for p in (0, 1)}
+    statuses: Dict[str, int] = {}
+    for result in results:
+        statuses[result["status"]] = statuses.get(result["status"], 0) + 1
+    print(f"startup {startup:.2f}s (warm-up {warmed_in:.2f}s), paid once instead of per document")
+    print(f"{len(results)} jobs in {elapsed:.1f}s ({60 * len(results) / elapsed:.0f} docs/min): {statuses}")
+    print(f"mean latency: priority 1 {mean(latency[1]):.2f}s, priority 0 {mean(latency[0]):.2f}s")
+    print(f"resubmitted: {unchanged}/{len(again)} unchanged")
+    return 0 if statuses.get("ok", 0) + statuses.get("unchanged", 0) == len(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
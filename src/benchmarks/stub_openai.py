@@ -0,0 +1,135 @@
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import List, Optional
+
+
+class StubOpenAI(ThreadingHTTPServer):
+    """Local /v1/chat/completions endpoint that throttles like the real API, for load tests of the rate limiter.
+
+    - more than rpm requests in the last minute (0 = unlimited) get 429 with a Retry-After header,
+    - throttle_rate and error_rate inject random 429 and 503 answers,
+    - script lists outcomes ("ok", "throttled" or "unavailable") answered first, in order, for tests,
+    - the other requests wait latency seconds and answer "ok" (plain JSON or SSE when stream is set).
+    """
+
+    daemon_threads = True
+
+    def __init__(self, port: int = 0, rpm: int = 0, throttle_rate: float = 0.0, error_rate: float = 0.0,
+                 latency: float = 0.05, retry_after: float = 1.0, seed: int = 0, script: List[str] = None):
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.rpm = rpm
+        self.throttle_rate = throttle_rate
+        self.error_rate = error_rate
+        self.latency = latency
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.script = list(script or [])
+        self.lock = threading.Lock()
+        self.accepted = []  # monotonic times of the accepted requests
+        self.counts = {"ok": 0, "throttled": 0, "unavailable": 0}
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+    def start(self) -> "StubOpenAI":
+        self._thread = threading.Thread(target=self.serve_forever, name="stub-openai", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def decide(self) -> str:
+        with self.lock:
+            draw = self.random.random()
+            if self.script:
+                outcome = self.script.pop(0)
+            elif draw < self.error_rate:
+                outcome = "unavailable"
+            elif draw < self.error_rate + self.throttle_rate:
+                outcome = "throttled"
+            else:
+                now = time.monotonic()
+                self.accepted = [t for t in self.accepted if now - t < 60]
+                outcome = "throttled" if self.rpm and len(self.accepted) >= self.rpm else "ok"
+                if outcome == "ok":
+                    self.accepted.append(now)
+            self.counts[outcome] += 1
+            return outcome
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: StubOpenAI
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("content-length", 0))) or b"{}")
+        outcome = self.server.decide()
+        if outcome == "throttled":
+            return self._error(429, "rate_limit_exceeded", {"retry-after": f"{self.server.retry_after:g}"})
+        if outcome == "unavailable":
+            return self._error(503, "server_error")
+        time.sleep(self.server.latency)
+        model = body.get("model", "stub")
+        usage = {"prompt_tokens": 10, "completion_tokens": 1, "total_tokens": 11}
+        if not body.get("stream"):
+            return self._json(200, {
+                "id": "chatcmpl-stub", "object": "chat.completion", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": "ok"}, "finish_reason": "stop"}],
+                "usage": usage})
+
+        self.send_response(200)
+        self.send_header("content-type", "text/event-stream")
+        self.send_header("connection", "close")
+        self.end_headers()
+        for delta, finish in (({"role": "assistant", "content": "ok"}, None), ({}, "stop")):
+            chunk = {"id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": int(time.time()),
+                     "model": model, "choices": [{"index": 0, "delta": delta, "finish_reason": finish}]}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.close_connection = True
+
+    def _json(self, status: int, payload: dict, headers: dict = None):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("content-type", "application/json")
+        self.send_header("content-length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _error(self, status: int, code: str, headers: dict = None):
+        self._json(status, {"error": {"message": code, "type": code, "code": code}}, headers)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Serve a throttling stub of the OpenAI chat completions API.")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--rpm", type=int, default=60)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--latency", type=float, default=0.05)
+    args = parser.parse_args(argv)
+    server = StubOpenAI(args.port, args.rpm, args.throttle_rate, args.error_rate, args.latency)
+    print(f"OPENAI_BASE_URL={server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
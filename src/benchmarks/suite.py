@@ -0,0 +1,166 @@
+import os
+import sys
+import json
+import time
+import builtins
+import argparse
+import platform
+import resource
+import tempfile
+import contextlib
+import subprocess
+from pathlib import Path
+from typing import Dict, List, Any
+
+MODES = ("flow", "main", "batch", "async")
+
+
+# Worker (one fresh process per mode and size, so peak RSS belongs to that run) =================
+def run_worker(args) -> Dict[str, Any]:
+    work_dir = Path(tempfile.mkdtemp(prefix="kb-bench-"))
+    os.environ.update(DB_PATH=str(work_dir), HASH_PATH=str(work_dir / "hash"))
+    os.environ.setdefault("OPEN_API_KEY", "offline")
+    (work_dir / "hash").mkdir()
+
+    from src.benchmarks import fake_llm, pdfs
+    from src.repository.DBConnection import DBConnection
+    from src.repository.DBInit import DBInit
+    from src.service.metrics import metrics
+
+    fake_llm.install(fake_llm.FakeChatModel(latency=args.latency, tokens_per_second=args.tps,
+                                            output_tokens=args.output_tokens))
+    paths = pdfs.generate(args.pdf_dir, args.size, args.warmup + args.docs, seed=args.seed)
+    connection = DBConnection()
+    DBInit(connection).initialize()
+    run = {"flow": _run_flow, "main": _run_main, "batch": _run_batch, "async": _run_async}[args.worker]
+
+    if args.warmup:
+        run(connection, paths[:args.warmup])
+        metrics.reset()
+    started = time.perf_counter()
+    run(connection, paths[args.warmup:])
+    elapsed = time.perf_counter() - started
+
+    component = {"batch": "pipeline", "async": "async_flow"}.get(args.worker, args.worker)
+    registry = metrics.to_dict()
+    stages = {
+        series["labels"]["stage"]: {"mean": series["mean"], "p95": series["p95"], "max": series["max"]}
+        for series in registry.get("kb_stage_seconds", {}).get("series", [])
+        if series["labels"]["component"] == component and series["labels"]["stage"] != "total"
+    }
+    llm_calls = sum(s["value"] for s in registry.get("kb_llm_calls_total", {}).get("series", []))
+    return {
+        "mode": args.worker, "size": args.size, "docs": args.docs, "seconds": elapsed,
+        "docs_per_minute": 60 * args.docs / elapsed if elapsed else None,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "llm_calls": llm_calls, "stages": stages,
+    }
+
+
+def _run_flow(connection, paths):
+    from src.flow import Flow
+    for path in paths:
+        answers = iter([str(path), "n", "n"])
+        builtins.input = lambda prompt="": next(answers)
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            flow = Flow(connection)
+            flow.renderer = None
+            flow.run()
+
+
+def _run_main(connection, paths):
+    from src.main import process
+    for path in paths:
+        process(str(path), connection)
+
+
+def _run_batch(connection, paths):
+    from src.service.pipeline import IngestionPipeline
+    IngestionPipeline(connection).run(paths)
+
+
+def _run_async(connection, paths):
+    import asyncio
+    from src.async_flow import run_flows
+    asyncio.run(run_flows(connection, paths))
+
+
+# Driver ==========================================================
+def compare(results: List[Dict[str, Any]], baseline: List[Dict[str, Any]], tolerance: float) -> List[str]:
+    """Regressions of results against a baseline run: throughput, peak RSS or a stage mean worse than tolerance."""
+    previous = {(r["mode"], r["size"]): r for r in baseline}
+    regressions = []
+    for result in results:
+        before = previous.get((result["mode"], result["size"]))
+        if before is None:
+            continue
+        name = f"{result['mode']}/{result['size']}"
+        if result["docs_per_minute"] < before["docs_per_minute"] * (1 - tolerance):
+            regressions.append(f"{name}: {result['docs_per_minute']:.1f} docs/min, was {before['docs_per_minute']:.1f}")
+        if result["peak_rss_mb"] > before["peak_rss_mb"] * (1 + tolerance):
+            regressions.append(f"{name}: peak RSS {result['peak_rss_mb']:.0f} MB, was {before['peak_rss_mb']:.0f} MB")
+        for stage, timing in result["stages"].items():
+            old = before["stages"].get(stage)
+            # stages below 10 ms are dominated by noise
+            if old and max(timing["mean"], old["mean"]) > 0.01 and timing["mean"] > old["mean"] * (1 + tolerance):
+                regressions.append(f"{name}: {stage} {1000 * timing['mean']:.0f} ms, was {1000 * old['mean']:.0f} ms")
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Offline throughput benchmark of Flow, main.py, the batch pipeline and AsyncFlow.")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--sizes", nargs="+", choices=["small", "medium", "huge"], default=["small", "medium"])
+    parser.add_argument("--docs", type=int, default=5, help="measured documents per mode and size")
+    parser.add_argument("--warmup", type=int, default=1, help="documents processed before measuring")
+    parser.add_argument("--latency", type=float, default=0.2, help="fake LLM seconds to first token")
+    parser.add_argument("--tps", type=float, default=200.0, help="fake LLM tokens per second (0 = instant)")
+    parser.add_argument("--output-tokens", type=int, default=400, help="fake LLM article length in tokens")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--pdf-dir", type=Path, default=Path(tempfile.gettempdir()) / "kb-bench-pdfs")
+    parser.add_argument("--output", type=Path, default=None, help="save the results as JSON")
+    parser.add_argument("--baseline", type=Path, default=None, help="results JSON of an earlier run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="relative slowdown reported as a regression")
+    parser.add_argument("--worker", choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument("--size", default="small", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        print(json.dumps(run_worker(args)))
+        return 0
+
+    results = []
+    common = ["--docs", str(args.docs), "--warmup", str(args.warmup), "--latency", str(args.latency),
+              "--tps", str(args.tps), "--output-tokens", str(args.output_tokens), "--seed", str(args.seed),
+              "--pdf-dir", str(args.pdf_dir)]
+    for size in args.sizes:
+        for mode in args.modes:
+            completed = subprocess.run(
+                [sys.executable, "-m", "src.benchmarks.suite", "--worker", mode, "--size", size, *common],
+                capture_output=True, text=True)
+            if completed.returncode != 0:
+                print(f"{mode}/{size} failed:\n{completed.stderr[-2000:]}", file=sys.stderr)
+                return 1
+            result = json.loads(completed.stdout.strip().splitlines()[-1])
+            results.append(result)
+            stages = " ".join(f"{stage}={1000 * t['mean']:.0f}ms" for stage, t in result["stages"].items())
+            print(f"{mode:>5} {size:>6}: {result['docs_per_minute']:7.1f} docs/min  "
+                  f"peak RSS {result['peak_rss_mb']:6.0f} MB  {stages}")
+
+    report = {"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+              "config": {k: v for k, v in vars(args).items() if k not in ("worker", "size", "output", "baseline")},
+              "results": results}
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2, default=str))
+    if args.baseline:
+        regressions = compare(results, json.loads(args.baseline.read_text())["results"], args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+        print(f"No regression against {args.baseline} (tolerance {args.tolerance:.0%}).")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
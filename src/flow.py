@@ -2,7 +2,9 @@ from __future__ import annotations
 
 import os
 import sys
+import time
 import logging
+import threading
 from dataclasses import dataclass, field
 from pathlib import Path
 from enum import IntEnum
@@ -11,7 +13,7 @@ from transitions import Machine
 
 # --- Project imports (adjust paths to your project) ---
 from dotenv import load_dotenv
-from src.Agents.agents import FeatureDetectorAgent, DocumentCleanerAgent, DocumentMergeAgent
+from src.Agents.agents import AgentRegistry, FeatureDetectorAgent, DocumentCleanerAgent, DocumentMergeAgent
 from src.model.Article import Article
 from src.model.Feature import Feature
 from src.repository.ArticleRepository import ArticleRepository
@@ -19,10 +21,18 @@ from src.repository.DBConnection import DBConnection
 from src.repository.DBInit import DBInit
 from src.repository.SubjectRepository import SubjectRepository
 from src.repository.FeatureRepository import FeatureRepository
+from src.repository.FingerprintRepository import FingerprintRepository, file_digest, text_digest
 from src.service.confluence import ConfluenceService
 from sqlmodel import SQLModel, Field, Session, create_engine, select, delete
 from src.Agents.ArticleAgentFactory import ArticleAgentFactory
 from src.service.markdown import MarkdownHandler
+from src.service.articles import ArticleService, ArticleGenerationError
+from src.service.render import RenderQueue
+from src.service.detection import FeatureDetectionService
+from src.service.taxonomy import Taxonomy
+from src.service.near_duplicates import MinHasher, NearDuplicateIndex, SourceMatch, match_source
+from src.service.metrics import metrics, StageTimer
+from src.service.ratelimit import LLMCallError
 
 
 
@@ -37,21 +47,28 @@ class FlowState:
     current_version_document: str = None
     current_version_article: str = None
     article_type_index = -1
+    pdf_hash: str = None
+    text_hash: str = None
+    source_match: SourceMatch = None
 
 class Flow:
     nodes = ["start", "welcome","get_pdf", "pars_pdf", "well_forming", "print_source",
              "feature_detecting", "edit_feature", "generate_articles", "end"]
-    flow_state = FlowState()
+    flow_state: FlowState = None
     machine:Machine = None
     session : Session = None
     logger: logging.Logger = None
     article_kinds = {1:"FAQ", 2:"Troubleshooting", 3:"Tutorials"}
 
-    def __init__(self, connection: DBConnection, initial="start"):
+    def __init__(self, connection: DBConnection, initial="start", max_workers: int = None):
         self.dbconnection = connection
-        self.session = Session(self.dbconnection.engine)
+        self.flow_state = FlowState()  # per flow, several flows may run in one process
+        self.max_workers = max_workers # concurrent article types, defaults to ARTICLE_CONCURRENCY
+        self.session = Session(self.dbconnection.read_engine)
         self.machine = Machine(model=self, states=self.nodes, initial=initial)
         self.markdown_handler = MarkdownHandler()
+        self.renderer = RenderQueue()  # None only stores the Markdown
+        self._stream_lock = threading.Lock()
 
         self.machine.add_transition("next", "start", dest="welcome")
         self.machine.add_transition("next", "welcome", dest="get_pdf")
@@ -64,6 +81,9 @@ class Flow:
         self.machine.add_transition("next", "feature_detecting", "edit_feature")
         self.machine.add_transition("next", "edit_feature", "generate_articles")
         self.machine.add_transition("next", "generate_articles", "end")
+        self.machine.add_transition("skip", "pars_pdf", "end")
+        self.stage_timer = StageTimer("flow")
+        self.stage_timer.attach(self.machine, self.nodes, final="end")
 
 
         ## log configuration
@@ -101,13 +121,29 @@ class Flow:
         handler.set_file_path(str(self.flow_state.pdf_path))
         self.flow_state.raw_text = handler.process_pdf()
         self.logger.info(f"Extracting the raw text.")
+        self.flow_state.pdf_hash = file_digest(self.flow_state.pdf_path)
+        self.flow_state.text_hash = text_digest(self.flow_state.raw_text)
+        current = FingerprintRepository(self.session).find_current(self.flow_state.pdf_hash, self.flow_state.text_hash)
+        match = self.flow_state.source_match = match_source(self.session, self.flow_state.raw_text)
+        if current is not None or match.skip:
+            feature_id = current.feature_id if current is not None else match.feature_id
+            feature = Taxonomy.for_session(self.session).features.get(feature_id)
+            if current is not None:
+                print(f"This document has not changed since it was ingested for {feature.name if feature else feature_id}.")
+            else:
+                print(f"This document is a near duplicate ({match.duplicate.similarity:.0%}) of {match.duplicate.source_name}, "
+                      f"ingested for {feature.name if feature else feature_id}.")
+            if not self.ask_yes_no("Do you want to generate its articles again?", default_yes=False):
+                self.skip()
+                return
         self.next()
 
     def on_enter_well_forming(self):
         raw_text = self.flow_state.raw_text
         self.logger.info("Well-forming the raw text.")
         self.logger.info(f"Calling LLM Agent ...")
-        self.flow_state.well_formed_text = DocumentCleanerAgent().invoke(text=raw_text, context=None, history=None)
+        self.flow_state.well_formed_text = self.call_llm(
+            lambda: AgentRegistry.get(DocumentCleanerAgent).invoke(text=raw_text, context=None, history=None))
         self.logger.info(f"Well forming has been completed.")
         self.next()
 
@@ -124,9 +160,14 @@ class Flow:
         self.logger.info(f"Detecting the feature")
         self.logger.info(f"Calling LLM Agent ... ")
         well_formed_text = self.flow_state.well_formed_text
-        context = FeatureRepository(self.session).get_names()
-        feature_json = FeatureDetectorAgent().invoke(text=well_formed_text, context=context, history=None)
-        feature = FeatureRepository(self.session).find_by_json(feature_json)
+        match = self.flow_state.source_match
+        feature = None
+        if match is not None and match.feature_id is not None:  # near duplicate of an ingested source
+            feature = Taxonomy.for_session(self.session).features.get(match.feature_id)
+            if feature is not None:
+                self.logger.info(f"Same feature as the near duplicate {match.duplicate.source_name}.")
+        if feature is None:
+            feature = self.call_llm(lambda: FeatureDetectionService(self.session).detect(well_formed_text))
         self.flow_state.feature = feature
         self.logger.info(f"Feature has been detected: {feature.name}")
         self.logger.info(f"Subject has been detected: {feature.subject.name}")
@@ -144,62 +185,86 @@ class Flow:
 
     def on_enter_generate_articles(self):
         feature = self.flow_state.feature
-        session = Session(self.dbconnection.engine)
         well_formed_text = self.flow_state.well_formed_text
-        for article_type in feature.article_types:
-
-            article_type_name = self.article_kinds[article_type.type_id]
-            last_version_article = ArticleRepository(session).get_article(feature.name, article_type.type_id)
-
-            if last_version_article: # The new document and article will be combined with the last version
-                self.logger.info(f"For feature: {feature.name},a article type \"{article_type_name}\" already exists.")
-
-                last_document_text = self.markdown_handler.load(last_version_article.hash_file_document).get_text()
-                last_article_text = self.markdown_handler.load(last_version_article.hash_file_article).get_text()
-
-                self.logger.info("Updating the product's document context.")
-                self.logger.info(f"Calling LLM Agent ... ")
-                new_document_text = DocumentMergeAgent().invoke(text=well_formed_text, history=last_document_text, context=None)
-
-                self.logger.info(f"Updating {article_type_name} article content...")
-                self.logger.info(f"Calling LLM Agent ... ")
-                new_article_text = ArticleAgentFactory(article_type = article_type.type_id,  text = well_formed_text, history= last_article_text).generate_article()
+        self.logger.info(f"Calling LLM Agents for {len(feature.article_types)} article type(s) ...")
+        writer = self.dbconnection.writer
+        engine = self.dbconnection.read_engine if writer else self.dbconnection.engine
+        # articles stream into the Markdown store; the first tokens of each type are reported as they arrive
+        self._stream_started = time.perf_counter()
+        self._streaming = set()
+        service = ArticleService(engine, self.markdown_handler, max_workers=self.max_workers,
+                                 renderer=self.renderer, writer=writer, on_token=self.report_token)
+        type_ids = None
+        while True:
+            try:
+                self.report_generated(service.generate(feature, well_formed_text, type_ids))
+                self.remember_source(feature)
+                break
+            except ArticleGenerationError as e:
+                # the other article types are already stored; only the failed ones are retried
+                self.report_generated(e.generated)
+                print(f"Generation failed: {e}")
+                if not self.ask_yes_no("Do you want to retry the failed article types?"):
+                    break
+                type_ids = list(e.failed)
+        self.next()
 
-            else:
-                self.logger.info(f"Generating \"{article_type_name}\" article content...")
-                self.logger.info(f"Calling LLM Agent ... ")
-                new_document_text = well_formed_text
-                new_article_text = ArticleAgentFactory(article_type = article_type.type_id,  text = well_formed_text, history= None).generate_article()
-
-            document_hash_file = self.markdown_handler.set_text(new_document_text).save().get_hash()
-            article_hash_file = self.markdown_handler.set_text(new_article_text).save().get_hash()
-
-
-            if last_version_article: # Update the last version
-                article = last_version_article
-            else: # Insert a new version
-                article = Article()
-                article.feature_id = feature.feature_id
-                article.type_id = article_type.type_id
-
-            article.hash_file_document = document_hash_file
-            article.hash_file_article = article_hash_file
-            article.version +=1
-            session.add(article)
+    def remember_source(self, feature: Feature):
+        with Session(self.dbconnection.engine) as session:
+            FingerprintRepository(session).add(feature.feature_id, self.flow_state.pdf_hash, self.flow_state.text_hash,
+                                               str(self.flow_state.pdf_path),
+                                               MinHasher.to_bytes(self.flow_state.source_match.signature))
             session.commit()
-
-            article_file_name = f"{feature.subject.name}_{feature.name}_{article_type_name}_V{article.version}.pdf"
-            self.markdown_handler.load(article.hash_file_article).convert_to_pdf(article_file_name)
-
-            self.logger.info(f"Article {article_type_name} generated successfully.")
-            self.logger.info(f"Calling LLM Agent ... ")
-            print(f"The {article_type_name} Article has been generated: {article_file_name}")
+            NearDuplicateIndex.for_session(session, check_interval=0)
+
+    def report_generated(self, generated_articles):
+        for generated in generated_articles:
+            if generated.render is None:
+                print(f"The {generated.type_name} Article has been generated: {generated.file_name}")
+                continue
+            print(f"The {generated.type_name} Article has been generated, rendering in background: {generated.file_name}")
+            generated.render.add_done_callback(self.report_render)
+
+    def on_enter_end(self):
+        self.session.close()
+        if self.renderer is not None:
+            self.logger.info("Waiting for the background renders ...")
+            self.renderer.shutdown()
+        self.stage_timer.exit()
+        if os.getenv("METRICS_PATH"):
+            json_path, prom_path = metrics.write(Path(os.getenv("METRICS_PATH")))
+            self.logger.info(f"Metrics written to {json_path} and {prom_path}")
+
+    def report_token(self, type_name: str, piece: str):
+        if type_name in self._streaming:
+            return
+        with self._stream_lock:
+            if type_name in self._streaming:
+                return
+            self._streaming.add(type_name)
+        print(f"The {type_name} Article is being written (first tokens after {time.perf_counter() - self._stream_started:.1f}s) ...")
+
+    def report_render(self, render):
+        if render.exception() is None:
+            print(f"Rendered: {render.result()}")
+        else:
+            print(f"Rendering failed: {render.exception()}")
 
     # Guards functions ===============================================
     def source_exist(self) -> bool:
         return bool(self.flow_state.pdf_path and self.flow_state.pdf_path.is_file())
 
     # Utility functions ==============================================
+    def call_llm(self, call):
+        """Run an LLM step; once its retries are exhausted, let the user try again or stop."""
+        while True:
+            try:
+                return call()
+            except LLMCallError as e:
+                print(f"The LLM call failed: {e}")
+                if not self.ask_yes_no("Do you want to try again?"):
+                    raise
+
     @staticmethod
     def ask(prompt: str) -> str:
         return input(f"{prompt}: ").strip()
@@ -224,5 +289,7 @@ class Flow:
 if __name__ == "__main__":
     load_dotenv()
     dbconnection = DBConnection()
+    # creates the database, or the tables and indexes newer releases added to an existing one
+    DBInit(dbconnection).initialize()
     flow = Flow(dbconnection)
     flow.run()
\ No newline at end of file
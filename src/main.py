@@ -1,77 +1,93 @@
+import sys
+import time
+import argparse
+from pathlib import Path
 from dotenv import load_dotenv
-from src.Agents.agents import FeatureDetectorAgent, DocumentCleanerAgent, DocumentMergeAgent
-from src.model.Article import Article
+from src.Agents.agents import AgentRegistry, FeatureDetectorAgent, DocumentCleanerAgent
 from src.model.Feature import Feature
-from src.repository.ArticleRepository import ArticleRepository
 from src.repository.DBConnection import DBConnection
 from src.repository.DBInit import DBInit
-from src.repository.SubjectRepository import SubjectRepository
-from src.repository.FeatureRepository import FeatureRepository
+from src.repository.FingerprintRepository import FingerprintRepository, file_digest, text_digest
 from src.service.confluence import ConfluenceService
-from sqlmodel import SQLModel, Field, Session, create_engine, select, delete
-from src.Agents.ArticleAgentFactory import ArticleAgentFactory
-from src.service.markdown import MarkdownHandler
+from sqlmodel import Session
+from src.service.articles import ArticleService
+from src.service.detection import FeatureDetectionService
+from src.service.metrics import record_stage
+from src.service.taxonomy import Taxonomy
+from src.service.near_duplicates import MinHasher, NearDuplicateIndex, match_source
 
 
-def main():
+def process(path: str, dbconnection: DBConnection, force: bool = False) -> Feature:
+    """Sequential PDF → KB articles run of one document, without any prompt.
 
-    # load environment variables ======================
-    load_dotenv()
-
-    # Init database ======================
-    dbconnection = DBConnection()
-    db = DBInit(dbconnection)
-    db.initialize()
+    A source that is still the last one ingested for its feature is skipped unless force is set.
+    """
 
     # pdf analyzing
-    path = '/Volumes/Researches/Curiosity/Drooms/AI Engineer Case study Data/PROD-Duplicate_Detection-120925-214047.pdf'
+    started = time.perf_counter()
+    pdf_hash = file_digest(path)
     handler = ConfluenceService()
     handler.set_file_path(path)
     raw_text = handler.process_pdf()
+    text_hash = text_digest(raw_text)
+    record_stage("main", "pars_pdf", time.perf_counter() - started)
 
-
+    # short sessions around the reads and the final write only: none is held open during the LLM calls
     with Session(dbconnection.engine) as session:
+        current = None if force else FingerprintRepository(session).find_current(pdf_hash=pdf_hash, text_hash=text_hash)
+        if current is not None:
+            return Taxonomy.for_session(session).features[current.feature_id]
+        match = match_source(session, raw_text)
+        known = Taxonomy.for_session(session).features.get(match.feature_id) if match.feature_id is not None else None
+    if match.skip and known is not None and not force:
+        return known
+
+    # 01 - clean the raw text ==============================================
+    started = time.perf_counter()
+    cleaned_text = AgentRegistry.get(DocumentCleanerAgent).invoke(text = raw_text, context=None, history=None)
+    record_stage("main", "well_forming", time.perf_counter() - started)
+
+    # 02 - identity detection (feature and subject) ========================
+    started = time.perf_counter()
+    feature = known # near duplicate of an ingested source: same feature, no detection
+    if feature is None:
+        with Session(dbconnection.engine) as session:
+            feature = FeatureDetectionService(session).detect(cleaned_text)
+    record_stage("main", "feature_detecting", time.perf_counter() - started)
+    if feature is None:
+        raise ValueError("Detected feature is not in the catalog")
+
+    # 03 - generate the corresponding articles; only changed sections of the document reach the merge agent
+    started = time.perf_counter()
+    writer = dbconnection.writer
+    engine = dbconnection.read_engine if writer else dbconnection.engine
+    ArticleService(engine, writer=writer).generate(feature, cleaned_text)
+    with Session(dbconnection.engine) as session:
+        FingerprintRepository(session).add(feature.feature_id, pdf_hash, text_hash, path, MinHasher.to_bytes(match.signature))
+        session.commit()
+        NearDuplicateIndex.for_session(session, check_interval=0)
+    record_stage("main", "generate_articles", time.perf_counter() - started)
+    return feature
 
-        # 01 - clean the raw text ==============================================
-        cleaned_text = DocumentCleanerAgent().invoke(text = raw_text, context=None, history=None)
-
-        # 02 - identity detection (feature and subject) ========================
-        context = FeatureRepository(session).get_names() + "\n"
-        feature_json = FeatureDetectorAgent().invoke(text=cleaned_text, context=context, history=None)
-        feature = FeatureRepository(session).find_by_json(feature_json)
-
-        # 03 - In a loop generate the corresponding articles
-        mark_handler = MarkdownHandler()
-
-        for article_type in feature.article_types:
-
-            last_version_article = ArticleRepository(session).get_article(feature.name, article_type.type_id)
-            if last_version_article: # The new document and article will be combined with the last version
-                last_document_text = mark_handler.load(last_version_article.hash_file_document)
-                last_article_text = mark_handler.load(last_version_article.hash_file_article)
-                new_document_text = DocumentMergeAgent().invoke(text=cleaned_text, history=last_document_text, context=None)
-                new_article_text = ArticleAgentFactory(article_type = article_type.type_id,  text = cleaned_text, history= last_article_text).generate_article()
-            else:
-                new_document_text = cleaned_text
-                new_article_text = ArticleAgentFactory(article_type = article_type.type_id,  text = cleaned_text, history= None).generate_article()
 
-            document_hash_file = mark_handler.set_text(new_document_text).save()
-            article_hash_file = mark_handler.set_text(new_article_text).save()
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Generate the KB articles of Confluence PDF exports, one after the other.")
+    parser.add_argument("pdfs", nargs="+", type=Path)
+    parser.add_argument("--force", action="store_true", help="regenerate documents whose source did not change")
+    args = parser.parse_args(argv)
 
+    # load environment variables ======================
+    load_dotenv()
 
-            if last_version_article: # Update the last version
-                last_version_article.hash_file_document = document_hash_file
-                last_version_article.hash_file_article = article_hash_file
-                article = last_version_article
-            else: # Insert a new version
-                article = Article()
-                article.feature_id = feature.feature_id
-                article.hash_file_document = document_hash_file
-                article.hash_file_article = article_hash_file
+    # Init database ======================
+    dbconnection = DBConnection()
+    db = DBInit(dbconnection)
+    db.initialize()
 
-            article.version +=1
-            session.add(article)
-        session.commit()
+    for path in args.pdfs:
+        feature = process(str(path), dbconnection, force=args.force)
+        print(f"{path}: {feature.subject.name} / {feature.name}")
+    return 0
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
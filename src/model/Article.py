@@ -1,8 +1,11 @@
 from datetime import datetime
 from sqlmodel import SQLModel, Field, Session, create_engine, select
 from datetime import timezone
+from sqlalchemy import Index
 
+# One row per (feature, type): the latest version. Past versions live in ArticleVersion.
 class Article(SQLModel, table=True):
+    __table_args__ = (Index("ux_article_feature_type", "feature_id", "type_id", unique=True),)
     article_id: int | None = Field(default=None, primary_key=True) # AutoIncremental Id
     feature_id: int = Field(foreign_key="feature.feature_id")
     type_id: int = Field(foreign_key="article_type.type_id")
@@ -13,7 +16,7 @@ class Article(SQLModel, table=True):
 
     def __repr__(self):
         return (
-            f"<Document(subject_id={self.subject_id}, "
+            f"<Article(article_id={self.article_id}, "
             f"feature_id={self.feature_id}, type_id={self.type_id}, "
             f"version={self.version})>"
         )
\ No newline at end of file
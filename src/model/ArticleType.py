@@ -10,7 +10,7 @@ class ArticleType(SQLModel, table=True):
     __tablename__ = "article_type"
     type_id: int = Field(primary_key=True)
     feature_id: int = Field(primary_key=True, foreign_key="feature.feature_id")
-    updated_at: datetime = Field(default_factory=lambda:datetime.now(timezone.utc), sa_column_kwargs={"onupdate": datetime.now(timezone.utc)})
+    updated_at: datetime = Field(default_factory=lambda:datetime.now(timezone.utc), sa_column_kwargs={"onupdate": lambda: datetime.now(timezone.utc)})
 
     features: List["Feature"] = Relationship(back_populates="article_types")
     def __repr__(self):
@@ -0,0 +1,24 @@
+from datetime import datetime
+from sqlmodel import SQLModel, Field
+from sqlalchemy import UniqueConstraint
+from datetime import timezone
+
+# Immutable history of every committed article; Article keeps pointing at the latest version.
+class ArticleVersion(SQLModel, table=True):
+    __tablename__ = "article_version"
+    __table_args__ = (UniqueConstraint("feature_id", "type_id", "version", name="ux_article_version_feature_type_version"),)
+
+    version_id: int | None = Field(default=None, primary_key=True) # AutoIncremental Id
+    article_id: int = Field(foreign_key="article.article_id", index=True)
+    feature_id: int = Field(foreign_key="feature.feature_id")
+    type_id: int = Field(foreign_key="article_type.type_id")
+    version: int
+    hash_file_document: str = Field(default="")
+    hash_file_article: str = Field(default="")
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+    def __repr__(self):
+        return (
+            f"<ArticleVersion(feature_id={self.feature_id}, type_id={self.type_id}, "
+            f"version={self.version})>"
+        )
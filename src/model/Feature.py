@@ -8,8 +8,8 @@ from src.model.Subject import Subject
 class Feature(SQLModel, table=True):
     feature_id: int = Field(primary_key=True)
     subject_id: int = Field(foreign_key="subject.subject_id")
-    name: str = Field(nullable=False)
-    updated_at: datetime = Field(default_factory=lambda:datetime.now(timezone.utc), sa_column_kwargs={"onupdate": datetime.now(timezone.utc)})
+    name: str = Field(nullable=False, index=True)
+    updated_at: datetime = Field(default_factory=lambda:datetime.now(timezone.utc), sa_column_kwargs={"onupdate": lambda: datetime.now(timezone.utc)})
 
     subject: Subject = Relationship(back_populates="features")
     article_types: List[ArticleType] = Relationship(back_populates="features")
@@ -0,0 +1,20 @@
+from datetime import datetime
+from sqlmodel import SQLModel, Field
+from datetime import timezone
+
+# One row per successful ingestion of a source document; the latest row of a feature is its current source.
+class SourceFingerprint(SQLModel, table=True):
+    __tablename__ = "source_fingerprint"
+
+    fingerprint_id: int | None = Field(default=None, primary_key=True) # AutoIncremental Id
+    feature_id: int = Field(foreign_key="feature.feature_id", index=True)
+    pdf_hash: str = Field(default="", index=True) # sha256 of the PDF bytes
+    text_hash: str = Field(default="", index=True) # sha256 of the ConfluenceService.clean_text output
+    source_name: str = Field(default="")
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+    def __repr__(self):
+        return (
+            f"<SourceFingerprint(feature_id={self.feature_id}, source_name={self.source_name}, "
+            f"text_hash={self.text_hash[:12]})>"
+        )
@@ -0,0 +1,12 @@
+from sqlmodel import SQLModel, Field
+
+# MinHash signature of the cleaned source text of an ingestion, for the near-duplicate index.
+class SourceSignature(SQLModel, table=True):
+    __tablename__ = "source_signature"
+
+    fingerprint_id: int = Field(foreign_key="source_fingerprint.fingerprint_id", primary_key=True)
+    feature_id: int = Field(foreign_key="feature.feature_id", index=True)
+    signature: bytes # num_perm unsigned 64-bit minimums, little-endian
+
+    def __repr__(self):
+        return f"<SourceSignature(fingerprint_id={self.fingerprint_id}, feature_id={self.feature_id})>"
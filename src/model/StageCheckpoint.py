@@ -0,0 +1,20 @@
+from datetime import datetime
+from sqlmodel import SQLModel, Field
+from sqlalchemy import UniqueConstraint
+from datetime import timezone
+
+# Output of one finished stage of a document in an ingestion run; a resumed run skips the stages recorded here.
+class StageCheckpoint(SQLModel, table=True):
+    __tablename__ = "stage_checkpoint"
+    __table_args__ = (UniqueConstraint("run_id", "document", "stage", name="ux_stage_checkpoint_run_document_stage"),)
+
+    checkpoint_id: int | None = Field(default=None, primary_key=True) # AutoIncremental Id
+    run_id: str = Field(index=True)
+    document: str # source path of the document
+    stage: str # parse, well_forming, feature_detecting, merge:<type>, generate:<type>, commit:<type>, render:<type>, done
+    content_hash: str = Field(default="") # blob store hash of the stage output, "" when it has none
+    meta: str = Field(default="{}") # JSON of the stage metadata
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+    def __repr__(self):
+        return f"<StageCheckpoint(run_id={self.run_id}, document={self.document}, stage={self.stage})>"
@@ -2,9 +2,11 @@ from sqlmodel import select
 from src.model.Feature import Feature
 from src.model.Subject import Subject
 from src.model.Article import Article
-from typing import List
+from src.model.ArticleVersion import ArticleVersion
+from typing import List, Dict, Tuple, Optional, Iterable
 from collections import defaultdict
 from sqlalchemy.orm import selectinload
+import difflib
 import json
 
 class ArticleRepository:
@@ -28,4 +30,69 @@ class ArticleRepository:
             .order_by(Article.article_id)
         ).all()
 
+    # Latest versions ==================================================
+    def get_latest(self, feature_id: int, type_id: int) -> Optional[Article]:
+        return self.session.exec(
+            select(Article)
+            .where(Article.feature_id == feature_id)
+            .where(Article.type_id == type_id)
+        ).first()
+
+    def get_latest_many(self, feature_ids: Iterable[int]) -> Dict[Tuple[int, int], Article]:
+        """Latest article of every (feature_id, type_id) for many features in one query."""
+        feature_ids = list(feature_ids)
+        if not feature_ids:
+            return {}
+        rows = self.session.exec(select(Article).where(Article.feature_id.in_(feature_ids))).all()
+        return {(a.feature_id, a.type_id): a for a in rows}
+
+    # History ==========================================================
+    def add_version(self, article: Article) -> ArticleVersion:
+        """Record the current state of article as a new immutable version (committed by the caller)."""
+        self.session.add(article)
+        self.session.flush()
+        version = ArticleVersion(
+            article_id=article.article_id,
+            feature_id=article.feature_id,
+            type_id=article.type_id,
+            version=article.version,
+            hash_file_document=article.hash_file_document,
+            hash_file_article=article.hash_file_article,
+        )
+        self.session.add(version)
+        return version
+
+    def list_versions(self, feature_id: int, type_id: int, limit: Optional[int] = None) -> List[ArticleVersion]:
+        """Versions newest first, served by the (feature_id, type_id, version) unique index."""
+        statement = (
+            select(ArticleVersion)
+            .where(ArticleVersion.feature_id == feature_id)
+            .where(ArticleVersion.type_id == type_id)
+            .order_by(ArticleVersion.version.desc())
+        )
+        if limit is not None:
+            statement = statement.limit(limit)
+        return self.session.exec(statement).all()
+
+    def get_version(self, feature_id: int, type_id: int, version: int) -> Optional[ArticleVersion]:
+        return self.session.exec(
+            select(ArticleVersion)
+            .where(ArticleVersion.feature_id == feature_id)
+            .where(ArticleVersion.type_id == type_id)
+            .where(ArticleVersion.version == version)
+        ).first()
 
+    def diff_versions(self, feature_id: int, type_id: int, from_version: int, to_version: int,
+                      markdown_handler, field: str = "hash_file_article") -> str:
+        """Unified diff between two stored versions of the article (or document, with field="hash_file_document")."""
+        old = self.get_version(feature_id, type_id, from_version)
+        new = self.get_version(feature_id, type_id, to_version)
+        if old is None or new is None:
+            raise ValueError(f"Unknown version {from_version if old is None else to_version} "
+                             f"for feature {feature_id}, type {type_id}")
+        texts = markdown_handler.load_many([getattr(old, field), getattr(new, field)])
+        return "".join(difflib.unified_diff(
+            texts[getattr(old, field)].splitlines(keepends=True),
+            texts[getattr(new, field)].splitlines(keepends=True),
+            fromfile=f"v{from_version}", tofile=f"v{to_version}",
+        ))
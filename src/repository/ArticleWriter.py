@@ -0,0 +1,119 @@
+import os
+import json
+import queue
+import logging
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from concurrent.futures import Future
+from typing import List, Optional, Tuple, Union
+from sqlmodel import Session
+
+from src.model.Article import Article
+from src.model.StageCheckpoint import StageCheckpoint
+from src.repository.ArticleRepository import ArticleRepository
+from src.repository.CheckpointRepository import CheckpointRepository
+
+
+@dataclass
+class ArticleWrite:
+    feature_id: int
+    type_id: int
+    hash_file_document: str
+    hash_file_article: str
+    # committed with the version, whose number the writer adds to its metadata
+    checkpoint: Optional[StageCheckpoint] = None
+
+
+@dataclass
+class ArticleWriteResult:
+    article_id: int
+    version: int
+
+
+class ArticleWriter:
+    """Single writer thread that groups article commits (and the checkpoints of ingestion runs) from many producers
+    into few transactions."""
+
+    _stop = object()
+
+    def __init__(self, engine, batch_size: int = None, max_wait: float = None):
+        self.engine = engine
+        self.batch_size = batch_size or int(os.getenv("DB_WRITE_BATCH", "64"))
+        # how long the writer waits for more work before committing a partial batch
+        self.max_wait = max_wait if max_wait is not None else float(os.getenv("DB_WRITE_WAIT", "0.005"))
+        self.transactions = 0
+        self.logger = logging.getLogger("ArticleWriter")
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="article-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, write: Union[ArticleWrite, StageCheckpoint]) -> Future:
+        """Queue a new version of an article (or a stage checkpoint); the future resolves to its ArticleWriteResult
+        (None for a checkpoint) once committed."""
+        future = Future()
+        self._queue.put((write, future))
+        return future
+
+    def write(self, write: Union[ArticleWrite, StageCheckpoint]) -> Optional[ArticleWriteResult]:
+        return self.submit(write).result()
+
+    def close(self):
+        self._queue.put(self._stop)
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is self._stop:
+                return
+            batch = [item]
+            stop = False
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get(timeout=self.max_wait)
+                except queue.Empty:
+                    break
+                if item is self._stop:
+                    stop = True
+                    break
+                batch.append(item)
+            self._commit(batch)
+            if stop:
+                return
+
+    def _commit(self, batch: List[Tuple[Union[ArticleWrite, StageCheckpoint], Future]]):
+        try:
+            with Session(self.engine) as session:
+                results = [self._apply(session, write) for write, _ in batch]
+                session.commit()
+                self.transactions += 1
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+        except Exception as e:
+            if len(batch) == 1:
+                self.logger.error(f"Article write failed: {e}")
+                batch[0][1].set_exception(e)
+                return
+            # isolate the failing write, the others still get committed
+            for item in batch:
+                self._commit([item])
+
+    @staticmethod
+    def _apply(session: Session, write: Union[ArticleWrite, StageCheckpoint]) -> Optional[ArticleWriteResult]:
+        if isinstance(write, StageCheckpoint):
+            CheckpointRepository(session).add(write)
+            return None
+        repository = ArticleRepository(session)
+        article = repository.get_latest(write.feature_id, write.type_id)
+        if article is None:
+            article = Article(feature_id=write.feature_id, type_id=write.type_id)
+        article.hash_file_document = write.hash_file_document
+        article.hash_file_article = write.hash_file_article
+        article.version += 1
+        article.last_update = datetime.now(timezone.utc)
+        repository.add_version(article)
+        if write.checkpoint is not None:
+            write.checkpoint.meta = json.dumps(dict(json.loads(write.checkpoint.meta), version=article.version))
+            CheckpointRepository(session).add(write.checkpoint)
+        return ArticleWriteResult(article_id=article.article_id, version=article.version)
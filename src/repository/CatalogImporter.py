@@ -0,0 +1,243 @@
+from __future__ import annotations
+
+import csv
+import sys
+import json
+import time
+import logging
+import argparse
+from pathlib import Path
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Dict, Tuple, Set, List, Optional, Iterable
+
+from sqlalchemy import bindparam, select
+from sqlalchemy.dialects.sqlite import insert
+
+from src.model.Article import Article
+from src.model.ArticleType import ArticleType
+from src.model.Feature import Feature
+from src.model.Subject import Subject
+
+SEED_CATALOG = Path(__file__).with_name("seed_catalog.json")
+
+
+@dataclass
+class Catalog:
+    """Subject → Feature → article types taxonomy, keyed by the database ids."""
+    subjects: Dict[int, Tuple[str, Optional[str]]] = field(default_factory=dict)
+    features: Dict[int, Tuple[int, str]] = field(default_factory=dict)
+    types: Set[Tuple[int, int]] = field(default_factory=set)  # (type_id, feature_id)
+
+    @classmethod
+    def load(cls, path: Path) -> "Catalog":
+        """Read a catalog from .json, .yaml/.yml (nested subjects → features → types) or .csv (one row per feature)."""
+        path = Path(path)
+        suffix = path.suffix.lower()
+        if suffix == ".csv":
+            with open(path, newline="", encoding="utf-8") as file:
+                return cls.from_rows(csv.DictReader(file))
+        if suffix in (".yaml", ".yml"):
+            try:
+                import yaml
+            except ImportError as e:
+                raise RuntimeError("YAML catalogs need PyYAML (pip install pyyaml)") from e
+            with open(path, encoding="utf-8") as file:
+                return cls.from_dict(yaml.safe_load(file))
+        if suffix == ".json":
+            with open(path, encoding="utf-8") as file:
+                return cls.from_dict(json.load(file))
+        raise ValueError(f"Unsupported catalog format '{suffix}'. Valid formats are: .json, .yaml, .yml, .csv")
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Catalog":
+        catalog = cls()
+        for subject in data.get("subjects", []):
+            subject_id = int(subject["subject_id"])
+            catalog.add_subject(subject_id, subject["name"], subject.get("description"))
+            for feature in subject.get("features", []):
+                catalog.add_feature(int(feature["feature_id"]), subject_id, feature["name"], feature.get("types", []))
+        return catalog
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[dict]) -> "Catalog":
+        """CSV columns: subject_id, subject, subject_description, feature_id, feature, types ("1;3")."""
+        catalog = cls()
+        for line, row in enumerate(rows, start=2):
+            try:
+                subject_id = int(row["subject_id"])
+                catalog.add_subject(subject_id, row["subject"].strip(), (row.get("subject_description") or "").strip() or None)
+                if (row.get("feature_id") or "").strip():
+                    types = [t for t in (row.get("types") or "").replace(",", ";").split(";") if t.strip()]
+                    catalog.add_feature(int(row["feature_id"]), subject_id, row["feature"].strip(), types)
+            except (KeyError, ValueError, AttributeError) as e:
+                raise ValueError(f"Invalid catalog row {line}: {e}") from e
+        return catalog
+
+    def add_subject(self, subject_id: int, name: str, description: Optional[str] = None):
+        if subject_id in self.subjects and self.subjects[subject_id][0] != name:
+            raise ValueError(f"Subject {subject_id} is defined twice: '{self.subjects[subject_id][0]}' and '{name}'")
+        if subject_id not in self.subjects or description:
+            self.subjects[subject_id] = (name, description)
+
+    def add_feature(self, feature_id: int, subject_id: int, name: str, types: Iterable = ()):
+        if subject_id not in self.subjects:
+            raise ValueError(f"Feature {feature_id} refers to unknown subject {subject_id}")
+        if feature_id in self.features and self.features[feature_id] != (subject_id, name):
+            raise ValueError(f"Feature {feature_id} is defined twice: '{self.features[feature_id][1]}' and '{name}'")
+        self.features[feature_id] = (subject_id, name)
+        self.types.update((int(type_id), feature_id) for type_id in types)
+
+
+@dataclass
+class TableDiff:
+    inserts: list = field(default_factory=list)
+    updates: list = field(default_factory=list)
+    deletes: list = field(default_factory=list)
+
+    def counts(self) -> dict:
+        return {"inserts": len(self.inserts), "updates": len(self.updates), "deletes": len(self.deletes)}
+
+
+@dataclass
+class CatalogDiff:
+    subjects: TableDiff = field(default_factory=TableDiff)
+    features: TableDiff = field(default_factory=TableDiff)
+    types: TableDiff = field(default_factory=TableDiff)
+    # rows missing from the catalog that are kept because something still refers to them
+    kept: List[str] = field(default_factory=list)
+
+    @property
+    def empty(self) -> bool:
+        return not any(t.inserts or t.updates or t.deletes for t in (self.subjects, self.features, self.types))
+
+    def summary(self) -> dict:
+        return {"subject": self.subjects.counts(), "feature": self.features.counts(),
+                "article_type": self.types.counts(), "kept": len(self.kept)}
+
+
+class CatalogImporter:
+    """Synchronizes the subject/feature/article type tables with a catalog, writing only the rows that changed."""
+
+    # stays below SQLite's bound parameter limit for IN (...) deletes
+    chunk_size = 500
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.logger = logging.getLogger("CatalogImporter")
+
+    def sync(self, catalog: Catalog, prune: bool = False, dry_run: bool = False) -> CatalogDiff:
+        """Upsert new and changed rows (and delete the ones missing from the catalog with prune) in one transaction."""
+        with self.engine.begin() as connection:
+            diff = self._diff(connection, catalog, prune)
+            if dry_run or diff.empty:
+                return diff
+            now = datetime.now(timezone.utc)
+
+            subjects = diff.subjects.inserts + diff.subjects.updates
+            if subjects:
+                statement = insert(Subject.__table__)
+                connection.execute(statement.on_conflict_do_update(
+                    index_elements=["subject_id"],
+                    set_={"name": statement.excluded.name, "description": statement.excluded.description,
+                          "updated_at": statement.excluded.updated_at},
+                ), [{"subject_id": i, "name": n, "description": d, "updated_at": now} for i, n, d in subjects])
+
+            features = diff.features.inserts + diff.features.updates
+            if features:
+                statement = insert(Feature.__table__)
+                connection.execute(statement.on_conflict_do_update(
+                    index_elements=["feature_id"],
+                    set_={"subject_id": statement.excluded.subject_id, "name": statement.excluded.name,
+                          "updated_at": statement.excluded.updated_at},
+                ), [{"feature_id": i, "subject_id": s, "name": n, "updated_at": now} for i, s, n in features])
+
+            if diff.types.inserts:
+                connection.execute(
+                    insert(ArticleType.__table__).on_conflict_do_nothing(index_elements=["type_id", "feature_id"]),
+                    [{"type_id": t, "feature_id": f, "updated_at": now} for t, f in diff.types.inserts])
+
+            if diff.types.deletes:
+                table = ArticleType.__table__
+                connection.execute(
+                    table.delete().where(table.c.type_id == bindparam("t")).where(table.c.feature_id == bindparam("f")),
+                    [{"t": t, "f": f} for t, f in diff.types.deletes])
+            for table, column, ids in ((Feature.__table__, "feature_id", diff.features.deletes),
+                                       (Subject.__table__, "subject_id", diff.subjects.deletes)):
+                for start in range(0, len(ids), self.chunk_size):
+                    connection.execute(table.delete().where(table.c[column].in_(ids[start:start + self.chunk_size])))
+        return diff
+
+    def _diff(self, connection, catalog: Catalog, prune: bool) -> CatalogDiff:
+        subject_table, feature_table, type_table = Subject.__table__, Feature.__table__, ArticleType.__table__
+        current_subjects = {row[0]: (row[1], row[2]) for row in connection.execute(
+            select(subject_table.c.subject_id, subject_table.c.name, subject_table.c.description))}
+        current_features = {row[0]: (row[1], row[2]) for row in connection.execute(
+            select(feature_table.c.feature_id, feature_table.c.subject_id, feature_table.c.name))}
+        current_types = set(connection.execute(select(type_table.c.type_id, type_table.c.feature_id)).all())
+
+        diff = CatalogDiff()
+        for subject_id, (name, description) in catalog.subjects.items():
+            if subject_id not in current_subjects:
+                diff.subjects.inserts.append((subject_id, name, description))
+            elif current_subjects[subject_id] != (name, description):
+                diff.subjects.updates.append((subject_id, name, description))
+        for feature_id, (subject_id, name) in catalog.features.items():
+            if feature_id not in current_features:
+                diff.features.inserts.append((feature_id, subject_id, name))
+            elif current_features[feature_id] != (subject_id, name):
+                diff.features.updates.append((feature_id, subject_id, name))
+        diff.types.inserts = sorted(catalog.types - current_types)
+
+        if prune:
+            # features and article types that already have articles stay, their history would be orphaned otherwise
+            article_table = Article.__table__
+            typed_articles = set(connection.execute(
+                select(article_table.c.type_id, article_table.c.feature_id).distinct()).all())
+            for type_id, feature_id in sorted(current_types - catalog.types):
+                if (type_id, feature_id) in typed_articles:
+                    diff.kept.append(f"article type {type_id} of feature {feature_id} has articles")
+                else:
+                    diff.types.deletes.append((type_id, feature_id))
+            with_articles = {feature_id for _, feature_id in typed_articles}
+            for feature_id in sorted(set(current_features) - set(catalog.features)):
+                if feature_id in with_articles:
+                    diff.kept.append(f"feature {feature_id} '{current_features[feature_id][1]}' has articles")
+                else:
+                    diff.features.deletes.append(feature_id)
+            remaining = {s for f, (s, _) in current_features.items() if f not in diff.features.deletes}
+            remaining.update(s for s, _ in catalog.features.values())
+            for subject_id in sorted(set(current_subjects) - set(catalog.subjects)):
+                if subject_id in remaining:
+                    diff.kept.append(f"subject {subject_id} '{current_subjects[subject_id][0]}' still has features")
+                else:
+                    diff.subjects.deletes.append(subject_id)
+        return diff
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Synchronize the subject/feature catalog from a CSV, YAML or JSON file.")
+    parser.add_argument("catalog", type=Path, help="catalog file (.csv, .yaml, .yml, .json)")
+    parser.add_argument("--prune", action="store_true", help="delete subjects, features and types missing from the catalog")
+    parser.add_argument("--dry-run", action="store_true", help="only print what would change")
+    args = parser.parse_args(argv)
+
+    from dotenv import load_dotenv
+    from src.repository.DBConnection import DBConnection
+    from src.repository.DBInit import DBInit
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, stream=sys.stdout, format=" -[%(levelname)s]: %(message)s")
+    connection = DBConnection()
+    DBInit(connection).initialize()
+
+    started = time.perf_counter()
+    diff = CatalogImporter(connection.engine).sync(Catalog.load(args.catalog), prune=args.prune, dry_run=args.dry_run)
+    for reason in diff.kept:
+        logging.getLogger("CatalogImporter").warning(f"Kept {reason}")
+    print(json.dumps({**diff.summary(), "dry_run": args.dry_run, "seconds": round(time.perf_counter() - started, 3)}))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
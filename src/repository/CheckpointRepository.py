@@ -0,0 +1,65 @@
+from typing import Dict, Iterable, Set
+from sqlmodel import select, delete
+
+from src.model.Article import Article
+from src.model.ArticleVersion import ArticleVersion
+from src.model.StageCheckpoint import StageCheckpoint
+
+
+class CheckpointRepository:
+    # stays below SQLite's bound parameter limit for IN (...) lookups
+    chunk_size = 500
+
+    def __init__(self, session):
+        self.session = session
+
+    def get_document(self, run_id: str, document: str) -> Dict[str, StageCheckpoint]:
+        """Checkpoints of one document of a run, by stage."""
+        rows = self.session.exec(
+            select(StageCheckpoint)
+            .where(StageCheckpoint.run_id == run_id)
+            .where(StageCheckpoint.document == document)
+        ).all()
+        return {row.stage: row for row in rows}
+
+    def add(self, checkpoint: StageCheckpoint) -> StageCheckpoint:
+        """Record a finished stage, replacing an earlier checkpoint of it (committed by the caller)."""
+        self.session.exec(
+            delete(StageCheckpoint)
+            .where(StageCheckpoint.run_id == checkpoint.run_id)
+            .where(StageCheckpoint.document == checkpoint.document)
+            .where(StageCheckpoint.stage == checkpoint.stage)
+        )
+        self.session.add(checkpoint)
+        return checkpoint
+
+    def delete_document(self, run_id: str, document: str):
+        self.session.exec(
+            delete(StageCheckpoint)
+            .where(StageCheckpoint.run_id == run_id)
+            .where(StageCheckpoint.document == document)
+        )
+
+    def get_run_hashes(self, run_id: str, stages: Iterable[str]) -> Set[str]:
+        """Content hashes recorded by the given stages of a run."""
+        return set(self.session.exec(
+            select(StageCheckpoint.content_hash)
+            .where(StageCheckpoint.run_id == run_id)
+            .where(StageCheckpoint.stage.in_(list(stages)))
+            .where(StageCheckpoint.content_hash != "")
+        ).all())
+
+    def delete_run(self, run_id: str):
+        self.session.exec(delete(StageCheckpoint).where(StageCheckpoint.run_id == run_id))
+
+    def get_referenced(self, hashes: Iterable[str]) -> Set[str]:
+        """The hashes still used by an article, an article version or a checkpoint."""
+        hashes = list(hashes)
+        columns = [model.hash_file_document for model in (Article, ArticleVersion)] + \
+                  [model.hash_file_article for model in (Article, ArticleVersion)] + [StageCheckpoint.content_hash]
+        referenced = set()
+        for start in range(0, len(hashes), self.chunk_size):
+            chunk = hashes[start:start + self.chunk_size]
+            for column in columns:
+                referenced.update(self.session.exec(select(column).where(column.in_(chunk))).all())
+        return referenced
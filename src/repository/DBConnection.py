@@ -1,22 +1,96 @@
 import os
+import threading
 from pathlib import Path
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
 from sqlmodel import create_engine
 
 class DBConnection:
 
     _instance = None
     _initialized = False
+    _lock = threading.Lock()
 
     def __new__(cls, *args, **kwargs):
         if cls._instance is None:
             cls._instance = super().__new__(cls)
         return cls._instance
 
-    def __init__(self, db_name = 'documents.db', echo: bool = False):
+    def __init__(self, db_name = 'documents.db', echo: bool = False, concurrent: bool = None):
+        if concurrent is None:
+            concurrent = os.getenv("DB_CONCURRENT", "").strip().lower() in ("1", "true", "yes", "on")
         db_dir = os.getenv("DB_PATH", ".")
         db_path = Path(db_dir) / db_name
-        db_url = f"sqlite:///{db_path}"
-        self.engine = create_engine(db_url, echo=echo)
+        key = (str(db_path), echo, concurrent)
+        with self._lock:
+            # the singleton keeps its engines (and pools) unless it is asked for another database or mode
+            if self._initialized and self._key == key:
+                return
+            self._key = key
+            self.db_path = db_path
+            self.concurrent = concurrent
+            self._writer = None
+            if concurrent:
+                self._create_concurrent_engines(db_path, echo)
+            else:
+                db_url = f"sqlite:///{db_path}"
+                self.engine = create_engine(db_url, echo=echo)
+                self.read_engine = self.engine
+            self._initialized = True
+
+    def _create_concurrent_engines(self, db_path: Path, echo: bool):
+        busy_timeout = float(os.getenv("DB_BUSY_TIMEOUT", "30"))
+        pool_size = int(os.getenv("DB_READ_POOL_SIZE", "8"))
+
+        self.engine = create_engine(
+            f"sqlite:///{db_path}", echo=echo,
+            connect_args={"timeout": busy_timeout, "check_same_thread": False},
+        )
+        event.listen(self.engine, "connect", self._writer_pragmas)
+        # WAL has to be switched on once before read-only connections can open the database
+        with self.engine.connect():
+            pass
+
+        self.read_engine = create_engine(
+            f"sqlite:///file:{db_path.resolve()}?mode=ro&uri=true", echo=echo,
+            connect_args={"timeout": busy_timeout, "check_same_thread": False},
+            poolclass=QueuePool, pool_size=pool_size, max_overflow=pool_size,
+        )
+        event.listen(self.read_engine, "connect", self._reader_pragmas)
+
+    @staticmethod
+    def _writer_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={int(float(os.getenv('DB_BUSY_TIMEOUT', '30')) * 1000)}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute("PRAGMA cache_size=-65536")
+        cursor.execute("PRAGMA wal_autocheckpoint=4000")
+        cursor.close()
+
+    @staticmethod
+    def _reader_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"PRAGMA busy_timeout={int(float(os.getenv('DB_BUSY_TIMEOUT', '30')) * 1000)}")
+        cursor.execute("PRAGMA query_only=ON")
+        cursor.execute("PRAGMA cache_size=-16384")
+        cursor.execute("PRAGMA mmap_size=268435456")
+        cursor.close()
 
     def get_engine(self):
         return self.engine
+
+    def get_read_engine(self):
+        return self.read_engine
+
+    @property
+    def writer(self):
+        """Single-writer commit queue for articles; only used in concurrent mode."""
+        if not self.concurrent:
+            return None
+        with self._lock:
+            if self._writer is None:
+                from src.repository.ArticleWriter import ArticleWriter
+                self._writer = ArticleWriter(self.engine)
+            return self._writer
@@ -1,15 +1,21 @@
 from __future__ import annotations
 import os
+import logging
 from pathlib import Path
 from datetime import datetime, timezone
 from typing import Iterable
 from sqlmodel import SQLModel, Field, Session, create_engine, select, delete
 
 from src.model.Article import Article
+from src.model.ArticleVersion import ArticleVersion
 from src.model.ArticleType import ArticleType
 from src.model.Feature import Feature
 from src.model.Subject import Subject
+from src.model.SourceFingerprint import SourceFingerprint
+from src.model.SourceSignature import SourceSignature
+from src.model.StageCheckpoint import StageCheckpoint
 from src.repository.DBConnection import DBConnection
+from src.repository.CatalogImporter import Catalog, CatalogImporter, SEED_CATALOG
 from sqlalchemy import inspect
 
 class DBInit:
@@ -26,6 +32,30 @@ class DBInit:
         if not inspect(self.engine).has_table('article'):
             self.create_tables()
             self.seed_data()
+        else:
+            self.migrate()
+
+    def migrate(self):
+        # create_all only adds missing tables; indexes of tables created by older releases are added here
+        self.create_tables()
+        with self.engine.begin() as connection:
+            connection.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_feature_name ON feature (name)")
+        try:
+            with self.engine.begin() as connection:
+                connection.exec_driver_sql(
+                    "CREATE UNIQUE INDEX IF NOT EXISTS ux_article_feature_type ON article (feature_id, type_id)")
+        except Exception as e:
+            logging.getLogger("DBInit").warning(f"Duplicate articles per feature and type, index not created: {e}")
+        # articles written before the version history existed become their first recorded version
+        with self.engine.begin() as connection:
+            connection.exec_driver_sql(
+                "INSERT INTO article_version "
+                "(article_id, feature_id, type_id, version, hash_file_document, hash_file_article, created_at) "
+                "SELECT a.article_id, a.feature_id, a.type_id, a.version, a.hash_file_document, a.hash_file_article, a.last_update "
+                "FROM article a WHERE a.version > 0 AND NOT EXISTS ("
+                " SELECT 1 FROM article_version v"
+                " WHERE v.feature_id = a.feature_id AND v.type_id = a.type_id AND v.version = a.version)"
+            )
 
     def create_tables(self):
         SQLModel.metadata.create_all(self.engine)
@@ -37,75 +67,12 @@ class DBInit:
         with Session(self.engine) as session:
             session.exec(delete(Feature))
             session.exec(delete(Subject))
+            session.exec(delete(ArticleVersion))
             session.exec(delete(Article))
             session.exec(delete(ArticleType))
             session.commit()
 
     def seed_data(self):
-        self.seed_subjects()
-        self.seed_features()
-        self.seed_types()
-
-    def _seed_entities(self, entities, entity_class):
-        with Session(self.engine) as session:
-            for entity in entities:
-                session.add(entity)
-            session.commit()
-
-    def seed_subjects(self):
-        subjects = [
-            Subject(subject_id=0, name="Getting Started", description="Description for Subject A"),
-            Subject(subject_id=1, name="Configuration", description="Description for Subject B"),
-            Subject(subject_id=2, name="Main Functionality", description="Description for Subject C"),
-            Subject(subject_id=3, name="AI Assistant", description="Description for Subject D"),
-            Subject(subject_id=4, name="Chat", description="Description for Subject E"),
-            Subject(subject_id=5, name="Using the Q&A", description="Description for Subject F"),
-            Subject(subject_id=6, name="Redaction", description="Description for Subject G")]
-        self._seed_entities(subjects, Subject)
-
-    def seed_features(self):
-        features = [
-            Feature(feature_id=1, subject_id=1, name="User Account Setup", description=""),
-            Feature(feature_id=2, subject_id=1, name="Personal Notifications Settings", description=""),
-            Feature(feature_id=3, subject_id=2, name="Navigating Projects", description=""),
-            Feature(feature_id=4, subject_id=2, name="Index Features", description=""),
-            Feature(feature_id=5, subject_id=2, name="Searching and Filtering", description=""),
-            Feature(feature_id=6, subject_id=3, name="Using AI", description=""),
-            Feature(feature_id=7, subject_id=5, name="Q&A Introduction", description=""),
-            Feature(feature_id=8, subject_id=5, name="Question Role", description=""),
-            Feature(feature_id=9, subject_id=5, name="Selection Role", description=""),
-            Feature(feature_id=10, subject_id=5, name="Distribution Role", description=""),
-            Feature(feature_id=11,subject_id=5,  name="Answer Role", description=""),
-            Feature(feature_id=12,subject_id=5,  name="Approval Role", description=""),
-            Feature(feature_id=13,subject_id=5,  name="Visitor Role", description=""),
-            Feature(feature_id=14,subject_id=6,  name="Redacting Documents", description=""),
-            Feature(feature_id=15,subject_id=6,  name="Redacting Search Terms", description=""),
-            Feature(feature_id=16,subject_id=6,  name="Redacting Terms Matching Sensitive Data Categories", description=""),
-            Feature(feature_id=17,subject_id=6,  name="Redacting Selected Document Areas", description=""),
-            Feature(feature_id=18,subject_id=6,  name="Batch Redacting Documents", description="")]
-        self._seed_entities(features, Feature)
-
-    def seed_types(self):
-        types = [
-            ArticleType(type_id=3, feature_id=1),
-            ArticleType(type_id=3, feature_id=2),
-            ArticleType(type_id=3, feature_id=3),
-            ArticleType(type_id=3, feature_id=4),
-            ArticleType(type_id=1, feature_id=5),
-            ArticleType(type_id=3, feature_id=5),
-            ArticleType(type_id=1, feature_id=6),
-            ArticleType(type_id=3, feature_id=6),
-            ArticleType(type_id=3, feature_id=7),
-            ArticleType(type_id=3, feature_id=8),
-            ArticleType(type_id=3, feature_id=9),
-            ArticleType(type_id=3, feature_id=10),
-            ArticleType(type_id=3, feature_id=11),
-            ArticleType(type_id=3, feature_id=12),
-            ArticleType(type_id=3, feature_id=13),
-            ArticleType(type_id=3, feature_id=14),
-            ArticleType(type_id=3, feature_id=15),
-            ArticleType(type_id=3, feature_id=16),
-            ArticleType(type_id=3, feature_id=17),
-            ArticleType(type_id=3, feature_id=18),
-            ]
-        self._seed_entities(types, ArticleType)
\ No newline at end of file
+        # CATALOG_PATH points to the real taxonomy; the bundled catalog only holds the demo subjects and features
+        catalog_path = os.getenv("CATALOG_PATH") or SEED_CATALOG
+        CatalogImporter(self.engine).sync(Catalog.load(catalog_path))
@@ -1,6 +1,7 @@
-from sqlmodel import select
+from sqlmodel import select, func
 from src.model.Feature import Feature
 from src.model.Subject import Subject
+from src.model.ArticleType import ArticleType
 from collections import defaultdict
 from sqlalchemy.orm import selectinload
 import json
@@ -28,6 +29,31 @@ class FeatureRepository:
 
         return "\n".join(lines)
 
+    def get_catalog(self) -> list[tuple[int, str, str, str]]:
+        """(feature_id, feature name, subject name, subject description) of every feature."""
+        return self.session.exec(
+            select(Feature.feature_id, Feature.name, Subject.name, Subject.description)
+            .join(Subject, Feature.subject_id == Subject.subject_id)
+            .order_by(Subject.name, Feature.name)
+        ).all()
+
+    def get_features(self) -> list[Feature]:
+        """Every feature with its subject and article types loaded."""
+        return self.session.exec(
+            select(Feature).options(selectinload(Feature.subject), selectinload(Feature.article_types))
+        ).all()
+
+    def catalog_version(self) -> tuple:
+        """Cheap fingerprint of the catalog; changes whenever a subject, feature or article type is added, removed or updated."""
+        return tuple(self.session.exec(select(
+            select(func.count(Feature.feature_id)).scalar_subquery(),
+            select(func.max(Feature.updated_at)).scalar_subquery(),
+            select(func.count(Subject.subject_id)).scalar_subquery(),
+            select(func.max(Subject.updated_at)).scalar_subquery(),
+            select(func.count()).select_from(ArticleType).scalar_subquery(),
+            select(func.max(ArticleType.updated_at)).scalar_subquery(),
+        )).one())
+
     def find_by_name(self, feature_name: str, subject_name: str) -> Feature:
         statement = (
             select(Feature)
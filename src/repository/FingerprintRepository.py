@@ -0,0 +1,72 @@
+from hashlib import sha256
+from pathlib import Path
+from typing import Optional, List, Tuple
+from sqlmodel import select
+from sqlalchemy.orm import aliased
+
+from src.model.SourceFingerprint import SourceFingerprint
+from src.model.SourceSignature import SourceSignature
+
+
+def file_digest(path, chunk_size: int = 1 << 20) -> str:
+    digest = sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def text_digest(text: str) -> str:
+    return sha256((text or "").replace("\r\n", "\n").strip().encode("utf-8")).hexdigest()
+
+
+class FingerprintRepository:
+    def __init__(self, session):
+        self.session = session
+
+    def find_current(self, pdf_hash: str = None, text_hash: str = None) -> Optional[SourceFingerprint]:
+        """Fingerprint matching pdf_hash or text_hash that is still the latest ingestion of its feature."""
+        if not pdf_hash and not text_hash:
+            return None
+        newer = aliased(SourceFingerprint)
+        statement = select(SourceFingerprint).where(
+            ~select(newer.fingerprint_id)
+            .where(newer.feature_id == SourceFingerprint.feature_id)
+            .where(newer.fingerprint_id > SourceFingerprint.fingerprint_id)
+            .exists()
+        )
+        if pdf_hash and text_hash:
+            statement = statement.where((SourceFingerprint.pdf_hash == pdf_hash) | (SourceFingerprint.text_hash == text_hash))
+        elif pdf_hash:
+            statement = statement.where(SourceFingerprint.pdf_hash == pdf_hash)
+        else:
+            statement = statement.where(SourceFingerprint.text_hash == text_hash)
+        return self.session.exec(statement.order_by(SourceFingerprint.fingerprint_id.desc())).first()
+
+    def get_latest(self, feature_id: int) -> Optional[SourceFingerprint]:
+        return self.session.exec(
+            select(SourceFingerprint)
+            .where(SourceFingerprint.feature_id == feature_id)
+            .order_by(SourceFingerprint.fingerprint_id.desc())
+        ).first()
+
+    def add(self, feature_id: int, pdf_hash: str, text_hash: str, source_name: str = "",
+            signature: bytes = None) -> SourceFingerprint:
+        """Record a successful ingestion, with the MinHash signature of its text when given (committed by the caller)."""
+        fingerprint = SourceFingerprint(feature_id=feature_id, pdf_hash=pdf_hash or "", text_hash=text_hash,
+                                        source_name=Path(source_name).name if source_name else "")
+        self.session.add(fingerprint)
+        if signature is not None:
+            self.session.flush()
+            self.session.add(SourceSignature(fingerprint_id=fingerprint.fingerprint_id, feature_id=feature_id,
+                                             signature=signature))
+        return fingerprint
+
+    def get_since(self, fingerprint_id: int) -> List[Tuple[SourceFingerprint, Optional[bytes]]]:
+        """Fingerprints recorded after fingerprint_id, oldest first, with their signatures (None when missing)."""
+        return self.session.exec(
+            select(SourceFingerprint, SourceSignature.signature)
+            .outerjoin(SourceSignature, SourceSignature.fingerprint_id == SourceFingerprint.fingerprint_id)
+            .where(SourceFingerprint.fingerprint_id > fingerprint_id)
+            .order_by(SourceFingerprint.fingerprint_id)
+        ).all()
@@ -0,0 +1,360 @@
+from __future__ import annotations
+
+import os
+import sys
+import json
+import time
+import heapq
+import uuid
+import signal
+import logging
+import argparse
+import itertools
+import threading
+from hashlib import sha256
+from pathlib import Path
+from dataclasses import dataclass, field, asdict
+from concurrent.futures import ProcessPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import urlparse, parse_qs
+
+from dotenv import load_dotenv
+from sqlmodel import Session
+from src.Agents.agents import AgentRegistry, FeatureDetectorAgent, DocumentCleanerAgent, DocumentMergeAgent
+from src.Agents.ArticleAgentFactory import ArticleAgentFactory
+from src.repository.DBConnection import DBConnection
+from src.repository.DBInit import DBInit
+from src.service.detection import DetectionBatcher
+from src.service.feature_index import FeatureIndex
+from src.service.metrics import metrics
+from src.service.near_duplicates import NearDuplicateIndex
+from src.service.pipeline import IngestionPipeline
+from src.service.render import RenderQueue
+from src.service.taxonomy import Taxonomy
+
+FINAL = ("ok", "unchanged", "error", "cancelled")
+
+
+@dataclass
+class Job:
+    job_id: str
+    pdf_path: str
+    priority: int = 0  # higher runs first; equal priorities run in submission order
+    force: bool = False
+    status: str = "queued"  # queued, running, then ok, unchanged, error or cancelled
+    submitted_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class JobQueue:
+    """Priority queue of ingestion jobs run by a pool of worker threads; finished jobs stay queryable
+    until history newer ones have finished."""
+
+    def __init__(self, run: Callable[[Job], str], workers: int = None, history: int = None):
+        self.run = run
+        self.workers = workers or int(os.getenv("SERVICE_WORKERS", "4"))
+        self.history = history or int(os.getenv("SERVICE_JOB_HISTORY", "1000"))
+        self.jobs: Dict[str, Job] = {}
+        self.logger = logging.getLogger("JobQueue")
+        self._heap: List[tuple] = []
+        self._order = itertools.count()
+        self._finished: List[str] = []
+        self._cond = threading.Condition()
+        self._closed = False
+        self._threads = [threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+                         for i in range(self.workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, pdf_path: str, priority: int = 0, force: bool = False) -> Job:
+        job = Job(uuid.uuid4().hex[:12], str(pdf_path), priority, force)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("the job queue is closed")
+            self.jobs[job.job_id] = job
+            heapq.heappush(self._heap, (-priority, next(self._order), job.job_id))
+            self._cond.notify()
+        metrics.inc("kb_service_jobs_total", help="Jobs submitted to the ingestion service")
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self.jobs.get(job_id)
+
+    def list(self, status: str = None) -> List[Job]:
+        with self._cond:
+            return [job for job in self.jobs.values() if status is None or job.status == status]
+
+    def counts(self) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for job in self.list():
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return counts
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a job that has not started yet."""
+        with self._cond:
+            job = self.jobs.get(job_id)
+            if job is None or job.status != "queued":
+                return False
+            self._finish(job, "cancelled")
+            return True
+
+    def close(self, wait: bool = True):
+        """Stop taking jobs and cancel the queued ones; the running ones finish unless wait is False."""
+        with self._cond:
+            self._closed = True
+            for job in self.jobs.values():
+                if job.status == "queued":
+                    self._finish(job, "cancelled")
+            self._cond.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+    def _work(self):
+        while True:
+            with self._cond:
+                job = None
+                while job is None:
+                    while not self._heap and not self._closed:
+                        self._cond.wait()
+                    if not self._heap:
+                        return
+                    _, _, job_id = heapq.heappop(self._heap)
+                    job = self.jobs.get(job_id)
+                    if job is not None and job.status != "queued":  # cancelled while waiting
+                        job = None
+                job.status, job.started_at = "running", time.time()
+            try:
+                status = self.run(job)
+            except Exception as e:
+                self.logger.exception(f"Job {job.job_id} failed")
+                job.error, status = str(e), "error"
+            with self._cond:
+                self._finish(job, status if status in FINAL else "error")
+
+    def _finish(self, job: Job, status: str):
+        """Called with the lock held."""
+        job.status, job.finished_at = status, time.time()
+        metrics.inc("kb_service_jobs_finished_total", help="Jobs of the ingestion service by outcome", status=status)
+        self._finished.append(job.job_id)
+        while len(self._finished) > self.history:
+            self.jobs.pop(self._finished.pop(0), None)
+
+
+class IngestionService:
+    """Warm process for ingestion jobs: engines, the catalog, agents and their HTTP clients, the extraction
+    processes and the indexes are created once and reused by every job."""
+
+    def __init__(self, connection: DBConnection, workers: int = None, upload_dir: Path = None,
+                 extract_workers: int = None, renderer: Optional[RenderQueue] = None):
+        self.connection = connection
+        workers = workers or int(os.getenv("SERVICE_WORKERS", "4"))
+        self.upload_dir = Path(upload_dir or os.getenv("UPLOAD_PATH") or Path(os.getenv("DB_PATH", ".")) / "uploads")
+        self.pipeline = IngestionPipeline(connection, renderer=renderer)
+        self.extract_workers = extract_workers or int(os.getenv("EXTRACT_WORKERS", str(os.cpu_count() or 1)))
+        self.extractor = ProcessPoolExecutor(max_workers=self.extract_workers)
+        self.renderer = renderer
+        self.logger = logging.getLogger("IngestionService")
+        self.warmed_in = self.warm_up(workers)
+        self.queue = JobQueue(self.run_job, workers)
+
+    def warm_up(self, workers: int) -> float:
+        started = time.perf_counter()
+        DBInit(self.connection).initialize()
+        with Session(self.connection.read_engine) as session:
+            taxonomy = Taxonomy.for_session(session)
+            FeatureIndex.for_taxonomy(taxonomy, key=str(session.get_bind().url))
+            NearDuplicateIndex.for_session(session)
+        for agent_class in (DocumentCleanerAgent, FeatureDetectorAgent, DocumentMergeAgent,
+                            *ArticleAgentFactory.agent_classes.values()):
+            AgentRegistry.get(agent_class)
+        # start the extraction processes now, so the first jobs do not pay for it
+        for future in [self.extractor.submit(os.getpid) for _ in range(self.extract_workers)]:
+            future.result()
+        if workers > 1 and self.pipeline.detect_batch_size > 1:
+            # jobs reaching detection together share one LLM call
+            self.pipeline.detector = DetectionBatcher(self.connection.read_engine, self.pipeline.detect_batch_size)
+        seconds = time.perf_counter() - started
+        self.logger.info(f"Warmed up in {seconds:.2f}s ({len(taxonomy.features)} features)")
+        return seconds
+
+    def submit_path(self, pdf_path: str, priority: int = 0, force: bool = False) -> Job:
+        path = Path(pdf_path).expanduser()
+        if not path.is_file():
+            raise FileNotFoundError(f"No such file: {pdf_path}")
+        return self.queue.submit(str(path.resolve()), priority, force)
+
+    def submit_upload(self, data: bytes, name: str = None, priority: int = 0, force: bool = False) -> Job:
+        """Store an uploaded PDF under its content hash (identical uploads share one file) and queue it."""
+        if not data.startswith(b"%PDF"):
+            raise ValueError("the upload is not a PDF")
+        self.upload_dir.mkdir(parents=True, exist_ok=True)
+        stem = Path(name).stem if name else "upload"
+        path = self.upload_dir / f"{sha256(data).hexdigest()[:16]}-{stem}.pdf"
+        if not path.exists():
+            tmp = path.with_suffix(".tmp")
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+        return self.queue.submit(str(path), priority, force)
+
+    def run_job(self, job: Job) -> str:
+        result = self.pipeline.process_pdf(job.pdf_path, extractor=self.extractor, force=job.force)
+        job.result, job.error = result.to_dict(), result.error
+        return result.status
+
+    def health(self) -> Dict[str, Any]:
+        return {"status": "ok", "workers": self.queue.workers, "warmed_in": round(self.warmed_in, 3),
+                "jobs": self.queue.counts()}
+
+    def close(self):
+        self.queue.close()
+        if self.pipeline.detector is not None:
+            self.pipeline.detector.close()
+        self.extractor.shutdown()
+        if self.renderer is not None:
+            self.renderer.shutdown()
+
+
+class IngestionServer(ThreadingHTTPServer):
+    """Local JSON API of an IngestionService.
+
+    POST   /jobs            {"path": "...", "priority": 0, "force": false}, or a PDF body (?name=&priority=&force=)
+    GET    /jobs[?status=]  all known jobs
+    GET    /jobs/<id>       status and, once finished, the document result
+    DELETE /jobs/<id>       cancel a queued job
+    GET    /health          queue and warm-up summary
+    GET    /metrics         Prometheus text format
+    """
+
+    daemon_threads = True
+
+    def __init__(self, service: IngestionService, host: str = "127.0.0.1", port: int = 8080):
+        super().__init__((host, port), _Handler)
+        self.service = service
+        self.max_upload = int(float(os.getenv("SERVICE_MAX_UPLOAD_MB", "100")) * 1024 * 1024)
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: IngestionServer
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        logging.getLogger("IngestionServer").debug(format, *args)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        parts = [p for p in url.path.split("/") if p]
+        queue = self.server.service.queue
+        if parts == ["health"]:
+            return self._json(200, self.server.service.health())
+        if parts == ["metrics"]:
+            return self._send(200, metrics.to_prometheus().encode(), "text/plain; version=0.0.4")
+        if parts == ["jobs"]:
+            status = parse_qs(url.query).get("status", [None])[0]
+            return self._json(200, {"jobs": [job.to_dict() for job in queue.list(status)]})
+        if len(parts) == 2 and parts[0] == "jobs":
+            job = queue.get(parts[1])
+            return self._json(200, job.to_dict()) if job else self._error(404, f"no job {parts[1]}")
+        self._error(404, f"no route {url.path}")
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path.rstrip("/") != "/jobs":
+            return self._error(404, f"no route {url.path}")
+        length = int(self.headers.get("content-length", 0))
+        if length > self.server.max_upload:
+            return self._error(413, f"the upload exceeds {self.server.max_upload} bytes")
+        body = self.rfile.read(length)
+        service = self.server.service
+        try:
+            if self.headers.get("content-type", "").startswith("application/json"):
+                request = json.loads(body or b"{}")
+                job = service.submit_path(request["path"], int(request.get("priority", 0)), bool(request.get("force")))
+            else:
+                query = parse_qs(url.query)
+                job = service.submit_upload(body, query.get("name", [None])[0], int(query.get("priority", ["0"])[0]),
+                                            query.get("force", ["0"])[0].lower() in ("1", "true", "yes"))
+        except (KeyError, ValueError, TypeError, FileNotFoundError) as e:
+            return self._error(400, str(e))
+        except RuntimeError as e:
+            return self._error(503, str(e))
+        self._json(202, job.to_dict())
+
+    def do_DELETE(self):
+        parts = [p for p in urlparse(self.path).path.split("/") if p]
+        if len(parts) != 2 or parts[0] != "jobs":
+            return self._error(404, f"no route {self.path}")
+        if self.server.service.queue.cancel(parts[1]):
+            return self._json(200, self.server.service.queue.get(parts[1]).to_dict())
+        self._error(409, f"job {parts[1]} is unknown or already started")
+
+    def _json(self, status: int, payload: dict):
+        self._send(status, json.dumps(payload).encode(), "application/json")
+
+    def _error(self, status: int, message: str):
+        self._json(status, {"error": message})
+
+    def _send(self, status: int, data: bytes, content_type: str):
+        self.send_response(status)
+        self.send_header("content-type", content_type)
+        self.send_header("content-length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def _interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Local ingestion service: a warm process running queued PDF jobs.")
+    parser.add_argument("--host", default=os.getenv("SERVICE_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("SERVICE_PORT", "8080")), help="0 picks a free port")
+    parser.add_argument("--workers", type=int, default=None, help="jobs run at once (SERVICE_WORKERS)")
+    parser.add_argument("--extract-workers", type=int, default=None, help="PDF extraction processes (EXTRACT_WORKERS)")
+    parser.add_argument("--upload-dir", type=Path, default=None, help="where uploaded PDFs are kept (UPLOAD_PATH)")
+    parser.add_argument("--render", nargs="?", const="pdf", choices=["pdf", "html"], default=None,
+                        help="render generated articles in the background")
+    parser.add_argument("--fake-llm", type=float, default=None, metavar="LATENCY",
+                        help="answer with the offline fake chat model (seconds per call) instead of OpenAI")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    logging.getLogger("agents").setLevel(logging.ERROR)
+    logging.getLogger("agents").propagate = False
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    logging.getLogger("openai").setLevel(logging.WARNING)
+    logging.basicConfig(level=logging.INFO, stream=sys.stdout, format=" -[%(levelname)s]: %(message)s")
+    if args.fake_llm is not None:
+        from src.benchmarks import fake_llm
+        fake_llm.install(fake_llm.FakeChatModel(latency=args.fake_llm, tokens_per_second=0))
+
+    service = IngestionService(DBConnection(), args.workers, args.upload_dir, args.extract_workers,
+                               renderer=RenderQueue(fmt=args.render) if args.render else None)
+    server = IngestionServer(service, args.host, args.port)
+    print(f"Listening on {server.url}", flush=True)
+    signal.signal(signal.SIGTERM, _interrupt)  # shut down like on Ctrl+C, so the extraction processes exit too
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,296 @@
+import os
+import asyncio
+import logging
+from datetime import datetime, timezone
+from dataclasses import dataclass
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from typing import Optional, List, Dict, Callable, Tuple
+from sqlmodel import Session
+
+from src.Agents.agents import AgentRegistry, DocumentMergeAgent
+from src.Agents.ArticleAgentFactory import ArticleAgentFactory
+from src.model.Article import Article
+from src.model.Feature import Feature
+from src.repository.ArticleRepository import ArticleRepository
+from src.repository.CheckpointRepository import CheckpointRepository
+from src.repository.ArticleWriter import ArticleWriter, ArticleWrite
+from src.service.checkpoints import DocumentCheckpoints
+from src.service.markdown import MarkdownHandler
+from src.service.sections import SectionMerger
+from src.service.render import RenderQueue
+from src.service.ratelimit import LLMCallError
+
+
+@dataclass
+class ArticleJob:
+    type_id: int
+    type_name: str
+    last_version: Optional[Article] = None
+    last_document_text: Optional[str] = None
+    last_article_text: Optional[str] = None
+    new_document_text: str = None
+    new_article_text: str = None
+    new_article_hash: str = None  # set instead of new_article_text when the article was streamed into the store
+
+
+@dataclass
+class GeneratedArticle:
+    type_id: int
+    type_name: str
+    version: int
+    hash_file_document: str
+    hash_file_article: str
+    file_name: str
+    render: Optional[Future] = None  # resolves to the rendered file once the background render finished
+
+
+class ArticleGenerationError(LLMCallError):
+    """Some article types could not be generated; the others were committed and are in generated."""
+
+    def __init__(self, generated: List[GeneratedArticle], failed: Dict[int, LLMCallError]):
+        names = ", ".join(f"{ArticleService.article_kinds.get(t, t)} ({e})" for t, e in failed.items())
+        super().__init__("ArticleService", f"{len(failed)} article type(s) failed: {names}", cause=next(iter(failed.values())))
+        self.generated = generated
+        self.failed = failed
+
+
+class ArticleService:
+    """Generates the articles of a feature; LLM calls fan out, DB commits and file saves stay serialized."""
+
+    article_kinds = {1: "FAQ", 2: "Troubleshooting", 3: "Tutorials"}
+
+    def __init__(self, engine, markdown_handler: MarkdownHandler = None, max_workers: int = None,
+                 renderer: Optional[RenderQueue] = None, writer: Optional[ArticleWriter] = None,
+                 stream: bool = False, on_token: Callable[[str, str], None] = None):
+        self.engine = engine  # only used for reads when a writer is given
+        self.writer = writer
+        self.markdown_handler = markdown_handler or MarkdownHandler()
+        self.max_workers = max_workers or int(os.getenv("ARTICLE_CONCURRENCY", "4"))
+        self.renderer = renderer  # None only stores the Markdown
+        # articles are streamed into the Markdown store; on_token(type_name, piece) sees the pieces as they arrive
+        self.stream = stream or on_token is not None
+        self.on_token = on_token
+        self.logger = logging.getLogger("ArticleService")
+
+    def generate(self, feature: Feature, well_formed_text: str, type_ids: Optional[List[int]] = None,
+                 checkpoints: Optional[DocumentCheckpoints] = None) -> List[GeneratedArticle]:
+        """Generate and commit the articles of feature (only type_ids when given, e.g. to retry failed ones).
+
+        With checkpoints, the merge, generate, commit and render stages of every article type are recorded in the
+        document's run and the ones an interrupted run already finished are skipped.
+        Raises ArticleGenerationError after committing the others when an article type fails its LLM calls.
+        """
+        results, failed = [], {}
+        # 01 - read the previous versions; like agenerate, no session is held across the LLM calls =======
+        with Session(self.engine) as session:
+            jobs = self._jobs(session, feature, type_ids)
+        if checkpoints is not None:  # article types committed before the run was interrupted
+            for job in list(jobs):
+                committed = checkpoints.meta(f"commit:{job.type_name}")
+                if committed is not None:
+                    jobs.remove(job)
+                    results.append(self._generated(feature, job, committed["hash_file_document"],
+                                                   committed["hash_file_article"], committed["version"], checkpoints))
+        if not jobs:
+            return results
+
+        # 02 - fan out the LLM calls of all article types ===============================
+        workers = max(1, min(self.max_workers, len(jobs)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="article") as pool:
+            futures = {pool.submit(self._compose, job, well_formed_text, checkpoints): job for job in jobs}
+
+            # 03 - save and commit each article as soon as it is ready (serial) =========
+            for future in as_completed(futures):
+                try:
+                    job = future.result()
+                except LLMCallError as e:
+                    failed[futures[future].type_id] = e
+                    continue
+                results.append(self._commit(feature, job, checkpoints))
+        if failed:
+            raise ArticleGenerationError(results, failed)
+        return results
+
+    async def agenerate(self, feature: Feature, well_formed_text: str, type_ids: Optional[List[int]] = None) -> List[GeneratedArticle]:
+        """Async counterpart of generate for event loop callers: the article types are composed as concurrent
+        coroutines (at most max_workers at a time) and the articles are invoked whole instead of streamed.
+
+        Sessions are only opened around the reads and each commit, never across an LLM call.
+        """
+        results, failed = [], {}
+        with Session(self.engine) as session:
+            jobs = self._jobs(session, feature, type_ids)
+        slots = asyncio.Semaphore(max(1, self.max_workers))
+
+        async def compose(job: ArticleJob):
+            async with slots:
+                try:
+                    return await self._acompose(job, well_formed_text), None
+                except LLMCallError as e:
+                    return job, e
+
+        for next_done in asyncio.as_completed([compose(job) for job in jobs]):
+            job, error = await next_done
+            if error is not None:
+                failed[job.type_id] = error
+                continue
+            results.append(await self._acommit(feature, job))
+        if failed:
+            raise ArticleGenerationError(results, failed)
+        return results
+
+    def _jobs(self, session: Session, feature: Feature, type_ids: Optional[List[int]]) -> List[ArticleJob]:
+        jobs = []
+        repository = ArticleRepository(session)
+        latest = repository.get_latest_many([feature.feature_id])
+        for article_type in feature.article_types:
+            if type_ids is not None and article_type.type_id not in type_ids:
+                continue
+            job = ArticleJob(type_id=article_type.type_id, type_name=self.article_kinds[article_type.type_id])
+            job.last_version = latest.get((feature.feature_id, job.type_id))
+            if job.last_version:
+                self.logger.info(f"For feature: {feature.name},a article type \"{job.type_name}\" already exists.")
+            jobs.append(job)
+
+        previous = [j.last_version for j in jobs if j.last_version]
+        texts = self.markdown_handler.load_many(
+            [a.hash_file_document for a in previous] + [a.hash_file_article for a in previous])
+        for job in jobs:
+            if job.last_version:
+                job.last_document_text = texts[job.last_version.hash_file_document]
+                job.last_article_text = texts[job.last_version.hash_file_article]
+        return jobs
+
+    def _compose(self, job: ArticleJob, well_formed_text: str, checkpoints: Optional[DocumentCheckpoints] = None) -> ArticleJob:
+        # a checkpoint is only reused when it was made on top of the same previous version
+        base_version = job.last_version.version if job.last_version else 0
+        if job.last_version:  # The new document and article will be combined with the last version
+            stage = f"merge:{job.type_name}"
+            merged = checkpoints.text(stage, base_version=base_version) if checkpoints is not None else None
+            if merged is not None:
+                job.new_document_text = merged
+            else:
+                self.logger.info(f"Updating the product's document context for \"{job.type_name}\".")
+                # unchanged sections are copied verbatim, only added/changed ones reach the merge agent
+                job.new_document_text = SectionMerger(AgentRegistry.get(DocumentMergeAgent)).merge(job.last_document_text, well_formed_text)
+                if checkpoints is not None:
+                    checkpoints.save(stage, text=job.new_document_text, base_version=base_version)
+        else:
+            job.new_document_text = well_formed_text
+
+        stage = f"generate:{job.type_name}"
+        if checkpoints is not None:
+            job.new_article_hash = checkpoints.content_hash(stage, base_version=base_version)
+            if job.new_article_hash is not None:
+                return job
+        if job.last_version:
+            self.logger.info(f"Updating {job.type_name} article content...")
+            self._write_article(job, ArticleAgentFactory(article_type=job.type_id, text=well_formed_text,
+                                                         history=job.last_article_text, previous=job.last_document_text))
+        else:
+            self.logger.info(f"Generating \"{job.type_name}\" article content...")
+            self._write_article(job, ArticleAgentFactory(article_type=job.type_id, text=well_formed_text, history=None))
+        if checkpoints is not None:
+            job.new_article_hash = checkpoints.save(stage, text=job.new_article_text, content_hash=job.new_article_hash,
+                                                    base_version=base_version)
+            job.new_article_text = None
+        return job
+
+    async def _acompose(self, job: ArticleJob, well_formed_text: str) -> ArticleJob:
+        if job.last_version:
+            self.logger.info(f"Updating the product's document context for \"{job.type_name}\".")
+            job.new_document_text = await SectionMerger(AgentRegistry.get(DocumentMergeAgent)).amerge(job.last_document_text, well_formed_text)
+            self.logger.info(f"Updating {job.type_name} article content...")
+            factory = ArticleAgentFactory(article_type=job.type_id, text=well_formed_text,
+                                          history=job.last_article_text, previous=job.last_document_text)
+        else:
+            self.logger.info(f"Generating \"{job.type_name}\" article content...")
+            job.new_document_text = well_formed_text
+            factory = ArticleAgentFactory(article_type=job.type_id, text=well_formed_text, history=None)
+        job.new_article_text = await factory.agenerate_article()
+        return job
+
+    def _write_article(self, job: ArticleJob, factory: ArticleAgentFactory):
+        if not self.stream:
+            job.new_article_text = factory.generate_article()
+            return
+        on_token = None
+        if self.on_token is not None:
+            on_token = lambda piece: self.on_token(job.type_name, piece)
+        job.new_article_hash = factory.stream_article(self.markdown_handler, on_token=on_token)
+
+    def _commit(self, feature: Feature, job: ArticleJob,
+                checkpoints: Optional[DocumentCheckpoints] = None) -> GeneratedArticle:
+        document_hash_file, article_hash_file = self._save(job)
+        if self.writer is not None:  # grouped into the single writer's next transaction
+            checkpoint = None
+            if checkpoints is not None:  # committed with the version, so a resumed run never adds it twice
+                checkpoint = checkpoints.row(f"commit:{job.type_name}", hash_file_document=document_hash_file,
+                                             hash_file_article=article_hash_file)
+            version = self.writer.write(ArticleWrite(feature.feature_id, job.type_id, document_hash_file, article_hash_file,
+                                                     checkpoint=checkpoint)).version
+            if checkpoints is not None:
+                checkpoints.remember(checkpoints.row(f"commit:{job.type_name}", version=version,
+                                                     hash_file_document=document_hash_file, hash_file_article=article_hash_file))
+        else:
+            with Session(self.engine) as session:
+                version = self._add_version(session, feature, job, document_hash_file, article_hash_file, checkpoints)
+        return self._generated(feature, job, document_hash_file, article_hash_file, version, checkpoints)
+
+    async def _acommit(self, feature: Feature, job: ArticleJob) -> GeneratedArticle:
+        document_hash_file, article_hash_file = self._save(job)
+        if self.writer is not None:
+            write = ArticleWrite(feature.feature_id, job.type_id, document_hash_file, article_hash_file)
+            version = (await asyncio.wrap_future(self.writer.submit(write))).version
+        else:
+            with Session(self.engine) as session:
+                version = self._add_version(session, feature, job, document_hash_file, article_hash_file)
+        return self._generated(feature, job, document_hash_file, article_hash_file, version)
+
+    def _save(self, job: ArticleJob) -> Tuple[str, str]:
+        if job.new_article_hash is not None:
+            return self.markdown_handler.save_many([job.new_document_text])[0], job.new_article_hash
+        document_hash_file, article_hash_file = self.markdown_handler.save_many([job.new_document_text, job.new_article_text])
+        return document_hash_file, article_hash_file
+
+    @staticmethod
+    def _add_version(session: Session, feature: Feature, job: ArticleJob, document_hash_file: str, article_hash_file: str,
+                     checkpoints: Optional[DocumentCheckpoints] = None) -> int:
+        if job.last_version:  # Update the last version (read by another session)
+            article = session.merge(job.last_version)
+        else:  # Insert a new version
+            article = Article()
+            article.feature_id = feature.feature_id
+            article.type_id = job.type_id
+
+        article.hash_file_document = document_hash_file
+        article.hash_file_article = article_hash_file
+        article.version += 1
+        article.last_update = datetime.now(timezone.utc)
+        ArticleRepository(session).add_version(article)
+        if checkpoints is not None:  # in the same transaction, so a resumed run never adds the version twice
+            checkpoint = checkpoints.row(f"commit:{job.type_name}", version=article.version,
+                                         hash_file_document=document_hash_file, hash_file_article=article_hash_file)
+            checkpoints.remember(checkpoint)
+            CheckpointRepository(session).add(checkpoint)
+        session.commit()
+        return article.version
+
+    def _generated(self, feature: Feature, job: ArticleJob, document_hash_file: str, article_hash_file: str,
+                   version: int, checkpoints: Optional[DocumentCheckpoints] = None) -> GeneratedArticle:
+        article_name = f"{feature.subject.name}_{feature.name}_{job.type_name}_V{version}"
+        render = None
+        article_file_name = f"{article_name}.md"
+        if self.renderer is not None:
+            # rendering happens in the background, the text is already committed
+            stage = f"render:{job.type_name}"
+            if checkpoints is None:
+                render = self.renderer.submit(article_hash_file, article_name)
+            elif checkpoints.meta(stage, version=version) is None:
+                render = self.renderer.submit(article_hash_file, article_name, on_done=checkpoints.on_done(stage, version=version))
+            article_file_name = f"{article_name}{self.renderer.extension}"
+
+        self.logger.info(f"Article {job.type_name} generated successfully.")
+        return GeneratedArticle(type_id=job.type_id, type_name=job.type_name, version=version,
+                                hash_file_document=document_hash_file, hash_file_article=article_hash_file,
+                                file_name=article_file_name, render=render)
@@ -0,0 +1,271 @@
+import os
+import gzip
+import zlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import sha256
+from pathlib import Path
+from typing import Optional, List, Dict, Iterable, Tuple
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+
+class BlobStore:
+    """Content-addressed text store: git-style sharded files, optional compression and an in-memory LRU."""
+
+    _suffixes = {"none": ".md", "gzip": ".md.gz", "zstd": ".md.zst"}
+    _shared: Dict[Tuple[str, str], "BlobStore"] = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, root: Path, compression: str = None, cache_entries: int = None, cache_bytes: int = None):
+        self.root = Path(root)
+        compression = (compression or os.getenv("HASH_COMPRESSION", "none")).strip().lower()
+        if compression not in self._suffixes:
+            raise ValueError(f"Unknown HASH_COMPRESSION '{compression}'. Valid values are: none, gzip, zstd")
+        if compression == "zstd" and zstandard is None:
+            logging.getLogger("BlobStore").warning("zstandard is not installed, falling back to gzip compression")
+            compression = "gzip"
+        self.compression = compression
+        self.cache_entries = cache_entries if cache_entries is not None else int(os.getenv("BLOB_CACHE_ENTRIES", "256"))
+        self.cache_bytes = cache_bytes if cache_bytes is not None else int(os.getenv("BLOB_CACHE_BYTES", str(64 * 1024 * 1024)))
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
+        self._cached_bytes = 0
+        self._lock = threading.Lock()
+        self._known_dirs = set()
+
+    @classmethod
+    def shared(cls, root: Path) -> "BlobStore":
+        """One store (and so one LRU) per root directory and compression setting."""
+        key = (str(Path(root).resolve()), os.getenv("HASH_COMPRESSION", "none"))
+        with cls._shared_lock:
+            store = cls._shared.get(key)
+            if store is None:
+                store = cls(root)
+                cls._shared[key] = store
+            return store
+
+    # Paths ===========================================================
+    def path_for(self, digest: str, compression: str = None) -> Path:
+        return self.root / digest[:2] / digest[2:4] / f"{digest}{self._suffixes[compression or self.compression]}"
+
+    def _existing_path(self, digest: str) -> Optional[Path]:
+        candidates = [self.path_for(digest)]
+        candidates += [self.path_for(digest, c) for c in self._suffixes if c != self.compression]
+        candidates.append(self.root / f"{digest}.md")  # flat layout written before sharding
+        for path in candidates:
+            if path.exists():
+                return path
+        return None
+
+    def exists(self, digest: str) -> bool:
+        return digest in self._cache or self._existing_path(digest) is not None
+
+    # Encoding ========================================================
+    @staticmethod
+    def normalize(text: str) -> bytes:
+        return text.replace("\r\n", "\n").replace("\r", "\n").encode("utf-8")
+
+    def _encode(self, data: bytes) -> bytes:
+        if self.compression == "gzip":
+            return gzip.compress(data, compresslevel=6, mtime=0)
+        if self.compression == "zstd":
+            return zstandard.ZstdCompressor().compress(data)
+        return data
+
+    def _compressor(self):
+        """Streaming counterpart of _encode; None when blobs are stored uncompressed."""
+        if self.compression == "gzip":
+            return zlib.compressobj(6, zlib.DEFLATED, 31)  # gzip container, mtime 0 like _encode
+        if self.compression == "zstd":
+            return zstandard.ZstdCompressor().compressobj()
+        return None
+
+    @staticmethod
+    def _decode(path: Path, raw: bytes) -> bytes:
+        if path.name.endswith(".gz"):
+            return gzip.decompress(raw)
+        if path.name.endswith(".zst"):
+            if zstandard is None:
+                raise RuntimeError(f"zstandard is required to read {path}")
+            return zstandard.ZstdDecompressor().decompress(raw)
+        return raw
+
+    # Write ===========================================================
+    def put(self, text: str) -> str:
+        data = self.normalize(text)
+        digest = sha256(data).hexdigest()
+        self.put_hashed(digest, data)
+        return digest
+
+    def put_hashed(self, digest: str, data: bytes):
+        """Store data whose sha256 is already known; existing blobs are not rewritten."""
+        if self._existing_path(digest) is None:
+            path = self.path_for(digest)
+            self._ensure_dir(path.parent)
+            self.write_atomic(path, self._encode(data))
+        self._remember(digest, data.decode("utf-8"))
+
+    def put_many(self, texts: Iterable[str]) -> List[str]:
+        """Store many texts, creating each shard directory once; returns the hashes in input order."""
+        pending: Dict[str, bytes] = {}
+        digests = []
+        for text in texts:
+            data = self.normalize(text)
+            digest = sha256(data).hexdigest()
+            digests.append(digest)
+            pending.setdefault(digest, data)
+
+        for digest, data in pending.items():
+            if self._existing_path(digest) is None:
+                path = self.path_for(digest)
+                self._ensure_dir(path.parent)
+                self.write_atomic(path, self._encode(data))
+            self._remember(digest, data.decode("utf-8"))
+        return digests
+
+    def open_stream(self) -> "BlobStream":
+        """Incremental writer for text produced piece by piece (e.g. streamed LLM output)."""
+        return BlobStream(self)
+
+    def _ensure_dir(self, directory: Path):
+        if directory not in self._known_dirs:
+            directory.mkdir(parents=True, exist_ok=True)
+            self._known_dirs.add(directory)
+
+    @staticmethod
+    def write_atomic(path: Path, data: bytes):
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+
+    def delete(self, digest: str) -> bool:
+        """Remove a blob from disk and the LRU; False when it did not exist."""
+        with self._lock:
+            text = self._cache.pop(digest, None)
+            if text is not None:
+                self._cached_bytes -= len(text)
+        path = self._existing_path(digest)
+        if path is None:
+            return False
+        path.unlink(missing_ok=True)
+        return True
+
+    # Read ============================================================
+    def get(self, digest: str) -> str:
+        with self._lock:
+            text = self._cache.get(digest)
+            if text is not None:
+                self._cache.move_to_end(digest)
+                return text
+        path = self._existing_path(digest)
+        if path is None:
+            raise FileNotFoundError(f"No blob {digest} in {self.root}")
+        text = self._decode(path, path.read_bytes()).decode("utf-8")
+        self._remember(digest, text)
+        return text
+
+    def get_many(self, digests: Iterable[str], max_workers: int = 8) -> Dict[str, str]:
+        """Load many blobs; cached ones come from memory, the rest are read concurrently."""
+        result, missing = {}, []
+        with self._lock:
+            for digest in dict.fromkeys(digests):
+                text = self._cache.get(digest)
+                if text is None:
+                    missing.append(digest)
+                else:
+                    self._cache.move_to_end(digest)
+                    result[digest] = text
+        if len(missing) == 1:
+            result[missing[0]] = self.get(missing[0])
+        elif missing:
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(missing))) as pool:
+                result.update(zip(missing, pool.map(self.get, missing)))
+        return result
+
+    # LRU =============================================================
+    def _remember(self, digest: str, text: str):
+        size = len(text)
+        if not self.cache_entries or size > self.cache_bytes:
+            return
+        with self._lock:
+            if digest in self._cache:
+                self._cache.move_to_end(digest)
+                return
+            self._cache[digest] = text
+            self._cached_bytes += size
+            while len(self._cache) > self.cache_entries or self._cached_bytes > self.cache_bytes:
+                _, evicted = self._cache.popitem(last=False)
+                self._cached_bytes -= len(evicted)
+
+
+class BlobStream:
+    """One blob written incrementally: normalized, hashed and compressed on the fly into a temporary file in the
+    store, then renamed to its content address on commit, so the text is never held in memory a second time."""
+
+    def __init__(self, store: BlobStore):
+        self._store = store
+        store.root.mkdir(parents=True, exist_ok=True)
+        fd, self._tmp = tempfile.mkstemp(dir=store.root, prefix=".stream-")
+        self._file = os.fdopen(fd, "wb")
+        self._compressor = store._compressor()
+        self._sha = sha256()
+        self._carriage_return = False  # a "\r" at the end of a piece may be the first half of "\r\n"
+        self.size = 0
+        self.digest: Optional[str] = None
+
+    def write(self, text: str):
+        if self._carriage_return:
+            text = "\r" + text
+            self._carriage_return = False
+        if text.endswith("\r"):
+            text = text[:-1]
+            self._carriage_return = True
+        if text:
+            self._write(BlobStore.normalize(text))
+
+    def _write(self, data: bytes):
+        self._sha.update(data)
+        self.size += len(data)
+        self._file.write(self._compressor.compress(data) if self._compressor is not None else data)
+
+    def commit(self) -> str:
+        """Finish the blob and move it to <root>/ab/cd/<sha256>; returns the hash."""
+        if self._carriage_return:
+            self._write(b"\n")
+            self._carriage_return = False
+        if self._compressor is not None:
+            self._file.write(self._compressor.flush())
+        self._file.close()
+        self.digest = self._sha.hexdigest()
+        if self._store._existing_path(self.digest) is None:
+            path = self._store.path_for(self.digest)
+            self._store._ensure_dir(path.parent)
+            os.replace(self._tmp, path)
+        else:
+            os.unlink(self._tmp)
+        return self.digest
+
+    def abort(self):
+        if not self._file.closed:
+            self._file.close()
+        if os.path.exists(self._tmp):
+            os.unlink(self._tmp)
+
+    def __enter__(self) -> "BlobStream":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None or self.digest is None:
+            self.abort()
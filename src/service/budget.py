@@ -0,0 +1,222 @@
+import os
+import sys
+import json
+import logging
+import argparse
+from pathlib import Path
+from dataclasses import dataclass, field
+from typing import Optional, List, Dict, Tuple, Any
+
+from src.service.metrics import metrics
+from src.service.sections import Section, parse_sections, diff_sections, render_sections, normalize_heading
+from src.service.tokens import count_tokens, split_tokens
+
+logger = logging.getLogger("PromptBudget")
+
+
+@dataclass
+class Trim:
+    input: str  # "text" or "history"
+    section: str  # heading, "" for the text before the first heading
+    action: str  # "outlined", "dropped" or "truncated"
+    tokens: int  # tokens saved
+
+
+@dataclass
+class BudgetReport:
+    agent: str
+    budget: int
+    tokens_before: int
+    tokens_after: int
+    trims: List[Trim] = field(default_factory=list)
+
+    @property
+    def trimmed(self) -> bool:
+        return bool(self.trims)
+
+    def summary(self) -> str:
+        if not self.trims:
+            return f"{self.agent}: {self.tokens_before} tokens, within the budget of {self.budget}"
+        counts: Dict[Tuple[str, str], int] = {}
+        for trim in self.trims:
+            counts[(trim.input, trim.action)] = counts.get((trim.input, trim.action), 0) + 1
+        parts = ", ".join(f"{n} {name} section(s) {action}" for (name, action), n in counts.items())
+        return f"{self.agent}: {self.tokens_before} → {self.tokens_after} tokens (budget {self.budget}): {parts}"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"agent": self.agent, "budget": self.budget, "tokens_before": self.tokens_before,
+                "tokens_after": self.tokens_after, "trims": [vars(t) for t in self.trims]}
+
+
+@dataclass
+class _Part:
+    input: str
+    section: Section
+    changed: bool
+    text: str
+    tokens: int
+
+
+class PromptBudget:
+    """Fits the text and history of a prompt into a token budget, section by section.
+
+    Changed sections (against the previous version of the text, or matching a changed heading in the history) are
+    kept longest. Unchanged sections are reduced in this order until the prompt fits: history to outlines, text to
+    outlines, history outlines dropped, text outlines dropped; then changed history sections are dropped from the
+    end and, as a last resort, the changed text is truncated. System prompt and context are never trimmed.
+    """
+
+    def __init__(self, max_tokens: int, model_name: str = None, agent: str = ""):
+        self.max_tokens = max_tokens  # 0 = unlimited
+        self.model_name = model_name
+        self.agent = agent
+
+    @classmethod
+    def for_agent(cls, agent: str, model_name: str = None) -> "PromptBudget":
+        """Budget of agent from PROMPT_BUDGETS='{"Agent": tokens}', else PROMPT_BUDGET (0 = unlimited)."""
+        budget = int(os.getenv("PROMPT_BUDGET", "0"))
+        try:
+            budget = int(json.loads(os.getenv("PROMPT_BUDGETS") or "{}").get(agent, budget))
+        except (ValueError, TypeError, AttributeError) as e:
+            logger.warning(f"Ignoring invalid PROMPT_BUDGETS: {e}")
+        return cls(budget, model_name, agent)
+
+    def count(self, text: Optional[str]) -> int:
+        return count_tokens(text, self.model_name)
+
+    def fit(self, prompt: Dict[str, str], inputs: Dict[str, Any], previous: Optional[str] = None) -> Tuple[Dict[str, Any], BudgetReport]:
+        """inputs with text and history trimmed so the whole prompt fits, and what was trimmed.
+
+        previous is the earlier version of text; without it every text section counts as changed.
+        """
+        fixed = sum(self.count(v) for v in prompt.values())
+        fixed += sum(self.count(v) for k, v in inputs.items() if k not in ("text", "history") and isinstance(v, str))
+        variable = {k: inputs[k] for k in ("text", "history") if isinstance(inputs.get(k), str) and inputs[k]}
+        before = fixed + sum(self.count(v) for v in variable.values())
+        report = BudgetReport(self.agent, self.max_tokens, before, before)
+        if not self.max_tokens or before <= self.max_tokens or not variable:
+            return inputs, report
+        if fixed >= self.max_tokens:
+            # trimming would leave nothing of the text to work on; a budget this small is a misconfiguration
+            logger.warning(f"{self.agent}: system prompt and context alone take {fixed} tokens, "
+                           f"more than the budget of {self.max_tokens}; the prompt is not trimmed")
+            return inputs, report
+
+        parts = self._parts(variable, previous)
+        total = fixed + sum(p.tokens for p in parts) + self._separators(parts)
+        for step in self._steps(parts):
+            if total <= self.max_tokens:
+                break
+            total -= step(report)
+
+        if total > self.max_tokens:
+            total -= self._truncate(parts, total - self.max_tokens, report)
+
+        # inputs nothing was trimmed from are passed on byte for byte, markers and whitespace included
+        fitted = dict(inputs)
+        for name in {trim.input for trim in report.trims}:
+            fitted[name] = render_sections([p.text for p in parts if p.input == name])
+        report.tokens_after = fixed + sum(self.count(fitted[name]) for name in variable)
+        if report.trimmed:
+            # a truncated text loses content of the source itself, not only context around it
+            truncated = any(t.input == "text" and t.action == "truncated" for t in report.trims)
+            logger.log(logging.WARNING if truncated else logging.INFO, report.summary())
+            metrics.inc("kb_prompt_trimmed_tokens_total", max(0, before - report.tokens_after),
+                        help="Prompt tokens removed by the budget manager", agent=self.agent)
+        return fitted, report
+
+    # Ranking ==========================================================
+    def _parts(self, variable: Dict[str, str], previous: Optional[str]) -> List[_Part]:
+        text_sections = parse_sections(variable.get("text"))
+        if previous:
+            diff = diff_sections(parse_sections(previous), text_sections)
+            changed_keys = set(diff.changed) | set(diff.added)
+        else:
+            changed_keys = {s.key for s in text_sections}
+        changed_titles = {s.key[1] for s in text_sections if s.key in changed_keys and s.level}
+
+        parts = [_Part("text", s, s.key in changed_keys, s.text, self.count(s.text)) for s in text_sections]
+        for s in parse_sections(variable.get("history")):
+            # the history is the previous article or document: its sections under a changed heading are still needed
+            changed = normalize_heading(s.title) in changed_titles if s.level else not previous
+            parts.append(_Part("history", s, changed, s.text, self.count(s.text)))
+        return parts
+
+    def _separators(self, parts: List[_Part]) -> int:
+        return max(0, len(parts) - 1)  # the blank line between two sections
+
+    def _steps(self, parts: List[_Part]):
+        """Reductions from least to most valuable; each returns the tokens it saved."""
+        for name in ("history", "text"):
+            for part in parts:
+                if part.input == name and not part.changed:
+                    yield lambda report, part=part: self._outline(part, report)
+        for name in ("history", "text"):
+            for part in reversed(parts):
+                if part.input == name and not part.changed:
+                    yield lambda report, part=part: self._drop(part, report)
+        for part in reversed(parts):
+            if part.input == "history" and part.changed:
+                yield lambda report, part=part: self._drop(part, report)
+
+    def _outline(self, part: _Part, report: BudgetReport) -> int:
+        if not part.section.heading:
+            return self._drop(part, report)
+        outline = part.section.heading
+        saved = part.tokens - self.count(outline)
+        if saved <= 0:
+            return 0
+        part.text, part.tokens = outline, part.tokens - saved
+        report.trims.append(Trim(part.input, part.section.title, "outlined", saved))
+        return saved
+
+    def _drop(self, part: _Part, report: BudgetReport) -> int:
+        if not part.text:
+            return 0
+        saved = part.tokens + 1
+        report.trims.append(Trim(part.input, part.section.title, "dropped", part.tokens))
+        part.text, part.tokens = "", 0
+        return saved
+
+    def _truncate(self, parts: List[_Part], excess: int, report: BudgetReport) -> int:
+        """Cut the changed text from its end, whole sections first."""
+        saved = 0
+        for part in reversed([p for p in parts if p.input == "text" and p.text]):
+            if saved >= excess:
+                break
+            if part.tokens + 1 <= excess - saved:
+                saved += self._drop(part, report)
+                continue
+            keep = max(0, part.tokens - (excess - saved))
+            text = split_tokens(part.text, keep, self.model_name)[0] if keep else ""
+            tokens = self.count(text)
+            report.trims.append(Trim(part.input, part.section.title, "truncated", part.tokens - tokens))
+            saved += part.tokens - tokens
+            part.text, part.tokens = text, tokens
+        return saved
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Show how a prompt is trimmed to fit a token budget.")
+    parser.add_argument("text", type=Path, help="new version of the document (Markdown)")
+    parser.add_argument("--history", type=Path, help="previous article or document sent as history")
+    parser.add_argument("--previous", type=Path, help="previous version of the document, to find changed sections")
+    parser.add_argument("--budget", type=int, required=True)
+    parser.add_argument("--output", type=Path, help="write the fitted text and history as JSON")
+    args = parser.parse_args(argv)
+
+    inputs = {"text": args.text.read_text(encoding="utf-8")}
+    if args.history:
+        inputs["history"] = args.history.read_text(encoding="utf-8")
+    previous = args.previous.read_text(encoding="utf-8") if args.previous else None
+    fitted, report = PromptBudget(args.budget, agent="cli").fit({}, inputs, previous)
+    print(report.summary())
+    for trim in report.trims:
+        print(f"  {trim.input:<8} {trim.action:<9} {trim.tokens:>6}  {trim.section or '(preamble)'}")
+    if args.output:
+        args.output.write_text(json.dumps({"report": report.to_dict(), "inputs": fitted}, indent=2), encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
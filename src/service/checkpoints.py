@@ -0,0 +1,148 @@
+import json
+import uuid
+import logging
+import threading
+from datetime import datetime, timezone
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional
+from sqlmodel import Session
+
+from src.model.StageCheckpoint import StageCheckpoint
+from src.repository.CheckpointRepository import CheckpointRepository
+from src.repository.DBConnection import DBConnection
+from src.service.markdown import MarkdownHandler
+from src.service.metrics import metrics
+
+
+def new_run_id() -> str:
+    return f"{datetime.now(timezone.utc):%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:6]}"
+
+
+class RunCheckpoints:
+    """Stage checkpoints of one ingestion run: what every document already finished, stored under run_id.
+
+    A stage's output text goes to the blob store and only its hash and metadata to SQLite, so a run resumed with
+    the same run_id picks each document up after its last finished stage instead of paying its LLM calls again.
+    """
+
+    def __init__(self, connection: DBConnection, run_id: str = None, markdown_handler: MarkdownHandler = None):
+        self.connection = connection
+        self.run_id = run_id or new_run_id()
+        self.markdown_handler = markdown_handler or MarkdownHandler()
+
+    # stages whose output is only an intermediate text; the others are stored as the articles' own blobs
+    intermediate_stages = ("parse", "well_forming")
+
+    def document(self, document: str) -> "DocumentCheckpoints":
+        with Session(self.connection.read_engine) as session:
+            rows = CheckpointRepository(session).get_document(self.run_id, str(document))
+        return DocumentCheckpoints(self, str(document), rows)
+
+    def prune(self) -> int:
+        """Delete the run's checkpoints and the intermediate texts nothing else uses, once the run finished
+        without errors; returns the number of blobs deleted."""
+        with Session(self.connection.engine) as session:
+            repository = CheckpointRepository(session)
+            hashes = repository.get_run_hashes(self.run_id, self.intermediate_stages)
+            repository.delete_run(self.run_id)
+            session.commit()
+            unused = hashes - repository.get_referenced(hashes) if hashes else set()
+        return self.markdown_handler.delete_many(unused)
+
+
+class DocumentCheckpoints:
+    """Checkpoints of one document in a run; stages of different article types may be saved from several threads."""
+
+    def __init__(self, run: RunCheckpoints, document: str, rows: Dict[str, StageCheckpoint]):
+        self.run = run
+        self.document = document
+        self._rows = rows
+        self._lock = threading.Lock()
+        self.logger = logging.getLogger("Checkpoints")
+
+    def get(self, stage: str, **expected) -> Optional[StageCheckpoint]:
+        """Checkpoint of stage when its metadata has the expected values (e.g. the same source hash), else None."""
+        with self._lock:
+            row = self._rows.get(stage)
+        if row is None or (expected and any(json.loads(row.meta).get(k) != v for k, v in expected.items())):
+            return None
+        return row
+
+    def meta(self, stage: str, **expected) -> Optional[Dict[str, Any]]:
+        """Metadata of a finished stage, None when the stage has no (matching) checkpoint."""
+        row = self.get(stage, **expected)
+        if row is None:
+            return None
+        self.hit(stage)
+        return json.loads(row.meta)
+
+    def content_hash(self, stage: str, **expected) -> Optional[str]:
+        """Blob store hash of the output of a finished stage, None when the stage has no (matching) checkpoint."""
+        row = self.get(stage, **expected)
+        if row is None or not row.content_hash:
+            return None
+        self.hit(stage)
+        return row.content_hash
+
+    def text(self, stage: str, **expected) -> Optional[str]:
+        """Output text of a finished stage, None when it has no (matching) checkpoint or its blob is gone."""
+        row = self.get(stage, **expected)
+        if row is None or not row.content_hash:
+            return None
+        try:
+            text = self.run.markdown_handler.load_many([row.content_hash])[row.content_hash]
+        except FileNotFoundError:
+            self.logger.warning(f"{self.document}: the output of {stage} is missing, running it again")
+            return None
+        self.hit(stage)
+        return text
+
+    def row(self, stage: str, content_hash: str = "", **meta) -> StageCheckpoint:
+        """Checkpoint of stage, for callers committing it in the same transaction as the stage's own writes
+        (remember it before the commit)."""
+        return StageCheckpoint(run_id=self.run.run_id, document=self.document, stage=stage,
+                               content_hash=content_hash or "", meta=json.dumps(meta))
+
+    def remember(self, row: StageCheckpoint):
+        """Note a checkpoint committed by the caller; a copy, since the caller's session expires what it commits."""
+        with self._lock:
+            self._rows[row.stage] = StageCheckpoint(run_id=row.run_id, document=row.document, stage=row.stage,
+                                                    content_hash=row.content_hash, meta=row.meta)
+
+    def save(self, stage: str, text: str = None, content_hash: str = None, **meta) -> str:
+        """Record a finished stage; its output text (when given) is stored first. Returns the content hash.
+
+        The checkpoint is committed by the single writer in concurrent mode, else in its own transaction.
+        """
+        if text is not None:
+            content_hash = self.run.markdown_handler.save_many([text])[0]
+        row = self.row(stage, content_hash, **meta)
+        self.remember(row)
+        writer = self.run.connection.writer
+        if writer is not None:
+            writer.write(row)
+        else:
+            with Session(self.run.connection.engine) as session:
+                CheckpointRepository(session).add(row)
+                session.commit()
+        return content_hash
+
+    def on_done(self, stage: str, **meta) -> Callable[[Future], None]:
+        """Future callback recording stage once the future succeeded, with its result as the file."""
+        def save(future: Future):
+            if future.exception() is None:
+                self.save(stage, file=str(future.result()), **meta)
+        return save
+
+    def clear(self):
+        """Forget every stage, e.g. when the source changed since the interrupted run."""
+        with Session(self.run.connection.engine) as session:
+            CheckpointRepository(session).delete_document(self.run.run_id, self.document)
+            session.commit()
+        with self._lock:
+            self._rows.clear()
+
+    @staticmethod
+    def hit(stage: str):
+        metrics.inc("kb_checkpoint_hits_total", help="Pipeline stages skipped because the run already finished them",
+                    stage=stage.split(":")[0])
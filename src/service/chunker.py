@@ -0,0 +1,124 @@
+import os
+import re
+from typing import List
+
+from src.service.tokens import count_tokens, split_tokens
+
+
+class TextChunker:
+    """Split raw PDF text at heading boundaries into chunks that fit a token budget."""
+
+    # markdown headings, numbered headings ("2.1 Search") and short title-like lines without punctuation
+    _heading = re.compile(
+        r"^(?:#{1,6}\s+\S.*"
+        r"|\d+(?:\.\d+)*\.?\s+[A-Z][^\n]{0,80}"
+        r"|[A-Z][^.!?:;,\n]{0,60})$"
+    )
+    _max_heading_words = 8
+
+    def __init__(self, max_tokens: int = None, model_name: str = None):
+        self.max_tokens = max_tokens or int(os.getenv("CLEANER_CHUNK_TOKENS", "4000"))
+        self.model_name = model_name
+
+    def count(self, text: str) -> int:
+        return count_tokens(text, self.model_name)
+
+    def is_heading(self, line: str) -> bool:
+        line = line.strip()
+        return bool(line) and len(line.split()) <= self._max_heading_words and bool(self._heading.match(line))
+
+    def split_blocks(self, text: str) -> List[str]:
+        """Split the text into blocks that each start at a heading line."""
+        blocks, current = [], []
+        for line in text.splitlines(keepends=True):
+            if current and self.is_heading(line):
+                blocks.append("".join(current))
+                current = []
+            current.append(line)
+        if current:
+            blocks.append("".join(current))
+        return blocks
+
+    def chunk(self, text: str) -> List[str]:
+        if self.count(text) <= self.max_tokens:
+            return [text]
+
+        chunks, current, current_tokens = [], [], 0
+        for block in self.split_blocks(text):
+            for piece in self._fit(block):
+                tokens = self.count(piece)
+                if current and current_tokens + tokens > self.max_tokens:
+                    chunks.append("".join(current))
+                    current, current_tokens = [], 0
+                current.append(piece)
+                current_tokens += tokens
+        if current:
+            chunks.append("".join(current))
+        return chunks
+
+    def _fit(self, block: str) -> List[str]:
+        """Break a block larger than the budget at paragraph, then line, then token boundaries."""
+        if self.count(block) <= self.max_tokens:
+            return [block]
+        pieces = []
+        for separator in ("\n\n", "\n"):
+            parts = block.split(separator)
+            if len(parts) > 1:
+                # every part is shorter than the block, the separators are added back after fitting it
+                for i, part in enumerate(parts):
+                    fitted = self._fit(part) if part else []
+                    if i < len(parts) - 1:
+                        if fitted:
+                            fitted[-1] += separator
+                        else:
+                            fitted = [separator]
+                    pieces.extend(fitted)
+                return pieces
+        return split_tokens(block, self.max_tokens, self.model_name)
+
+
+_md_heading = re.compile(r"^(#{1,6})(\s+\S.*)$")
+_md_fence = re.compile(r"^\s*(```|~~~)")
+
+
+def stitch_markdown(parts: List[str]) -> str:
+    """Join separately cleaned Markdown chunks, keeping a single top-level title.
+
+    Headings of every chunk after the first are shifted so that none of them is above level 2.
+    """
+    stitched = []
+    for index, part in enumerate(parts):
+        part = part.strip()
+        if not part:
+            continue
+        if index > 0:
+            levels = [len(m.group(1)) for m in _iter_headings(part)]
+            shift = 2 - min(levels) if levels and min(levels) < 2 else 0
+            if shift:
+                part = _shift_headings(part, shift)
+        stitched.append(part)
+    return "\n\n".join(stitched) + "\n" if stitched else ""
+
+
+def _iter_headings(markdown: str):
+    in_fence = False
+    for line in markdown.splitlines():
+        if _md_fence.match(line):
+            in_fence = not in_fence
+            continue
+        match = None if in_fence else _md_heading.match(line)
+        if match:
+            yield match
+
+
+def _shift_headings(markdown: str, shift: int) -> str:
+    lines, in_fence = [], False
+    for line in markdown.splitlines():
+        if _md_fence.match(line):
+            in_fence = not in_fence
+        elif not in_fence:
+            match = _md_heading.match(line)
+            if match:
+                line = "#" * min(6, len(match.group(1)) + shift) + match.group(2)
+        lines.append(line)
+    return "\n".join(lines)
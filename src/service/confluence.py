@@ -1,7 +1,16 @@
+import os
 import re
-from typing import Iterable
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator, List
 from PyPDF2 import PdfReader
 
+
+def _extract_page_range(file_path: str, start: int, stop: int) -> List[str]:
+    """Process-pool entry point: extract the pages [start, stop) of a PDF."""
+    reader = PdfReader(file_path)
+    return [(reader.pages[i].extract_text() or "") + "\n" for i in range(start, stop)]
+
+
 class ConfluenceService:
 
     _necessary_headings: Iterable[str] = (
@@ -29,8 +38,12 @@ class ConfluenceService:
     # each heading start from begining of the line
 
     _file_path: str
-    def __init__(self, file_path: str = None) -> None:
+    def __init__(self, file_path: str = None, workers: int = None, early_stop: bool = True) -> None:
         self._file_path = file_path
+        # workers > 1 splits page ranges across processes
+        self.workers = workers or int(os.getenv("PDF_WORKERS", "1"))
+        # stop reading once a bottom heading is reached, clean_text drops everything after it anyway
+        self.early_stop = early_stop
         # remove blocks from top unwanted headings → next necessary heading
         self._pat_to_summary = re.compile(
             rf"^(?:{self._alt(self._unwanted_headings_top)})\s*(?:\r?\n)+.*?"
@@ -44,17 +57,70 @@ class ConfluenceService:
             flags=re.IGNORECASE | re.MULTILINE | re.DOTALL,
         )
 
+        # single heading lines, used to find the early-stop page without the full text
+        self._line_top = re.compile(rf"(?:{self._alt(self._unwanted_headings_top)})\s*", flags=re.IGNORECASE)
+        self._line_necessary = re.compile(rf"(?:{self._alt(self._necessary_headings)})\b", flags=re.IGNORECASE)
+        self._line_bottom = re.compile(rf"(?:{self._alt(self._unwanted_headings_bottom)})\s*", flags=re.IGNORECASE)
+
     @staticmethod
     def _alt(parts: Iterable[str]) -> str:
         """Join patterns with | and wrap them in a non-capturing group."""
         return f"(?:{'|'.join(parts)})"
 
-    def extract_text_from_pdf(self) -> str:
+    def page_count(self) -> int:
+        return len(PdfReader(self._file_path).pages)
+
+    def iter_pages(self, start: int = 0, stop: int = None) -> Iterator[str]:
+        """Yield the text of each page, one page at a time."""
         reader = PdfReader(self._file_path)
-        text = ""
-        for page in reader.pages:
-            text += page.extract_text() + "\n"
-        return text
+        stop = len(reader.pages) if stop is None else min(stop, len(reader.pages))
+        for i in range(start, stop):
+            yield (reader.pages[i].extract_text() or "") + "\n"
+
+    def iter_pages_parallel(self, workers: int = None, pages_per_task: int = None) -> Iterator[str]:
+        """Yield the text of each page in order while page ranges are extracted by a process pool."""
+        workers = workers or self.workers
+        count = self.page_count()
+        if count == 0:
+            return
+        # several small ranges per worker keep the pool balanced and let early-stop cancel the tail
+        pages_per_task = pages_per_task or max(1, -(-count // (workers * 4)))
+        ranges = [(start, min(start + pages_per_task, count)) for start in range(0, count, pages_per_task)]
+
+        executor = ProcessPoolExecutor(max_workers=min(workers, len(ranges)))
+        try:
+            futures = [executor.submit(_extract_page_range, self._file_path, start, stop) for start, stop in ranges]
+            for future in futures:
+                yield from future.result()
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def until_bottom_heading(self, pages: Iterable[str]) -> Iterator[str]:
+        """Pass pages through and stop after the page where clean_text would cut the rest of the document."""
+        in_top_block = False
+        for page in pages:
+            yield page
+            for line in page.splitlines():
+                line = line.rstrip()
+                if not line:
+                    continue
+                if in_top_block:
+                    # a top block only ends at a necessary heading (see _pat_to_summary)
+                    in_top_block = not self._line_necessary.match(line)
+                elif self._line_top.fullmatch(line):
+                    in_top_block = True
+                elif self._line_bottom.fullmatch(line):
+                    return
+
+    def extract_text_from_pdf(self) -> str:
+        pages = self.iter_pages() if self.workers <= 1 else self.iter_pages_parallel()
+        source = pages
+        if self.early_stop:
+            pages = self.until_bottom_heading(pages)
+        try:
+            return "".join(pages)
+        finally:
+            source.close()
 
     def clean_text(self, text: str) -> str:
         text = text.replace("\r\n", "\n").replace("\r", "\n")
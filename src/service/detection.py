@@ -0,0 +1,290 @@
+import os
+import re
+import sys
+import json
+import time
+import logging
+import argparse
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Tuple, Optional
+from sqlmodel import Session, select
+
+from src.Agents.agents import AgentRegistry, FeatureDetectorAgent
+from src.model.Article import Article
+from src.model.Feature import Feature
+from src.service.feature_index import FeatureIndex, Candidate
+from src.service.metrics import metrics
+from src.service.tokens import split_tokens
+from src.service.taxonomy import Taxonomy
+from src.service.ratelimit import LLMCallError
+
+
+class FeatureDetectionService:
+    """Shortlists candidate features locally and only asks FeatureDetectorAgent to choose among them.
+
+    The session is only read from, and its transaction is ended before the LLM is called, so that a caller's
+    session does not keep a pooled connection checked out (and its read snapshot open) while it waits for the model.
+    """
+
+    def __init__(self, session: Session, top_k: int = None, skip_confidence: float = None, skip_min_score: float = None):
+        self.session = session
+        # 0 sends the whole catalog, as before the index existed
+        self.top_k = top_k if top_k is not None else int(os.getenv("FEATURE_SHORTLIST_K", "10"))
+        # the LLM call is skipped when the index is at least this confident (>= 1 never skips) and the top candidate
+        # scores at least skip_min_score, so that a lone weak match does not decide the feature unchecked
+        self.skip_confidence = skip_confidence if skip_confidence is not None else float(os.getenv("FEATURE_SKIP_CONFIDENCE", "1"))
+        self.skip_min_score = skip_min_score if skip_min_score is not None else float(os.getenv("FEATURE_SKIP_MIN_SCORE", "20"))
+        self.logger = logging.getLogger("FeatureDetection")
+
+    def detect(self, text: str) -> Feature:
+        taxonomy = Taxonomy.for_session(self.session)
+        feature, candidates, context = self._shortlist(taxonomy, text)
+        self.session.rollback()  # reads only
+        if feature is not None:
+            return feature
+        feature_json = AgentRegistry.get(FeatureDetectorAgent).invoke(text=text, context=context, history=None)
+        return taxonomy.resolve_json(feature_json)
+
+    async def adetect(self, text: str) -> Feature:
+        """Async counterpart of detect."""
+        taxonomy = Taxonomy.for_session(self.session)
+        feature, candidates, context = self._shortlist(taxonomy, text)
+        self.session.rollback()  # reads only
+        if feature is not None:
+            return feature
+        feature_json = await AgentRegistry.get(FeatureDetectorAgent).ainvoke(text=text, context=context, history=None)
+        return taxonomy.resolve_json(feature_json)
+
+    def detect_many(self, texts: List[str], batch_size: int = None, return_exceptions: bool = False) -> List[Feature]:
+        """detect for many documents, packing up to batch_size leading excerpts into one LLM call.
+
+        The JSON array of a batch is validated per document; a document whose entry is missing, unknown or outside
+        its own shortlist falls back to a single detect call, as does a whole batch whose call fails. Like
+        asyncio.gather, return_exceptions puts the error of a failed single call in its slot instead of raising it.
+        """
+        batch_size = batch_size or int(os.getenv("DETECT_BATCH_SIZE", "8"))
+        excerpt_tokens = int(os.getenv("DETECT_EXCERPT_TOKENS", "1500"))
+        taxonomy = Taxonomy.for_session(self.session)
+        results: List[Optional[Feature]] = [None] * len(texts)
+        pending = []  # (position, candidates)
+        for position, text in enumerate(texts):
+            feature, candidates, _ = self._shortlist(taxonomy, text)
+            if feature is not None:
+                results[position] = feature
+            else:
+                pending.append((position, candidates))
+        self.session.rollback()  # reads only
+
+        agent = AgentRegistry.get(FeatureDetectorAgent)
+        for start in range(0, len(pending), batch_size):
+            batch = pending[start:start + batch_size]
+            if len(batch) == 1:
+                position = batch[0][0]
+                results[position] = self._fallback(texts[position], return_exceptions)
+                continue
+            if any(not candidates for _, candidates in batch):
+                context = taxonomy.context
+            else:
+                union = {c.feature_id: c for _, candidates in batch for c in candidates}
+                context = FeatureIndex.to_context(list(union.values()))
+            excerpts = [split_tokens(texts[position], excerpt_tokens)[0] if texts[position] else "" for position, _ in batch]
+            try:
+                entries = self._parse_batch(agent.detect_many(excerpts, context), len(batch))
+            except (LLMCallError, ValueError) as e:
+                self.logger.warning(f"Batched detection of {len(batch)} documents failed, detecting one by one: {e}")
+                entries = [None] * len(batch)
+            for (position, candidates), entry in zip(batch, entries):
+                feature = taxonomy.resolve(entry.get("subject"), entry.get("feature")) if entry else None
+                allowed = not candidates or any(c.feature_id == getattr(feature, "feature_id", None) for c in candidates)
+                if feature is None or not allowed:
+                    metrics.inc("kb_detection_fallbacks_total", help="Documents re-detected alone after a batch")
+                    feature = self._fallback(texts[position], return_exceptions)
+                results[position] = feature
+            metrics.inc("kb_detection_batches_total", help="Batched feature detection calls")
+            metrics.inc("kb_detection_batched_documents_total", len(batch), help="Documents detected in batches")
+        return results
+
+    def _shortlist(self, taxonomy: Taxonomy, text: str) -> Tuple[Optional[Feature], List[Candidate], str]:
+        """(feature resolved locally or None, candidates, context for the LLM).
+
+        No candidates means the LLM chooses from the whole catalog: with top_k <= 0, or when no feature matches the
+        text lexically, where any k features would almost certainly miss the right one.
+        """
+        if self.top_k <= 0:
+            return None, [], taxonomy.context
+        index = FeatureIndex.for_taxonomy(taxonomy, key=str(self.session.get_bind().url))
+        candidates = index.shortlist(text, self.top_k)
+        if not candidates:
+            metrics.inc("kb_detection_full_catalog_total", help="Detections without a lexical match, sent the whole catalog")
+            return None, [], taxonomy.context
+        confidence = index.confidence(candidates)
+        if self.skip_confidence < 1 and confidence >= self.skip_confidence and candidates[0].score >= self.skip_min_score:
+            best = candidates[0]
+            self.logger.info(f"Feature resolved locally ({confidence:.2f}, score {best.score:.1f}): {best.subject} / {best.feature}")
+            return taxonomy.features[best.feature_id], candidates, ""
+        return None, candidates, index.to_context(candidates)
+
+    def _fallback(self, text: str, return_exceptions: bool):
+        try:
+            return self.detect(text)
+        except (ValueError, LLMCallError) as e:
+            if not return_exceptions:
+                raise
+            self.logger.warning(f"Feature detection failed: {e}")
+            return e
+
+    @staticmethod
+    def _parse_batch(payload: str, count: int) -> List[Optional[dict]]:
+        """Entries of a batch response by document position (None where missing); ValueError when not a JSON array."""
+        try:
+            data = json.loads(payload)
+        except (json.JSONDecodeError, TypeError):
+            match = re.search(r"\[.*\]", payload or "", re.DOTALL)
+            try:
+                data = json.loads(match.group(0)) if match else None
+            except json.JSONDecodeError:
+                data = None
+        if not isinstance(data, list):
+            raise ValueError(f"Invalid JSON array payload: {payload}")
+        entries: List[Optional[dict]] = [None] * count
+        for position, item in enumerate(data):
+            if not isinstance(item, dict):
+                continue
+            number = item.get("document", position + 1)
+            if isinstance(number, int) and 1 <= number <= count and entries[number - 1] is None:
+                entries[number - 1] = item
+        return entries
+
+
+class DetectionBatcher:
+    """Collects detect requests of concurrent documents and resolves them with detect_many in small batches.
+
+    A batch only waits for documents announced with expect (e.g. still being cleaned); once every expected
+    document is queued, or none is, it is sent right away.
+    """
+
+    def __init__(self, engine, batch_size: int = None, max_wait: float = None, max_workers: int = None):
+        self.engine = engine
+        self.batch_size = batch_size or int(os.getenv("DETECT_BATCH_SIZE", "8"))
+        # how long a document waits at most for the expected others before its batch is sent anyway
+        self.max_wait = max_wait if max_wait is not None else float(os.getenv("DETECT_BATCH_WAIT", "0.5"))
+        self.logger = logging.getLogger("DetectionBatcher")
+        self._condition = threading.Condition()
+        self._queued: List[Tuple[str, Future]] = []
+        self._expected = 0
+        self._closed = False
+        self._pool = ThreadPoolExecutor(max_workers=max_workers or 2, thread_name_prefix="detect")
+        self._thread = threading.Thread(target=self._run, name="detection-batcher", daemon=True)
+        self._thread.start()
+
+    def expect(self):
+        """Announce a document that will be submitted soon; batches wait for it (at most max_wait)."""
+        with self._condition:
+            self._expected += 1
+
+    def forget(self):
+        """Withdraw an expect whose document will not be submitted after all."""
+        with self._condition:
+            self._expected = max(0, self._expected - 1)
+            self._condition.notify()
+
+    def submit(self, text: str, expected: bool = False) -> Future:
+        """The future resolves to the detected Feature (None when it is not in the catalog); expected when the
+        document was announced with expect."""
+        future = Future()
+        with self._condition:
+            self._queued.append((text, future))
+            if expected:
+                self._expected = max(0, self._expected - 1)
+            self._condition.notify()
+        return future
+
+    def detect(self, text: str, expected: bool = False) -> Optional[Feature]:
+        return self.submit(text, expected).result()
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
+        self._pool.shutdown(wait=True)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._queued or self._closed)
+                if not self._queued:
+                    return
+                deadline = time.monotonic() + self.max_wait
+                while len(self._queued) < self.batch_size and self._expected and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                batch, self._queued = self._queued[:self.batch_size], self._queued[self.batch_size:]
+            self._pool.submit(self._detect, batch)
+
+    def _detect(self, batch: List[Tuple[str, Future]]):
+        try:
+            with Session(self.engine) as session:
+                features = FeatureDetectionService(session).detect_many([text for text, _ in batch], self.batch_size,
+                                                                        return_exceptions=True)
+        except Exception as e:
+            self.logger.error(f"Detection of {len(batch)} documents failed: {e}")
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, future), feature in zip(batch, features):
+            if isinstance(feature, Exception):
+                future.set_exception(feature)
+            else:
+                future.set_result(feature)
+
+
+def labeled_documents(session: Session) -> List[Tuple[str, int]]:
+    """(document text, feature_id) of the latest document of every stored article."""
+    from src.service.markdown import MarkdownHandler
+    handler = MarkdownHandler()
+    samples = {}
+    for article in session.exec(select(Article).order_by(Article.article_id)).all():
+        try:
+            samples[article.hash_file_document] = (handler.load(article.hash_file_document).get_text(), article.feature_id)
+        except Exception:
+            continue
+    return list(samples.values())
+
+
+def main(argv=None) -> int:
+    from dotenv import load_dotenv
+    from src.repository.DBConnection import DBConnection
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Accuracy versus latency of the feature shortlist for several k.")
+    parser.add_argument("--ks", type=int, nargs="+", default=[1, 3, 5, 10, 20])
+    parser.add_argument("--llm", action="store_true", help="also measure end-to-end detection with FeatureDetectorAgent")
+    args = parser.parse_args(argv)
+
+    with Session(DBConnection().engine) as session:
+        samples = labeled_documents(session)
+        if not samples:
+            print("No stored articles to evaluate against.", file=sys.stderr)
+            return 1
+        taxonomy = Taxonomy.for_session(session)
+        index = FeatureIndex.for_taxonomy(taxonomy, key=str(session.get_bind().url))
+
+        def detect(text: str, context: str) -> int:
+            try:
+                feature = taxonomy.resolve_json(AgentRegistry.get(FeatureDetectorAgent).invoke(text=text, context=context, history=None))
+            except (ValueError, LLMCallError):
+                return -1
+            return feature.feature_id if feature else -1
+
+        rows = index.evaluate(samples, args.ks, detect if args.llm else None)
+
+    print(json.dumps({"samples": len(samples), "features": len(index.entries), "results": rows}, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
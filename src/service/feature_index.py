@@ -0,0 +1,180 @@
+import os
+import re
+import math
+import heapq
+import time
+import logging
+import threading
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from typing import Optional, List, Dict, Tuple
+
+from src.service.taxonomy import Taxonomy
+
+_word = re.compile(r"[a-z0-9]+")
+_stopwords = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were will with "
+    "you your can not all any how what when which who use using".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    tokens = []
+    for word in _word.findall((text or "").casefold()):
+        if word in _stopwords or len(word) < 2:
+            continue
+        # crude suffix stripping so "filters"/"filtering"/"filtered" share a term
+        for suffix in ("ions", "ing", "ion", "ed", "es", "s"):
+            if len(word) > len(suffix) + 3 and word.endswith(suffix):
+                word = word[: -len(suffix)]
+                break
+        if len(word) > 4 and word.endswith("e"):
+            word = word[:-1]
+        tokens.append(word)
+    return tokens
+
+
+@dataclass(frozen=True)
+class Candidate:
+    feature_id: int
+    subject: str
+    feature: str
+    score: float
+
+
+class FeatureIndex:
+    """BM25 index (optionally blended with embeddings) over the Subject → Feature catalog."""
+
+    k1 = 1.2
+    b = 0.75
+    # weight of the feature name against subject name/description in the indexed document
+    feature_boost = 3
+
+    _cache: Dict[str, "FeatureIndex"] = {}
+    _cache_lock = threading.Lock()
+
+    def __init__(self, catalog: List[Tuple[int, str, str, Optional[str]]], version: tuple = None, use_embeddings: bool = None):
+        self.version = version
+        self.entries = [(feature_id, subject, feature) for feature_id, feature, subject, _ in catalog]
+        documents = [
+            tokenize(" ".join([feature] * self.feature_boost + [subject, description or ""]))
+            for _, feature, subject, description in catalog
+        ]
+        self._term_freqs = [Counter(doc) for doc in documents]
+        self._lengths = [len(doc) for doc in documents]
+        self._avg_length = sum(self._lengths) / len(self._lengths) if self._lengths else 0.0
+        document_freq = Counter(term for tf in self._term_freqs for term in tf)
+        n = len(documents)
+        self._idf = {term: math.log(1 + (n - df + 0.5) / (df + 0.5)) for term, df in document_freq.items()}
+        self._postings: Dict[str, List[int]] = defaultdict(list)
+        for i, tf in enumerate(self._term_freqs):
+            for term in tf:
+                self._postings[term].append(i)
+
+        if use_embeddings is None:
+            use_embeddings = os.getenv("FEATURE_INDEX_EMBEDDINGS", "").strip().lower() in ("1", "true", "yes", "on")
+        self._embeddings = None
+        self._vectors = None
+        if use_embeddings and os.getenv("EMBEDDINGS_MODEL"):
+            self._init_embeddings([" ".join([f, s, d or ""]) for _, f, s, d in catalog])
+
+    @classmethod
+    def for_session(cls, session) -> "FeatureIndex":
+        """Shared index for the current catalog, rebuilt when the catalog changes."""
+        return cls.for_taxonomy(Taxonomy.for_session(session), key=str(session.get_bind().url))
+
+    @classmethod
+    def for_taxonomy(cls, taxonomy: Taxonomy, key: str = "") -> "FeatureIndex":
+        with cls._cache_lock:
+            index = cls._cache.get(key)
+            if index is None or index.version != taxonomy.version:
+                index = cls(list(taxonomy.catalog), version=taxonomy.version)
+                cls._cache[key] = index
+            return index
+
+    def _init_embeddings(self, texts: List[str]):
+        try:
+            from langchain_openai import OpenAIEmbeddings
+            self._embeddings = OpenAIEmbeddings(model=os.getenv("EMBEDDINGS_MODEL"), api_key=os.getenv("OPEN_API_KEY"))
+            self._vectors = [self._unit(v) for v in self._embeddings.embed_documents(texts)]
+        except Exception as e:
+            logging.getLogger("FeatureIndex").warning(f"Embeddings disabled: {e}")
+            self._embeddings = None
+            self._vectors = None
+
+    @staticmethod
+    def _unit(vector: List[float]) -> List[float]:
+        norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+        return [x / norm for x in vector]
+
+    def scores(self, text: str) -> List[float]:
+        scores = [0.0] * len(self.entries)
+        for term, qf in Counter(tokenize(text)).items():
+            idf = self._idf.get(term)
+            if idf is None:
+                continue
+            # dampen long queries: repeated terms add log-scaled weight
+            weight = idf * (1 + math.log(qf))
+            for i in self._postings[term]:
+                tf = self._term_freqs[i][term]
+                norm = self.k1 * (1 - self.b + self.b * self._lengths[i] / (self._avg_length or 1))
+                scores[i] += weight * tf * (self.k1 + 1) / (tf + norm)
+
+        if self._vectors is not None:
+            query = self._unit(self._embeddings.embed_query(text))
+            top = max(scores) or 1.0
+            scores = [0.5 * s / top + 0.5 * max(0.0, sum(a * b for a, b in zip(query, v)))
+                      for s, v in zip(scores, self._vectors)]
+        return scores
+
+    def shortlist(self, text: str, k: int = 5) -> List[Candidate]:
+        """Up to k best scoring features; features that share no term with the text are never candidates."""
+        scores = self.scores(text)
+        ranked = heapq.nlargest(k, range(len(scores)), key=scores.__getitem__)
+        return [Candidate(*self.entries[i], score=scores[i]) for i in ranked if scores[i] > 0]
+
+    @staticmethod
+    def confidence(candidates: List[Candidate]) -> float:
+        """Share of the top score in the top two scores (1.0 when only one candidate scores)."""
+        if not candidates or candidates[0].score <= 0:
+            return 0.0
+        second = candidates[1].score if len(candidates) > 1 else 0.0
+        return candidates[0].score / (candidates[0].score + second)
+
+    @staticmethod
+    def to_context(candidates: List[Candidate]) -> str:
+        """Same hierarchy format as FeatureRepository.get_names, restricted to the candidates."""
+        grouped: Dict[str, List[str]] = defaultdict(list)
+        for candidate in sorted(candidates, key=lambda c: (c.subject, c.feature)):
+            grouped[candidate.subject].append(candidate.feature)
+        lines = []
+        for subject_name, features in grouped.items():
+            lines.append(f"subject: {subject_name}")
+            for f_name in features:
+                lines.append(f"   feature: {f_name}")
+        return "\n".join(lines)
+
+    def evaluate(self, samples: List[Tuple[str, int]], ks: List[int], detect=None) -> List[Dict[str, float]]:
+        """Accuracy versus latency per k.
+
+        samples are (text, feature_id) pairs. Recall@k and shortlist latency are always measured;
+        when detect(text, context) -> feature_id is given, end-to-end accuracy and latency are too.
+        """
+        rows = []
+        for k in ks:
+            hits, correct, shortlist_time, detect_time = 0, 0, 0.0, 0.0
+            for text, feature_id in samples:
+                started = time.perf_counter()
+                candidates = self.shortlist(text, k)
+                shortlist_time += time.perf_counter() - started
+                hits += any(c.feature_id == feature_id for c in candidates)
+                if detect is not None:
+                    started = time.perf_counter()
+                    correct += detect(text, self.to_context(candidates)) == feature_id
+                    detect_time += time.perf_counter() - started
+            n = len(samples) or 1
+            row = {"k": k, "recall": hits / n, "shortlist_ms": 1000 * shortlist_time / n}
+            if detect is not None:
+                row.update({"accuracy": correct / n, "detect_ms": 1000 * detect_time / n})
+            rows.append(row)
+        return rows
@@ -2,6 +2,8 @@ from pathlib import Path
 from hashlib import sha256
 import os
 import pypandoc
+from typing import List, Dict, Iterable
+from src.service.blobstore import BlobStore, BlobStream
 
 class MarkdownHandler:
     _text: str = None
@@ -14,20 +16,24 @@ class MarkdownHandler:
 
         if os.getenv("HASH_PATH", ".") == ".":
             raise ValueError("HASH_PATH environment variable is not set")
-
+        self._store = BlobStore.shared(self._path)
 
 
     def normalize(self)-> bytes:
         return self._text.replace('\r\n', '\n').replace('\r', '\n').encode('utf-8')
 
     def save(self):
-        self._path.mkdir(parents=True, exist_ok=True)
-        full_path = self._path / f"{self._hash}.md"
-
-        if not full_path.exists():
-            full_path.write_bytes(self._data)
+        if self._data is None:
+            self._data = self._text.encode('utf-8')
+        self._store.put_hashed(self._hash, self._data)
         return self
 
+    def save_many(self, texts: Iterable[str]) -> List[str]:
+        return self._store.put_many(texts)
+
+    def open_stream(self) -> BlobStream:
+        return self._store.open_stream()
+
     def convert_to_pdf(self, name = None):
         if name is None:
             full_path = self._path / f"{self.get_hash()}.pdf"
@@ -39,13 +45,21 @@ class MarkdownHandler:
         return self
 
     def load(self, name):
-        full_path = self._path / f"{name}.md"
-        if full_path.exists():
-            text = full_path.read_text()
-            self.set_text(text)
-            return self
-        else:
+        try:
+            text = self._store.get(name)
+        except FileNotFoundError:
             raise Exception("The path does not exist")
+        # the name is the content hash, no need to hash the text again
+        self._text = text
+        self._data = None
+        self._hash = name
+        return self
+
+    def load_many(self, names: Iterable[str]) -> Dict[str, str]:
+        return self._store.get_many(names)
+
+    def delete_many(self, names: Iterable[str]) -> int:
+        return sum(self._store.delete(name) for name in names)
 
     def set_text(self, text: str):
         if text is None:
@@ -0,0 +1,256 @@
+import os
+import json
+import math
+import time
+import logging
+import tempfile
+import threading
+from bisect import bisect_left
+from pathlib import Path
+from typing import Dict, Tuple, Optional, Any, List
+
+# seconds; covers a cached response (~1 ms) up to a long article generation
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+# USD per 1M (prompt, completion) tokens; LLM_PRICES='{"model": [prompt, completion]}' overrides or extends them
+DEFAULT_PRICES = {
+    "gpt-5": (1.25, 10.0),
+    "gpt-5-mini": (0.25, 2.0),
+    "gpt-5-nano": (0.05, 0.40),
+    "gpt-4.1": (2.0, 8.0),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4o": (2.50, 10.0),
+    "gpt-4o-mini": (0.15, 0.60),
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Counter:
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"value": self.value}
+
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * len(self.buckets)  # per bucket, not cumulative
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        index = bisect_left(self.buckets, value)
+        if index < len(self.counts):
+            self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile (max for the overflow bucket)."""
+        if not self.count:
+            return 0.0
+        rank, seen = math.ceil(q * self.count), 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"count": self.count, "sum": self.sum, "mean": self.sum / self.count if self.count else 0.0,
+                "p50": self.quantile(0.5), "p95": self.quantile(0.95), "max": self.max,
+                "buckets": dict(zip(map(str, self.buckets), self.counts))}
+
+
+class MetricsRegistry:
+    """Process-wide counters and histograms, labeled like Prometheus series; every update is thread-safe."""
+
+    def __init__(self):
+        self._metrics: Dict[str, Tuple[str, str, Dict[Labels, Any]]] = {}  # name -> (kind, help, series)
+        self._lock = threading.Lock()
+
+    def _series(self, kind: str, name: str, help: str, labels: Dict[str, Any], factory):
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics.setdefault(name, (kind, help, {}))
+        if metric[0] != kind:
+            raise ValueError(f"Metric {name} is a {metric[0]}, not a {kind}")
+        series = metric[2].get(key)
+        if series is None:
+            series = metric[2].setdefault(key, factory())
+        return series
+
+    def inc(self, name: str, amount: float = 1.0, help: str = "", **labels):
+        with self._lock:
+            self._series("counter", name, help, labels, Counter).inc(amount)
+
+    def observe(self, name: str, value: float, help: str = "", buckets: Tuple[float, ...] = DEFAULT_BUCKETS, **labels):
+        with self._lock:
+            self._series("histogram", name, help, labels, lambda: Histogram(buckets)).observe(value)
+
+    def reset(self):
+        with self._lock:
+            self._metrics.clear()
+
+    # Export ==========================================================
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                name: {"type": kind, "help": help,
+                       "series": [{"labels": dict(labels), **series.to_dict()} for labels, series in all_series.items()]}
+                for name, (kind, help, all_series) in sorted(self._metrics.items())
+            }
+
+    def to_prometheus(self) -> str:
+        lines = []
+        with self._lock:
+            for name, (kind, help, all_series) in sorted(self._metrics.items()):
+                if help:
+                    lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, series in all_series.items():
+                    if kind == "counter":
+                        lines.append(f"{name}{_labels(labels)} {_number(series.value)}")
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(series.buckets, series.counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_labels(labels + (('le', _number(bound)),))} {cumulative}")
+                    lines.append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {series.count}")
+                    lines.append(f"{name}_sum{_labels(labels)} {_number(series.sum)}")
+                    lines.append(f"{name}_count{_labels(labels)} {series.count}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, directory: Path, prefix: str = "metrics") -> Tuple[Path, Path]:
+        """Atomically write <prefix>.json and <prefix>.prom (node_exporter textfile format) into directory."""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        json_path, prom_path = directory / f"{prefix}.json", directory / f"{prefix}.prom"
+        _write_atomic(json_path, json.dumps(self.to_dict(), indent=2))
+        _write_atomic(prom_path, self.to_prometheus())
+        return json_path, prom_path
+
+
+def _labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, value in labels)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + "}"
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def _write_atomic(path: Path, text: str):
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+metrics = MetricsRegistry()
+
+
+# Recorders ===========================================================
+_prices: Optional[Dict[str, Tuple[float, float]]] = None
+
+
+def prices() -> Dict[str, Tuple[float, float]]:
+    global _prices
+    if _prices is None:
+        table = dict(DEFAULT_PRICES)
+        try:
+            table.update({model: tuple(price) for model, price in json.loads(os.getenv("LLM_PRICES") or "{}").items()})
+        except (ValueError, TypeError) as e:
+            logging.getLogger("metrics").warning(f"Ignoring invalid LLM_PRICES: {e}")
+        _prices = table
+    return _prices
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> Optional[float]:
+    """USD cost of a call; None for models without a known price."""
+    price = prices().get(model)
+    if price is None:
+        return None
+    return (prompt_tokens * price[0] + completion_tokens * price[1]) / 1_000_000
+
+
+def record_llm_call(agent: str, model: str, seconds: float, prompt_tokens: int = 0, completion_tokens: int = 0,
+                    outcome: str = "ok"):
+    """outcome is ok, cached or error; cached calls cost nothing and are only counted."""
+    metrics.inc("kb_llm_calls_total", help="LLM calls per agent", agent=agent, model=model, outcome=outcome)
+    metrics.observe("kb_llm_call_seconds", seconds, help="LLM call latency per agent", agent=agent, model=model, outcome=outcome)
+    if outcome == "cached":
+        return
+    metrics.inc("kb_llm_prompt_tokens_total", prompt_tokens, help="Prompt tokens sent", agent=agent, model=model)
+    metrics.inc("kb_llm_completion_tokens_total", completion_tokens, help="Completion tokens received", agent=agent, model=model)
+    cost = estimate_cost(model, prompt_tokens, completion_tokens)
+    if cost is not None:
+        metrics.inc("kb_llm_cost_usd_total", cost, help="Estimated LLM cost in USD", agent=agent, model=model)
+
+
+def record_stage(component: str, stage: str, seconds: float):
+    metrics.observe("kb_stage_seconds", seconds, help="Wall time per pipeline/flow stage", component=component, stage=stage)
+
+
+class MetricsExporter:
+    """Rewrites the JSON and Prometheus files every interval seconds (and once more on stop)."""
+
+    def __init__(self, directory: Path, interval: float = None, registry: MetricsRegistry = None):
+        self.directory = Path(directory)
+        self.interval = interval if interval is not None else float(os.getenv("METRICS_INTERVAL", "15"))
+        self.registry = registry or metrics
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "MetricsExporter":
+        self._thread = threading.Thread(target=self._run, name="metrics-exporter", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.registry.write(self.directory)
+
+    def stop(self) -> List[Path]:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return list(self.registry.write(self.directory))
+
+
+class StageTimer:
+    """transitions callbacks timing every state from on_enter to on_exit."""
+
+    def __init__(self, component: str):
+        self.component = component
+        self._current: Optional[Tuple[str, float]] = None
+
+    def attach(self, machine, states: List[str], final: str = None):
+        for name in states:
+            state = machine.get_state(name)
+            # first enter callback, so the state's own on_enter_<name> work is inside the measurement
+            state.on_enter.insert(0, lambda *args, _name=name, **kwargs: self.enter(_name))
+            state.add_callback("exit", lambda *args, **kwargs: self.exit())
+        if final is not None:
+            # the final state is never left; its time ends with its on_enter callbacks
+            machine.get_state(final).add_callback("enter", lambda *args, **kwargs: self.exit())
+
+    def enter(self, state: str):
+        self._current = (state, time.perf_counter())
+
+    def exit(self):
+        if self._current is not None:
+            state, started = self._current
+            self._current = None
+            record_stage(self.component, state, time.perf_counter() - started)
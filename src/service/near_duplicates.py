@@ -0,0 +1,231 @@
+import os
+import re
+import sys
+import time
+import random
+import logging
+import argparse
+import threading
+from array import array
+from hashlib import blake2b
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+from sqlmodel import Session
+
+from src.repository.FingerprintRepository import FingerprintRepository
+
+_word = re.compile(r"\w+")
+_MASK = (1 << 64) - 1
+_GOLDEN = 0x9E3779B97F4A7C15
+
+
+class MinHasher:
+    """MinHash signatures of word shingles; the share of equal slots estimates the Jaccard similarity of two texts.
+
+    One permutation hashing: every shingle hash goes to one of num_perm bins by its low bits and each bin keeps its
+    minimum, so a signature costs one pass over the shingles instead of num_perm. Empty bins borrow the minimum of
+    the next non-empty bin (rotation densification), which keeps short texts comparable.
+    """
+
+    def __init__(self, num_perm: int = 128, shingle_size: int = 5, seed: int = 1):
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.key = seed.to_bytes(8, "little")  # fixed, so signatures stay comparable across processes and runs
+
+    def shingles(self, text: str) -> set:
+        words = _word.findall((text or "").casefold())
+        size = min(self.shingle_size, len(words)) or 1
+        return {
+            int.from_bytes(blake2b(" ".join(words[i:i + size]).encode("utf-8"), digest_size=8, key=self.key).digest(), "little")
+            for i in range(max(1, len(words) - size + 1))
+        }
+
+    def signature(self, text: str) -> Tuple[int, ...]:
+        n = self.num_perm
+        mins = [_MASK] * n
+        for x in self.shingles(text):
+            slot, value = x % n, x // n
+            if value < mins[slot]:
+                mins[slot] = value
+        if _MASK in mins and any(m != _MASK for m in mins):
+            original, source = mins[:], None
+            for k in range(2 * n - 1, -1, -1):  # two rounds, so the bins at the end borrow from the start
+                i = k % n
+                if original[i] != _MASK:
+                    source = i
+                elif k < n:
+                    # the distance to the borrowed bin keeps two texts' borrowed slots from matching by accident
+                    mins[i] = (original[source] + ((source - i) % n) * _GOLDEN) & _MASK
+        return tuple(mins)
+
+    @staticmethod
+    def to_bytes(signature: Tuple[int, ...]) -> bytes:
+        return array("Q", signature).tobytes()
+
+    @staticmethod
+    def from_bytes(data: bytes) -> Tuple[int, ...]:
+        values = array("Q")
+        values.frombytes(data)
+        return tuple(values)
+
+    @staticmethod
+    def similarity(a: Tuple[int, ...], b: Tuple[int, ...]) -> float:
+        if not a or len(a) != len(b):
+            return 0.0
+        return sum(x == y for x, y in zip(a, b)) / len(a)
+
+
+@dataclass(frozen=True)
+class NearDuplicate:
+    fingerprint_id: int
+    feature_id: int
+    source_name: str
+    similarity: float  # estimated Jaccard similarity of the word shingles
+    latest: bool  # still the last ingestion of its feature
+
+
+class NearDuplicateIndex:
+    """LSH index (bands of MinHash rows) over the signatures stored with every ingested source.
+
+    One shared index per database, loaded once and then extended with the fingerprints recorded since (by any
+    process) at most every check_interval seconds; a query only compares the signatures sharing a band.
+    """
+
+    _cache: Dict[str, "NearDuplicateIndex"] = {}
+    _cache_lock = threading.Lock()
+
+    def __init__(self, hasher: MinHasher = None, bands: int = 32):
+        self.hasher = hasher or MinHasher()
+        if self.hasher.num_perm % bands:
+            raise ValueError(f"num_perm {self.hasher.num_perm} is not a multiple of bands {bands}")
+        self.bands = bands
+        self.rows = self.hasher.num_perm // bands
+        self.buckets: List[Dict[int, List[int]]] = [{} for _ in range(bands)]
+        self.entries: Dict[int, Tuple[int, str, Tuple[int, ...]]] = {}  # fingerprint_id → (feature_id, source, signature)
+        self.latest: Dict[int, int] = {}  # feature_id → its last fingerprint_id
+        self.last_id = 0
+        self.checked_at = 0.0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_session(cls, session: Session, check_interval: float = None) -> "NearDuplicateIndex":
+        if check_interval is None:
+            check_interval = float(os.getenv("NEAR_DUPLICATE_CHECK_INTERVAL", "5"))
+        key = str(session.get_bind().url)
+        with cls._cache_lock:
+            index = cls._cache.get(key)
+            if index is None:
+                index = cls._cache[key] = cls()
+        if time.monotonic() - index.checked_at >= check_interval:
+            index.refresh(session)
+        return index
+
+    @classmethod
+    def invalidate(cls):
+        with cls._cache_lock:
+            cls._cache.clear()
+
+    def refresh(self, session: Session):
+        with self._lock:
+            for fingerprint, signature in FingerprintRepository(session).get_since(self.last_id):
+                self.latest[fingerprint.feature_id] = fingerprint.fingerprint_id
+                self.last_id = fingerprint.fingerprint_id
+                if signature:
+                    self._add(fingerprint.fingerprint_id, fingerprint.feature_id, fingerprint.source_name,
+                              MinHasher.from_bytes(signature))
+            self.checked_at = time.monotonic()
+
+    def add(self, fingerprint_id: int, feature_id: int, source_name: str, signature: Tuple[int, ...]):
+        with self._lock:
+            self.latest[feature_id] = max(self.latest.get(feature_id, 0), fingerprint_id)
+            self._add(fingerprint_id, feature_id, source_name, signature)
+
+    def _add(self, fingerprint_id: int, feature_id: int, source_name: str, signature: Tuple[int, ...]):
+        if len(signature) != self.hasher.num_perm or fingerprint_id in self.entries:
+            return
+        self.entries[fingerprint_id] = (feature_id, source_name, signature)
+        for band, key in enumerate(self._band_keys(signature)):
+            self.buckets[band].setdefault(key, []).append(fingerprint_id)
+
+    def _band_keys(self, signature: Tuple[int, ...]):
+        for band in range(self.bands):
+            yield hash(signature[band * self.rows:(band + 1) * self.rows])
+
+    def query(self, signature: Tuple[int, ...]) -> Optional[NearDuplicate]:
+        """Most similar indexed source sharing at least one band with signature, None when there is none."""
+        with self._lock:
+            candidates = set()
+            for band, key in enumerate(self._band_keys(signature)):
+                candidates.update(self.buckets[band].get(key, ()))
+            best = None
+            for fingerprint_id in candidates:
+                feature_id, source_name, other = self.entries[fingerprint_id]
+                similarity = MinHasher.similarity(signature, other)
+                if best is None or (similarity, fingerprint_id) > (best.similarity, best.fingerprint_id):
+                    best = NearDuplicate(fingerprint_id, feature_id, source_name, similarity,
+                                         self.latest.get(feature_id) == fingerprint_id)
+            return best
+
+
+@dataclass
+class SourceMatch:
+    """Outcome of matching a cleaned source text against the sources ingested before."""
+    signature: Tuple[int, ...]
+    duplicate: Optional[NearDuplicate] = None
+    skip: bool = False  # near-identical to the current source of its feature: nothing to regenerate
+    feature_id: Optional[int] = None  # known feature: detection is not needed
+
+
+def match_source(session: Session, text: str, route_threshold: float = None, skip_threshold: float = None) -> SourceMatch:
+    """Signature of text and, above NEAR_DUPLICATE_ROUTE, the feature of its closest prior source; above
+    NEAR_DUPLICATE_SKIP (and still the current source of that feature) the document can be skipped."""
+    route_threshold = route_threshold if route_threshold is not None else float(os.getenv("NEAR_DUPLICATE_ROUTE", "0.8"))
+    skip_threshold = skip_threshold if skip_threshold is not None else float(os.getenv("NEAR_DUPLICATE_SKIP", "0.98"))
+    index = NearDuplicateIndex.for_session(session)
+    match = SourceMatch(signature=index.hasher.signature(text))
+    duplicate = index.query(match.signature)
+    if duplicate is None or duplicate.similarity < min(route_threshold, skip_threshold):
+        return match
+    match.duplicate = duplicate
+    match.feature_id = duplicate.feature_id
+    match.skip = duplicate.latest and duplicate.similarity >= skip_threshold
+    logging.getLogger("NearDuplicates").info(
+        f"Near duplicate of {duplicate.source_name} ({duplicate.similarity:.2f}): "
+        f"{'skipping' if match.skip else 'feature known'}")
+    return match
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Signature and lookup time of the near-duplicate index.")
+    parser.add_argument("--docs", type=int, default=2000, help="synthetic sources in the index")
+    parser.add_argument("--words", type=int, default=3000, help="words per source")
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(0)
+    vocabulary = [f"w{i}" for i in range(5000)]
+    index = NearDuplicateIndex()
+    documents = []
+    started = time.perf_counter()
+    for i in range(args.docs):
+        words = [rng.choice(vocabulary) for _ in range(args.words)]
+        documents.append(words)
+        index.add(i + 1, i % 50 + 1, f"doc{i}.pdf", index.hasher.signature(" ".join(words)))
+    signature_ms = 1000 * (time.perf_counter() - started) / args.docs
+
+    hits, lookup = 0, 0.0
+    for i in range(args.queries):
+        words = list(documents[i % args.docs])
+        words[:3] = ["exported", "on", f"2025-09-{i % 28 + 1:02d}"]  # a new export timestamp
+        signature = index.hasher.signature(" ".join(words))
+        started = time.perf_counter()
+        found = index.query(signature)
+        lookup += time.perf_counter() - started
+        hits += found is not None and found.fingerprint_id == i % args.docs + 1
+    print(f"{args.docs} sources of {args.words} words: signature {signature_ms:.1f} ms/doc, "
+          f"lookup {1000 * lookup / args.queries:.3f} ms, {hits}/{args.queries} re-exports matched")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,374 @@
+import os
+import json
+import time
+import logging
+import threading
+from dataclasses import dataclass, field, asdict
+from pathlib import Path
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from typing import Optional, List, Dict, Iterable, Any
+from sqlmodel import Session
+
+from src.Agents.agents import AgentRegistry, DocumentCleanerAgent
+from src.repository.DBConnection import DBConnection
+from src.service.articles import ArticleService, ArticleGenerationError
+from src.repository.FingerprintRepository import FingerprintRepository, file_digest, text_digest
+from src.service.detection import FeatureDetectionService, DetectionBatcher
+from src.service.taxonomy import Taxonomy
+from src.service.near_duplicates import MinHasher, NearDuplicateIndex, match_source
+from src.service.checkpoints import RunCheckpoints, DocumentCheckpoints
+from src.service.confluence import ConfluenceService
+from src.service.render import RenderQueue
+from src.service.metrics import metrics, record_stage
+
+
+def extract_pdf(pdf_path: str) -> str:
+    """Process-pool entry point: PDF → cleaned raw text."""
+    return ConfluenceService(pdf_path).process_pdf()
+
+
+@dataclass
+class DocumentResult:
+    pdf_path: str
+    status: str = "pending"
+    subject: Optional[str] = None
+    feature: Optional[str] = None
+    articles: List[Dict[str, Any]] = field(default_factory=list)
+    timings: Dict[str, float] = field(default_factory=dict)
+    error: Optional[str] = None
+    pdf_hash: Optional[str] = None
+    text_hash: Optional[str] = None
+    near_duplicate_of: Optional[str] = None
+    similarity: Optional[float] = None
+    resumed: List[str] = field(default_factory=list)  # stages skipped because the run had checkpointed them
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class IngestionPipeline:
+    """Headless PDF → KB articles pipeline: extraction in a process pool, LLM stages with bounded concurrency.
+
+    With a run_id every stage of every document is checkpointed under it; running the same PDFs again with that
+    run_id (after an interruption) skips the documents and stages the run already finished. A run finished without
+    errors removes its checkpoints.
+    """
+
+    def __init__(self, connection: DBConnection, extract_workers: int = None, llm_concurrency: int = None,
+                 article_concurrency: int = None, renderer: Optional[RenderQueue] = None, detect_batch_size: int = None,
+                 force: bool = False, run_id: str = None, render_bundle: str = None):
+        self.connection = connection
+        self.extract_workers = extract_workers or int(os.getenv("EXTRACT_WORKERS", str(os.cpu_count() or 1)))
+        self.llm_concurrency = llm_concurrency or int(os.getenv("LLM_CONCURRENCY", "4"))
+        self.article_concurrency = article_concurrency
+        self.renderer = renderer
+        # bulk mode: every article of the run is rendered into this one document at the end (one pandoc/LaTeX
+        # start-up) instead of one file per article
+        self.render_bundle = render_bundle
+        # documents detected together in one LLM call (1 = one call per document)
+        self.detect_batch_size = detect_batch_size or int(os.getenv("DETECT_BATCH_SIZE", "8"))
+        self.detector: Optional[DetectionBatcher] = None
+        # unchanged sources (same PDF or cleaned text as the last ingestion of their feature) are skipped unless forced
+        self.force = force
+        self.checkpoints = RunCheckpoints(connection, run_id) if run_id else None
+        self.logger = logging.getLogger("IngestionPipeline")
+        self._feature_locks: Dict[int, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+        self._manifest_lock = threading.Lock()
+
+    def run(self, pdf_paths: Iterable[Path], manifest_path: Optional[Path] = None) -> List[DocumentResult]:
+        pdf_paths = [str(p) for p in pdf_paths]
+        results: List[DocumentResult] = []
+        if manifest_path is not None:
+            Path(manifest_path).parent.mkdir(parents=True, exist_ok=True)
+            Path(manifest_path).write_text("")
+
+        extract_workers = max(1, min(self.extract_workers, len(pdf_paths) or 1))
+        if self.detect_batch_size > 1 and len(pdf_paths) > 1:
+            self.detector = DetectionBatcher(self.connection.read_engine, self.detect_batch_size)
+        try:
+            self._run(pdf_paths, results, extract_workers, manifest_path)
+        finally:
+            if self.detector is not None:
+                self.detector.close()
+                self.detector = None
+
+        order = {pdf_path: i for i, pdf_path in enumerate(pdf_paths)}
+        results.sort(key=lambda r: order[r.pdf_path])
+
+        failed = []
+        if self.renderer is not None:
+            if self.render_bundle:
+                hashes = list(dict.fromkeys(a["hash_file_article"] for r in results for a in r.articles))
+                if hashes:
+                    self.renderer.submit_bundle(hashes, self.render_bundle)
+            failed = [f for f in self.renderer.wait() if f.exception() is not None]
+            self.logger.info(f"Rendering finished, {len(failed)} failed.")
+
+        # nothing left to resume: drop the run's checkpoints and its intermediate texts
+        if self.checkpoints is not None and not failed and all(r.status != "error" for r in results):
+            deleted = self.checkpoints.prune()
+            self.logger.info(f"Run {self.checkpoints.run_id} finished, checkpoints and {deleted} intermediate text(s) removed.")
+        return results
+
+    def _run(self, pdf_paths: List[str], results: List[DocumentResult], extract_workers: int, manifest_path: Optional[Path]):
+        with ProcessPoolExecutor(max_workers=extract_workers) as extractors, \
+                ThreadPoolExecutor(max_workers=self.llm_concurrency, thread_name_prefix="llm") as llm_pool:
+            started = {}
+            extractions = {}
+            processing = []
+            for pdf_path in pdf_paths:
+                started[pdf_path] = time.perf_counter()
+                result = DocumentResult(pdf_path=pdf_path)
+                checkpoints = self._open(result)
+                if self._finished(result, checkpoints) or self._unchanged(result, pdf_hash=result.pdf_hash):
+                    result.timings["fingerprint"] = time.perf_counter() - started[pdf_path]
+                    self._record(result, manifest_path, checkpoints)
+                    results.append(result)
+                    continue
+                raw_text = self._checkpointed(result, checkpoints, "parse")
+                if raw_text is not None:  # extracted before the run was interrupted
+                    processing.append(llm_pool.submit(self._process_and_record, result, raw_text, manifest_path,
+                                                      None, checkpoints))
+                    continue
+                extractions[extractors.submit(extract_pdf, pdf_path)] = (result, checkpoints)
+
+            # hand every extracted document to the LLM stages as soon as it is ready
+            for future in as_completed(extractions):
+                result, checkpoints = extractions[future]
+                result.timings["extract"] = time.perf_counter() - started[result.pdf_path]
+                try:
+                    raw_text = future.result()
+                except Exception as e:
+                    self._fail(result, "extract", e)
+                    self._record(result, manifest_path)
+                    results.append(result)
+                    continue
+                processing.append(llm_pool.submit(self._process_and_record, result, raw_text, manifest_path,
+                                                  None, checkpoints))
+
+            for future in as_completed(processing):
+                results.append(future.result())
+
+    def process_pdf(self, pdf_path, extractor: Optional[Executor] = None, force: bool = None) -> DocumentResult:
+        """One document end to end, for callers with their own queue (the ingestion service); extraction runs in
+        extractor when given. force overrides the pipeline's for this document."""
+        result = DocumentResult(pdf_path=str(pdf_path))
+        started = time.perf_counter()
+        checkpoints = self._open(result)
+        if self._finished(result, checkpoints) or self._unchanged(result, pdf_hash=result.pdf_hash, force=force):
+            result.timings["fingerprint"] = time.perf_counter() - started
+            self._record(result, None, checkpoints)
+            return result
+        started = time.perf_counter()
+        raw_text = self._checkpointed(result, checkpoints, "parse")
+        if raw_text is None:
+            try:
+                raw_text = extractor.submit(extract_pdf, str(pdf_path)).result() if extractor else extract_pdf(str(pdf_path))
+            except Exception as e:
+                result.timings["extract"] = time.perf_counter() - started
+                self._fail(result, "extract", e)
+                self._record(result, None)
+                return result
+        result.timings["extract"] = time.perf_counter() - started
+        return self._process_and_record(result, raw_text, None, force, checkpoints)
+
+    def _process_and_record(self, result: DocumentResult, raw_text: str, manifest_path: Optional[Path],
+                            force: bool = None, checkpoints: Optional[DocumentCheckpoints] = None) -> DocumentResult:
+        self.process_text(result, raw_text, force, checkpoints)
+        self._record(result, manifest_path, checkpoints)
+        return result
+
+    def process_text(self, result: DocumentResult, raw_text: str, force: bool = None,
+                     checkpoints: Optional[DocumentCheckpoints] = None) -> DocumentResult:
+        """The stages after extraction; with checkpoints, each is recorded and skipped when the run already did it."""
+        stage = "fingerprint"
+        expected = False
+        try:
+            if checkpoints is not None and "parse" not in result.resumed:
+                checkpoints.save("parse", text=raw_text, pdf_hash=result.pdf_hash)
+            started = time.perf_counter()
+            result.text_hash = text_digest(raw_text)
+            if self._unchanged(result, text_hash=result.text_hash, force=force):
+                result.timings[stage] = time.perf_counter() - started
+                return result
+            with Session(self.connection.read_engine) as session:
+                match = match_source(session, raw_text)
+            if match.duplicate is not None:
+                result.near_duplicate_of = match.duplicate.source_name
+                result.similarity = round(match.duplicate.similarity, 4)
+            if match.skip and self._unchanged(result, feature_id=match.feature_id, force=force):
+                result.timings[stage] = time.perf_counter() - started
+                return result
+            result.timings[stage] = time.perf_counter() - started
+
+            # while it is cleaned, a document on its way to batched detection keeps the batch waiting for it
+            expected = self.detector is not None and match.feature_id is None
+            if expected:
+                self.detector.expect()
+
+            stage = "well_forming"
+            started = time.perf_counter()
+            well_formed_text = self._checkpointed(result, checkpoints, stage)
+            if well_formed_text is None:
+                well_formed_text = AgentRegistry.get(DocumentCleanerAgent).invoke(text=raw_text, context=None, history=None)
+                if checkpoints is not None:
+                    checkpoints.save(stage, text=well_formed_text)
+            result.timings[stage] = time.perf_counter() - started
+
+            stage = "feature_detecting"
+            started = time.perf_counter()
+            feature = None
+            detected = self._checkpointed(result, checkpoints, stage, text=False)
+            if detected is not None or match.feature_id is not None:
+                # detected before the interruption, or a near duplicate of an ingested source: same feature, merge path
+                feature_id = detected["feature_id"] if detected is not None else match.feature_id
+                with Session(self.connection.read_engine) as session:
+                    feature = Taxonomy.for_session(session).features.get(feature_id)
+            if feature is None and self.detector is not None:  # batched with the other documents waiting for detection
+                future, expected = self.detector.submit(well_formed_text, expected), False
+                feature = future.result()
+            elif feature is None:
+                with Session(self.connection.read_engine) as session:
+                    feature = FeatureDetectionService(session).detect(well_formed_text)
+            if expected:  # detected before the interruption
+                self.detector.forget()
+                expected = False
+            if feature is None:
+                raise ValueError("Detected feature is not in the catalog")
+            if checkpoints is not None and detected is None:
+                checkpoints.save(stage, feature_id=feature.feature_id)
+            result.feature = feature.name
+            result.subject = feature.subject.name
+            result.timings[stage] = time.perf_counter() - started
+
+            # no session is open while the articles are generated: ArticleService opens its own around each read/write
+            stage = "generate_articles"
+            started = time.perf_counter()
+            writer = self.connection.writer
+            engine = self.connection.read_engine if writer else self.connection.engine
+            renderer = None if self.render_bundle else self.renderer  # bundles are rendered at the end of run
+            service = ArticleService(engine, max_workers=self.article_concurrency, renderer=renderer, writer=writer,
+                                     stream=True)
+            # two documents of the same feature must not race on the article versions
+            with self._feature_lock(feature.feature_id):
+                try:
+                    generated = service.generate(feature, well_formed_text, checkpoints=checkpoints)
+                except ArticleGenerationError as e:
+                    # the article types that succeeded are committed; keep them in the manifest
+                    result.articles = self._articles(e.generated)
+                    raise
+            result.articles = self._articles(generated)
+            result.timings[stage] = time.perf_counter() - started
+            self._remember(result, feature.feature_id, match.signature)
+            result.status = "ok"
+        except Exception as e:
+            if expected:  # failed before reaching detection
+                self.detector.forget()
+            self._fail(result, stage, e)
+        return result
+
+    # Checkpoints =====================================================
+    def _open(self, result: DocumentResult) -> Optional[DocumentCheckpoints]:
+        """Hash the PDF and load its checkpoints in this run, dropping them when the PDF changed since."""
+        self._pdf_hash(result)
+        if self.checkpoints is None:
+            return None
+        checkpoints = self.checkpoints.document(result.pdf_path)
+        if checkpoints.get("parse") is not None and checkpoints.get("parse", pdf_hash=result.pdf_hash) is None:
+            self.logger.info(f"{result.pdf_path} changed since it was checkpointed, starting it over")
+            checkpoints.clear()
+        return checkpoints
+
+    def _finished(self, result: DocumentResult, checkpoints: Optional[DocumentCheckpoints]) -> bool:
+        """Restore result from the run when the document was already finished in it."""
+        done = checkpoints.meta("done", pdf_hash=result.pdf_hash) if checkpoints is not None else None
+        if done is None:
+            return False
+        for name, value in done.items():
+            if name not in ("timings", "resumed"):
+                setattr(result, name, value)
+        result.resumed = ["done"]
+        # renders that had not finished when the run was interrupted (a bundle is rendered again at the end)
+        if self.renderer is not None and not self.render_bundle:
+            for article in result.articles:
+                stage = f"render:{article['type']}"
+                if checkpoints.get(stage, version=article["version"]) is None:
+                    self.renderer.submit(article["hash_file_article"], Path(article["file_name"]).stem,
+                                         on_done=checkpoints.on_done(stage, version=article["version"]))
+        return True
+
+    @staticmethod
+    def _checkpointed(result: DocumentResult, checkpoints: Optional[DocumentCheckpoints], stage: str, text: bool = True):
+        """Output text (or metadata) of stage from the run, noted in the result; None when the stage has to run."""
+        if checkpoints is None:
+            return None
+        output = checkpoints.text(stage) if text else checkpoints.meta(stage)
+        if output is not None:
+            result.resumed.append(stage)
+        return output
+
+    # Source fingerprints =============================================
+    def _pdf_hash(self, result: DocumentResult) -> Optional[str]:
+        try:
+            result.pdf_hash = file_digest(result.pdf_path)
+        except OSError:
+            result.pdf_hash = None  # reported by the extraction
+        return result.pdf_hash
+
+    def _unchanged(self, result: DocumentResult, pdf_hash: str = None, text_hash: str = None, feature_id: int = None,
+                   force: bool = None) -> bool:
+        """Mark result unchanged when its source is still the last one ingested for a feature (or feature_id is given,
+        for a near duplicate of it)."""
+        if (self.force if force is None else force) or not (pdf_hash or text_hash or feature_id):
+            return False
+        with Session(self.connection.read_engine) as session:
+            if feature_id is None:
+                fingerprint = FingerprintRepository(session).find_current(pdf_hash=pdf_hash, text_hash=text_hash)
+                if fingerprint is None:
+                    return False
+                feature_id = fingerprint.feature_id
+            feature = Taxonomy.for_session(session).features.get(feature_id)
+        result.status = "unchanged"
+        if feature is not None:
+            result.feature, result.subject = feature.name, feature.subject.name
+        metrics.inc("kb_documents_unchanged_total", help="Documents skipped because their source did not change")
+        return True
+
+    def _remember(self, result: DocumentResult, feature_id: int, signature):
+        with Session(self.connection.engine) as session:
+            FingerprintRepository(session).add(feature_id, result.pdf_hash, result.text_hash, result.pdf_path,
+                                               MinHasher.to_bytes(signature))
+            session.commit()
+            NearDuplicateIndex.for_session(session, check_interval=0)  # later documents of this run see it at once
+
+    @staticmethod
+    def _articles(generated) -> List[Dict[str, Any]]:
+        return [
+            {"type": g.type_name, "version": g.version, "hash_file_article": g.hash_file_article, "file_name": g.file_name}
+            for g in generated
+        ]
+
+    def _feature_lock(self, feature_id: int) -> threading.Lock:
+        with self._locks_guard:
+            return self._feature_locks.setdefault(feature_id, threading.Lock())
+
+    def _fail(self, result: DocumentResult, stage: str, error: Exception):
+        result.status = "error"
+        result.error = f"{stage}: {error}"
+        self.logger.error(f"{result.pdf_path} failed at {stage}: {error}")
+
+    def _record(self, result: DocumentResult, manifest_path: Optional[Path],
+                checkpoints: Optional[DocumentCheckpoints] = None):
+        result.timings["total"] = sum(v for k, v in result.timings.items() if k != "total")
+        if checkpoints is not None and result.status in ("ok", "unchanged") and "done" not in result.resumed:
+            checkpoints.save("done", **result.to_dict())
+        self.logger.info(f"{result.pdf_path}: {result.status} ({result.timings['total']:.2f}s)")
+        for stage, seconds in result.timings.items():
+            record_stage("pipeline", stage, seconds)
+        metrics.inc("kb_documents_total", help="Ingested documents by outcome", status=result.status)
+        if manifest_path is None:
+            return
+        with self._manifest_lock:
+            with open(manifest_path, "a", encoding="utf-8") as manifest:
+                manifest.write(json.dumps(result.to_dict()) + "\n")
@@ -0,0 +1,319 @@
+import os
+import time
+import random
+import asyncio
+import logging
+import threading
+from typing import Awaitable, Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
+
+from src.service.metrics import metrics
+
+T = TypeVar("T")
+
+
+class LLMCallError(Exception):
+    """An LLM call failed for good: not retryable, out of retries or past its deadline."""
+
+    def __init__(self, agent: str, message: str, attempts: int = 1, cause: Optional[BaseException] = None):
+        super().__init__(f"{agent}: {message}")
+        self.agent = agent
+        self.attempts = attempts
+        self.cause = cause
+
+
+def retry_reason(error: BaseException) -> Optional[str]:
+    """'throttled' (429), 'unavailable' (5xx, timeouts, connection errors) or None when retrying cannot help."""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    if status == 429:
+        return "throttled"
+    if status is not None and (status >= 500 or status == 408):
+        return "unavailable"
+    name = type(error).__name__
+    if status is None and any(part in name for part in ("Timeout", "Connection", "RemoteProtocol", "ReadError")):
+        return "unavailable"
+    return None
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after")) if headers.get("retry-after") else None
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """Refills rate_per_minute units per minute up to one minute's worth; acquire blocks until enough are available."""
+
+    def __init__(self, rate_per_minute: float):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = rate_per_minute
+        self._available = rate_per_minute
+        self._updated = time.monotonic()
+        self._cond = threading.Condition()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._available = min(self.capacity, self._available + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _take(self, amount: float) -> float:
+        """0 once amount was taken, else the seconds until it is available; call with the lock held."""
+        self._refill()
+        if self._available >= amount:
+            self._available -= amount
+            return 0.0
+        return (amount - self._available) / self.rate
+
+    def acquire(self, amount: float, deadline: float) -> bool:
+        amount = min(amount, self.capacity)  # a single huge request must still go through eventually
+        with self._cond:
+            while True:
+                wait = self._take(amount)
+                if not wait:
+                    return True
+                if time.monotonic() + wait > deadline:
+                    return False
+                self._cond.wait(wait)
+
+    async def aacquire(self, amount: float, deadline: float) -> bool:
+        """acquire that sleeps on the event loop instead of blocking its thread."""
+        amount = min(amount, self.capacity)
+        while True:
+            with self._cond:
+                wait = self._take(amount)
+            if not wait:
+                return True
+            if time.monotonic() + wait > deadline:
+                return False
+            await asyncio.sleep(wait)
+
+    def adjust(self, amount: float):
+        """Correct an earlier estimate (positive = more was used than acquired)."""
+        with self._cond:
+            self._refill()
+            self._available = min(self.capacity, self._available - amount)
+            self._cond.notify_all()
+
+
+class AdaptiveConcurrency:
+    """AIMD limit on calls in flight: halved on throttling, +1 after `limit` successes in a row; other outcomes
+    (failures, cancelled calls) leave the limit as it is."""
+
+    def __init__(self, initial: int, minimum: int = 1, maximum: int = 64):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.in_flight = 0
+        self._successes = 0
+        self._cond = threading.Condition()
+        self._waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []  # aacquire calls waiting for a slot
+
+    def acquire(self, deadline: float) -> bool:
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            self.in_flight += 1
+            return True
+
+    async def aacquire(self, deadline: float) -> bool:
+        """acquire for coroutines: waits for a release on the event loop instead of blocking its thread."""
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._cond:
+                if self.in_flight < int(self.limit):
+                    self.in_flight += 1
+                    return True
+                waiter = (loop, loop.create_future())
+                self._waiters.append(waiter)
+            try:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                await asyncio.wait_for(waiter[1], remaining)
+            except asyncio.TimeoutError:
+                return False
+            finally:
+                with self._cond:
+                    if waiter in self._waiters:
+                        self._waiters.remove(waiter)
+
+    def release(self, throttled: bool = False, succeeded: bool = True):
+        with self._cond:
+            self.in_flight -= 1
+            if throttled:
+                self.limit = max(self.minimum, self.limit / 2)
+                self._successes = 0
+            elif succeeded:
+                self._successes += 1
+                if self._successes >= int(self.limit):
+                    self.limit = min(self.maximum, self.limit + 1)
+                    self._successes = 0
+            self._cond.notify_all()
+            waiters, self._waiters = self._waiters, []
+        for loop, future in waiters:  # releases may come from other threads than the waiting loop
+            loop.call_soon_threadsafe(_wake, future)
+
+
+_END = object()  # end of a stream before its first piece
+
+
+def _wake(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+class RateLimiter:
+    """Client-side limits shared by every agent of a model: requests/min and tokens/min token buckets,
+    adaptive concurrency, and jittered exponential retries of throttled or failed calls within a deadline."""
+
+    _shared: Dict[str, "RateLimiter"] = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, requests_per_minute: float = None, tokens_per_minute: float = None,
+                 max_in_flight: int = None, min_in_flight: int = None, max_retries: int = None,
+                 deadline: float = None, backoff_base: float = None, backoff_max: float = None):
+        rpm = requests_per_minute if requests_per_minute is not None else float(os.getenv("LLM_RPM", "0"))
+        tpm = tokens_per_minute if tokens_per_minute is not None else float(os.getenv("LLM_TPM", "0"))
+        self.requests = TokenBucket(rpm) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm) if tpm > 0 else None
+        maximum = max_in_flight or int(os.getenv("LLM_MAX_IN_FLIGHT", "16"))
+        minimum = min_in_flight or int(os.getenv("LLM_MIN_IN_FLIGHT", "1"))
+        self.concurrency = AdaptiveConcurrency(initial=maximum, minimum=minimum, maximum=maximum)
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("LLM_MAX_RETRIES", "6"))
+        self.deadline = deadline if deadline is not None else float(os.getenv("LLM_DEADLINE", "300"))
+        self.backoff_base = backoff_base if backoff_base is not None else float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+        self.backoff_max = backoff_max if backoff_max is not None else float(os.getenv("LLM_BACKOFF_MAX", "30"))
+        self.logger = logging.getLogger("RateLimiter")
+
+    @classmethod
+    def shared(cls, model_name: str) -> "RateLimiter":
+        with cls._shared_lock:
+            limiter = cls._shared.get(model_name)
+            if limiter is None:
+                limiter = cls._shared[model_name] = cls()
+            return limiter
+
+    @classmethod
+    def reset(cls):
+        with cls._shared_lock:
+            cls._shared.clear()
+
+    def call(self, agent: str, fn: Callable[[], T], estimated_tokens: int = 0,
+             used_tokens: Callable[[], int] = None) -> T:
+        """Run fn under the limits, retrying throttled/unavailable errors; raises LLMCallError when it gives up.
+
+        used_tokens, when given, reports the tokens the call actually used so the tokens/min bucket is corrected.
+        """
+        deadline = time.monotonic() + self.deadline
+        attempt = 0
+        while True:
+            attempt += 1
+            self._acquire(agent, estimated_tokens, deadline, attempt)
+            try:
+                result = fn()
+            except Exception as e:
+                time.sleep(self._retry_delay(agent, e, attempt, deadline))
+                continue
+            except BaseException:  # KeyboardInterrupt, SystemExit: give the slot back, it is neither outcome
+                self.concurrency.release(succeeded=False)
+                raise
+            self._succeeded(estimated_tokens, used_tokens)
+            return result
+
+    async def acall(self, agent: str, fn: Callable[[], Awaitable[T]], estimated_tokens: int = 0,
+                    used_tokens: Callable[[], int] = None) -> T:
+        """call for coroutines: fn() is awaited, and waiting for the limits or a retry never blocks the event loop."""
+        deadline = time.monotonic() + self.deadline
+        attempt = 0
+        while True:
+            attempt += 1
+            await self._aacquire(agent, estimated_tokens, deadline, attempt)
+            try:
+                result = await fn()
+            except Exception as e:
+                await asyncio.sleep(self._retry_delay(agent, e, attempt, deadline))
+                continue
+            except BaseException:  # CancelledError, KeyboardInterrupt: give the slot back, it is neither outcome
+                self.concurrency.release(succeeded=False)
+                raise
+            self._succeeded(estimated_tokens, used_tokens)
+            return result
+
+    def stream(self, agent: str, open_stream: Callable[[], Iterator[T]], estimated_tokens: int = 0,
+               used_tokens: Callable[[], int] = None) -> Iterator[T]:
+        """Pieces of the stream open_stream() returns, under the limits like call.
+
+        Opening is retried until the first piece arrives; a failure after that is raised as is. The call slot is
+        held until the stream is exhausted, fails or is closed, and the tokens/min bucket is then settled with
+        used_tokens.
+        """
+        deadline = time.monotonic() + self.deadline
+        attempt = 0
+        while True:
+            attempt += 1
+            self._acquire(agent, estimated_tokens, deadline, attempt)
+            try:
+                iterator = iter(open_stream())
+                first = next(iterator, _END)
+            except Exception as e:
+                time.sleep(self._retry_delay(agent, e, attempt, deadline))
+                continue
+            except BaseException:
+                self.concurrency.release(succeeded=False)
+                raise
+            break
+        try:
+            if first is not _END:
+                yield first
+                yield from iterator
+        except BaseException:  # a failure in the middle of the stream, or the consumer closed it
+            self.concurrency.release(succeeded=False)
+            self._settle(estimated_tokens, used_tokens)
+            raise
+        self._succeeded(estimated_tokens, used_tokens)
+
+    def _retry_delay(self, agent: str, error: Exception, attempt: int, deadline: float) -> float:
+        """Release the failed attempt's slot and return the delay before the next one, or raise LLMCallError."""
+        reason = retry_reason(error)
+        # a retryable failure halves the limit, any other leaves it unchanged (it is not a success either)
+        self.concurrency.release(throttled=reason is not None, succeeded=False)
+        if reason is None:
+            raise LLMCallError(agent, str(error), attempt, error) from error
+        if attempt > self.max_retries:
+            raise LLMCallError(agent, f"giving up after {attempt} attempts: {error}", attempt, error) from error
+        delay = retry_after(error) or random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1)))
+        if time.monotonic() + delay > deadline:
+            raise LLMCallError(agent, f"deadline of {self.deadline:.0f}s reached: {error}", attempt, error) from error
+        metrics.inc("kb_llm_retries_total", help="Retried LLM calls", agent=agent, reason=reason)
+        self.logger.warning(f"{agent}: {reason}, retry {attempt}/{self.max_retries} in {delay:.2f}s")
+        return delay
+
+    def _succeeded(self, estimated_tokens: int, used_tokens: Optional[Callable[[], int]]):
+        self.concurrency.release()
+        self._settle(estimated_tokens, used_tokens)
+
+    def _settle(self, estimated_tokens: int, used_tokens: Optional[Callable[[], int]]):
+        if self.tokens is not None and used_tokens is not None:
+            self.tokens.adjust(used_tokens() - estimated_tokens)
+
+    def _acquire(self, agent: str, estimated_tokens: int, deadline: float, attempt: int):
+        if self.requests is not None and not self.requests.acquire(1, deadline):
+            raise LLMCallError(agent, "deadline reached waiting for the requests/min budget", attempt)
+        if self.tokens is not None and estimated_tokens and not self.tokens.acquire(estimated_tokens, deadline):
+            raise LLMCallError(agent, "deadline reached waiting for the tokens/min budget", attempt)
+        if not self.concurrency.acquire(deadline):
+            raise LLMCallError(agent, "deadline reached waiting for a free call slot", attempt)
+
+    async def _aacquire(self, agent: str, estimated_tokens: int, deadline: float, attempt: int):
+        if self.requests is not None and not await self.requests.aacquire(1, deadline):
+            raise LLMCallError(agent, "deadline reached waiting for the requests/min budget", attempt)
+        if self.tokens is not None and estimated_tokens and not await self.tokens.aacquire(estimated_tokens, deadline):
+            raise LLMCallError(agent, "deadline reached waiting for the tokens/min budget", attempt)
+        if not await self.concurrency.aacquire(deadline):
+            raise LLMCallError(agent, "deadline reached waiting for a free call slot", attempt)
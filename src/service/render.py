@@ -0,0 +1,138 @@
+import os
+import json
+import uuid
+import shutil
+import logging
+import threading
+from hashlib import sha256
+from pathlib import Path
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Optional, List, Dict, Callable
+
+import pypandoc
+
+from src.service.blobstore import BlobStore
+
+
+def _render(text: str, fmt: str, extra_args: List[str], output_path: str) -> str:
+    """Process-pool entry point: render Markdown with pandoc into output_path (written atomically)."""
+    # unique per render: two renders of the same cache key may run at once
+    tmp_path = f"{output_path}.{uuid.uuid4().hex}.tmp{Path(output_path).suffix}"
+    pypandoc.convert_text(text, to=fmt, format="md", outputfile=tmp_path, extra_args=extra_args)
+    os.replace(tmp_path, output_path)
+    return output_path
+
+
+class RenderQueue:
+    """Background pandoc rendering with a cache keyed on (content hash, format, pandoc arguments)."""
+
+    formats: Dict[str, tuple] = {
+        "pdf": ("pdf", ".pdf", ["--standalone", "--pdf-engine=xelatex"]),
+        "html": ("html", ".html", ["--standalone", "--metadata=pagetitle:KB Article"]),
+    }
+    # separates articles rendered together in one pandoc/LaTeX run
+    bundle_separators = {"pdf": "\n\n\\newpage\n\n", "html": "\n\n---\n\n"}
+
+    def __init__(self, output_path: Path = None, fmt: str = None, max_workers: int = None):
+        self._path = Path(output_path or os.getenv("HASH_PATH", "."))
+        self.fmt = (fmt or os.getenv("RENDER_FORMAT", "pdf")).strip().lower()
+        if self.fmt not in self.formats:
+            raise ValueError(f"Unknown RENDER_FORMAT '{self.fmt}'. Valid values are: {', '.join(self.formats)}")
+        self.max_workers = max_workers or int(os.getenv("RENDER_WORKERS", "2"))
+        self._cache_path = self._path / "renders"
+        self._store = BlobStore.shared(self._path)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pending: List[Future] = []
+        self._lock = threading.Lock()
+        self.logger = logging.getLogger("RenderQueue")
+
+    @property
+    def extension(self) -> str:
+        return self.formats[self.fmt][1]
+
+    def cache_key(self, content_hash: str, fmt: str = None) -> str:
+        to, _, extra_args = self.formats[fmt or self.fmt]
+        return sha256(json.dumps([content_hash, to, extra_args]).encode("utf-8")).hexdigest()
+
+    def submit(self, content_hash: str, name: str, fmt: str = None,
+               on_done: Callable[[Future], None] = None) -> Future:
+        """Render one stored Markdown blob to <output_path>/<name><ext>; returns a Future of the output Path."""
+        fmt = fmt or self.fmt
+        return self._submit(self.cache_key(content_hash, fmt), lambda: self._store.get(content_hash), name, fmt, on_done)
+
+    def submit_bundle(self, content_hashes: List[str], name: str, fmt: str = None,
+                      on_done: Callable[[Future], None] = None) -> Future:
+        """Render many articles into one document, paying the pandoc/LaTeX start-up once."""
+        fmt = fmt or self.fmt
+        key = sha256("".join(self.cache_key(h, fmt) for h in content_hashes).encode("utf-8")).hexdigest()
+
+        def text():
+            texts = self._store.get_many(content_hashes)
+            return self.bundle_separators[fmt].join(texts[h] for h in content_hashes)
+
+        return self._submit(key, text, name, fmt, on_done)
+
+    def _submit(self, key: str, text: Callable[[], str], name: str, fmt: str, on_done) -> Future:
+        to, extension, extra_args = self.formats[fmt]
+        cached = self._cache_path / f"{key}{extension}"
+        target = self._path / f"{name}{extension}"
+
+        if cached.exists():
+            future = Future()
+            future.set_result(self._publish(cached, target))
+        else:
+            self._cache_path.mkdir(parents=True, exist_ok=True)
+            rendering = self._pool().submit(_render, text(), to, extra_args, str(cached))
+            future = Future()
+
+            def publish(done: Future):
+                try:
+                    done.result()
+                    future.set_result(self._publish(cached, target))
+                except Exception as e:
+                    self.logger.error(f"Rendering {target.name} failed: {e}")
+                    future.set_exception(e)
+
+            rendering.add_done_callback(publish)
+
+        if on_done is not None:
+            future.add_done_callback(on_done)
+        with self._lock:
+            # finished renders are only dropped once they succeeded, so wait() still reports the failed ones
+            self._pending = [f for f in self._pending if not f.done() or f.exception() is not None] + [future]
+        return future
+
+    @staticmethod
+    def _publish(cached: Path, target: Path) -> Path:
+        if target.exists():
+            target.unlink()
+        try:
+            os.link(cached, target)
+        except OSError:
+            shutil.copyfile(cached, target)
+        return target
+
+    def _pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            return self._executor
+
+    def wait(self) -> List[Future]:
+        """Block until every submitted render finished; returns the futures of the renders still running at the
+        call and of every render that failed since the last wait."""
+        with self._lock:
+            pending, self._pending = self._pending, []
+        for future in pending:
+            try:
+                future.result()
+            except Exception:
+                pass
+        return pending
+
+    def shutdown(self):
+        self.wait()
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
@@ -0,0 +1,220 @@
+import os
+import re
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from hashlib import sha256
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, List, Dict, Tuple
+
+from src.service.ratelimit import LLMCallError
+
+_heading = re.compile(r"^(#{1,6})\s+(.+?)\s*#*\s*$")
+_fence = re.compile(r"^\s*(```|~~~)")
+_marker = re.compile(r"^\s*<!--\s*(CHANGED|ADDED|DEPRECATED):.*-->\s*$")
+
+SectionKey = Tuple[int, str, int]
+
+
+def normalize_heading(title: str) -> str:
+    title = re.sub(r"\[([^\]]*)\]\([^)]*\)", r"\1", title)  # links → text
+    title = re.sub(r"\{#[^}]*\}", "", title)  # anchors/IDs
+    title = re.sub(r"[*_`~]", "", title)
+    title = re.sub(r"[^\w\s&]", " ", title.casefold())
+    return " ".join(title.split())
+
+
+@dataclass(frozen=True)
+class Section:
+    level: int  # 0 for the text before the first heading
+    title: str
+    key: SectionKey  # (level, normalized title, occurrence of that pair)
+    heading: str
+    body: str
+    digest: str
+
+    @property
+    def text(self) -> str:
+        return f"{self.heading}\n{self.body}" if self.heading else self.body
+
+
+def parse_sections(markdown: Optional[str]) -> List[Section]:
+    """Split Markdown into flat sections, one per heading; merge markers are dropped."""
+    raw: List[Tuple[int, str, str, List[str]]] = [(0, "", "", [])]
+    in_fence = False
+    for line in (markdown or "").replace("\r\n", "\n").replace("\r", "\n").split("\n"):
+        if _fence.match(line):
+            in_fence = not in_fence
+        elif not in_fence:
+            if _marker.match(line):
+                continue
+            match = _heading.match(line)
+            if match:
+                raw.append((len(match.group(1)), match.group(2), line, []))
+                continue
+        raw[-1][3].append(line)
+
+    sections, seen = [], {}
+    for level, title, heading, lines in raw:
+        body = "\n".join(lines).strip("\n")
+        if level == 0 and not body.strip():
+            continue
+        normalized = normalize_heading(title)
+        occurrence = seen.get((level, normalized), 0)
+        seen[(level, normalized)] = occurrence + 1
+        digest = sha256(f"{level}\0{normalized}\0{' '.join(body.split())}".encode("utf-8")).hexdigest()
+        sections.append(Section(level, title, (level, normalized, occurrence), heading, body, digest))
+    return sections
+
+
+def render_sections(parts: List[str]) -> str:
+    return "\n\n".join(p.strip("\n") for p in parts if p and p.strip()) + "\n"
+
+
+@dataclass
+class SectionDiff:
+    unchanged: List[SectionKey] = field(default_factory=list)
+    changed: List[SectionKey] = field(default_factory=list)
+    added: List[SectionKey] = field(default_factory=list)
+    removed: List[SectionKey] = field(default_factory=list)
+
+
+def diff_sections(history: List[Section], text: List[Section]) -> SectionDiff:
+    old = {s.key: s for s in history}
+    new = {s.key: s for s in text}
+    diff = SectionDiff()
+    for key, section in old.items():
+        if key not in new:
+            diff.removed.append(key)
+        elif new[key].digest == section.digest:
+            diff.unchanged.append(key)
+        else:
+            diff.changed.append(key)
+    diff.added = [key for key in new if key not in old]
+    return diff
+
+
+class SectionMerger:
+    """Merge two Markdown versions section by section; only changed sections are sent to the merge agent."""
+
+    deprecation_note = "> **Deprecated:** This section is no longer applicable."
+
+    def __init__(self, agent=None, max_workers: int = None):
+        self.agent = agent
+        self.max_workers = max_workers or int(os.getenv("MERGE_MAX_WORKERS", "4"))
+        self.logger = logging.getLogger("SectionMerger")
+
+    def merge(self, history: str, text: str) -> str:
+        old_sections, new_sections, diff = self._diff(history, text)
+        merged = self._merge_changed(self._changed_pairs(old_sections, new_sections, diff))
+        return self._assemble(old_sections, new_sections, diff, merged)
+
+    async def amerge(self, history: str, text: str) -> str:
+        """merge with the changed sections sent to the agent as concurrent async calls."""
+        old_sections, new_sections, diff = self._diff(history, text)
+        merged = await self._amerge_changed(self._changed_pairs(old_sections, new_sections, diff))
+        return self._assemble(old_sections, new_sections, diff, merged)
+
+    def _diff(self, history: str, text: str):
+        old_sections = parse_sections(history)
+        new_sections = parse_sections(text)
+        diff = diff_sections(old_sections, new_sections)
+        self.logger.info(
+            f"Sections: {len(diff.unchanged)} unchanged, {len(diff.changed)} changed, "
+            f"{len(diff.added)} added, {len(diff.removed)} removed"
+        )
+        return old_sections, new_sections, diff
+
+    @staticmethod
+    def _changed_pairs(old_sections: List[Section], new_sections: List[Section], diff) -> List[Tuple[Section, Section]]:
+        new = {s.key: s for s in new_sections}
+        old = {s.key: s for s in old_sections}
+        return [(old[k], new[k]) for k in diff.changed]
+
+    def _assemble(self, old_sections: List[Section], new_sections: List[Section], diff,
+                  merged: Dict[SectionKey, str]) -> str:
+        unchanged, changed, added = set(diff.unchanged), set(diff.changed), set(diff.added)
+
+        # history order first, then every added section right after its predecessor in the new text
+        output: Dict[SectionKey, str] = {}
+        for section in old_sections:
+            key = section.key
+            if key in unchanged:
+                output[key] = section.text
+            elif key in changed:
+                output[key] = f"<!-- CHANGED: {section.title} -->\n{merged[key]}"
+            else:
+                output[key] = self._deprecate(section)
+
+        order = [s.key for s in old_sections]
+        previous = None
+        for section in new_sections:
+            if section.key in added:
+                index = order.index(previous) + 1 if previous is not None else self._first_heading_index(order)
+                order.insert(index, section.key)
+                marker = f"<!-- ADDED: {section.title} -->\n" if section.level else ""
+                output[section.key] = marker + section.text
+            previous = section.key
+
+        return render_sections([output[key] for key in order])
+
+    def _merge_changed(self, pairs: List[Tuple[Section, Section]]) -> Dict[SectionKey, str]:
+        if not pairs:
+            return {}
+        if self.agent is None:
+            return {new.key: new.text for _, new in pairs}
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(pairs)), thread_name_prefix="merge") as pool:
+            results = list(pool.map(lambda pair: self._merge_section(*pair), pairs))
+        return self._collect(pairs, results)
+
+    async def _amerge_changed(self, pairs: List[Tuple[Section, Section]]) -> Dict[SectionKey, str]:
+        if not pairs or self.agent is None:
+            return {new.key: new.text for _, new in pairs}
+        slots = asyncio.Semaphore(self.max_workers)
+
+        async def merge(old: Section, new: Section):
+            async with slots:
+                try:
+                    response = await self.agent.ainvoke(text=new.text, history=old.text, context=None)
+                except LLMCallError as e:
+                    return e
+            return self._merged_text(new, response)
+
+        results = await asyncio.gather(*(merge(*pair) for pair in pairs))
+        return self._collect(pairs, results)
+
+    def _merge_section(self, old: Section, new: Section):
+        try:
+            response = self.agent.invoke(text=new.text, history=old.text, context=None)
+        except LLMCallError as e:
+            return e
+        return self._merged_text(new, response)
+
+    def _collect(self, pairs: List[Tuple[Section, Section]], results: list) -> Dict[SectionKey, str]:
+        """Merged text per section; raises LLMCallError naming every section whose merge failed, once all ran."""
+        failed = [(new, e) for (_, new), e in zip(pairs, results) if isinstance(e, LLMCallError)]
+        if failed:
+            titles = ", ".join(f"'{new.title}'" for new, _ in failed)
+            error = failed[0][1]
+            raise LLMCallError(error.agent, f"merge of {len(failed)}/{len(pairs)} section(s) failed ({titles}): {error}",
+                               attempts=error.attempts, cause=error)
+        return {new.key: result for (_, new), result in zip(pairs, results)}
+
+    @staticmethod
+    def _merged_text(new: Section, response: str) -> str:
+        if not response:
+            return new.text
+        return "\n".join(line for line in response.strip("\n").split("\n") if not _marker.match(line))
+
+    def _deprecate(self, section: Section) -> str:
+        if self.deprecation_note in section.body:  # deprecated by an earlier merge; parse_sections dropped its marker
+            text = section.text
+        elif not section.heading:
+            return f"{self.deprecation_note}\n\n{section.body}"
+        else:
+            text = f"{section.heading}\n{self.deprecation_note}\n\n{section.body}"
+        return f"<!-- DEPRECATED: {section.title} -->\n{text}" if section.heading else text
+
+    @staticmethod
+    def _first_heading_index(order: List[SectionKey]) -> int:
+        return 1 if order and order[0][0] == 0 else 0
@@ -0,0 +1,108 @@
+import os
+import re
+import json
+import time
+import threading
+import unicodedata
+from collections import defaultdict
+from types import MappingProxyType
+from typing import Dict, List, Mapping, Optional, Tuple
+from sqlmodel import Session
+
+from src.model.Feature import Feature
+from src.repository.FeatureRepository import FeatureRepository
+
+
+def normalize_name(name: str) -> str:
+    """Casing, width, punctuation and whitespace insensitive form of a subject or feature name."""
+    name = unicodedata.normalize("NFKC", name or "").casefold().replace("&", " and ")
+    name = re.sub(r"[^\w\s]", " ", name)
+    return " ".join(name.split())
+
+
+class Taxonomy:
+    """Immutable snapshot of the Subject → Feature catalog.
+
+    Holds the prompt context of the whole catalog and detached Feature objects (subject and article types loaded),
+    so detection resolves the LLM answer with a dictionary lookup instead of a query per document.
+    """
+
+    _cache: Dict[str, "Taxonomy"] = {}
+    _cache_lock = threading.Lock()
+
+    def __init__(self, features: List[Feature], version: tuple = None):
+        self.version = version
+        self.checked_at = time.monotonic()
+        features = sorted(features, key=lambda f: (f.subject.name, f.name))
+        self.features: Mapping[int, Feature] = MappingProxyType({f.feature_id: f for f in features})
+        # (feature_id, feature name, subject name, subject description), as FeatureRepository.get_catalog
+        self.catalog: Tuple[Tuple[int, str, str, Optional[str]], ...] = tuple(
+            (f.feature_id, f.name, f.subject.name, f.subject.description) for f in features)
+
+        by_name, by_feature = {}, defaultdict(list)
+        for feature in features:
+            by_name.setdefault((normalize_name(feature.subject.name), normalize_name(feature.name)), feature)
+            by_feature[normalize_name(feature.name)].append(feature)
+        self._by_name = MappingProxyType(by_name)
+        self._by_feature = MappingProxyType({name: tuple(found) for name, found in by_feature.items()})
+
+        grouped: Dict[str, List[str]] = defaultdict(list)
+        for feature in features:
+            grouped[feature.subject.name].append(feature.name)
+        lines = []
+        for subject_name, names in grouped.items():
+            lines.append(f"subject: {subject_name}")
+            for f_name in names:
+                lines.append(f"   feature: {f_name}")
+        self.context = "\n".join(lines)
+
+    @classmethod
+    def for_session(cls, session: Session, check_interval: float = None) -> "Taxonomy":
+        """Shared snapshot of the session's database; the catalog version is checked at most every check_interval seconds."""
+        if check_interval is None:
+            check_interval = float(os.getenv("TAXONOMY_CHECK_INTERVAL", "5"))
+        key = str(session.get_bind().url)
+        with cls._cache_lock:
+            taxonomy = cls._cache.get(key)
+            if taxonomy is not None and time.monotonic() - taxonomy.checked_at < check_interval:
+                return taxonomy
+            version = FeatureRepository(session).catalog_version()
+            if taxonomy is None or taxonomy.version != version:
+                # a short-lived session: closing it detaches the loaded features from the caller's session
+                with Session(session.get_bind()) as loader:
+                    taxonomy = cls(FeatureRepository(loader).get_features(), version=version)
+                cls._cache[key] = taxonomy
+            else:
+                taxonomy.checked_at = time.monotonic()
+            return taxonomy
+
+    @classmethod
+    def invalidate(cls):
+        with cls._cache_lock:
+            cls._cache.clear()
+
+    def resolve(self, subject_name: Optional[str], feature_name: str) -> Optional[Feature]:
+        """Feature by (subject, feature) name; a feature name unique in the catalog also resolves with a wrong subject."""
+        feature_key = normalize_name(feature_name)
+        feature = self._by_name.get((normalize_name(subject_name), feature_key))
+        if feature is None:
+            candidates = self._by_feature.get(feature_key, ())
+            if len(candidates) == 1:
+                feature = candidates[0]
+        return feature
+
+    def resolve_json(self, payload: str) -> Optional[Feature]:
+        """Same contract as FeatureRepository.find_by_json, tolerating code fences or prose around the JSON object."""
+        try:
+            data = json.loads(payload)
+        except (json.JSONDecodeError, TypeError):
+            match = re.search(r"\{.*\}", payload or "", re.DOTALL)
+            try:
+                data = json.loads(match.group(0)) if match else None
+            except json.JSONDecodeError:
+                data = None
+            if data is None:
+                raise ValueError(f"Invalid JSON payload: {payload}")
+        if not isinstance(data, dict) or data.get("subject") is None or data.get("feature") is None:
+            raise ValueError(f"Invalid JSON payload: {payload}")
+        return self.resolve(data["subject"], data["feature"])
@@ -0,0 +1,48 @@
+import os
+import logging
+import threading
+from typing import Optional, List
+
+import tiktoken
+
+# rough average for English prose, used when no tiktoken encoding can be loaded (e.g. offline)
+_CHARS_PER_TOKEN = 4
+_encodings = {}
+_lock = threading.Lock()
+logger = logging.getLogger("tokens")
+
+
+def get_encoding(model_name: str = None) -> Optional["tiktoken.Encoding"]:
+    model_name = model_name or os.getenv("PROMPTS_MODEL_NAME", "gpt-5-nano")
+    with _lock:
+        if model_name in _encodings:
+            return _encodings[model_name]
+        try:
+            try:
+                encoding = tiktoken.encoding_for_model(model_name)
+            except KeyError:
+                encoding = tiktoken.get_encoding("o200k_base")
+        except Exception as e:
+            logger.warning(f"tiktoken encoding for {model_name} unavailable, estimating token counts: {e}")
+            encoding = None
+        _encodings[model_name] = encoding
+        return encoding
+
+
+def count_tokens(text: Optional[str], model_name: str = None) -> int:
+    if not text:
+        return 0
+    encoding = get_encoding(model_name)
+    if encoding is None:
+        return -(-len(text) // _CHARS_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def split_tokens(text: str, max_tokens: int, model_name: str = None) -> List[str]:
+    """Split text into pieces of at most max_tokens tokens, ignoring any structure."""
+    encoding = get_encoding(model_name)
+    if encoding is None:
+        size = max_tokens * _CHARS_PER_TOKEN
+        return [text[i:i + size] for i in range(0, len(text), size)]
+    tokens = encoding.encode(text, disallowed_special=())
+    return [encoding.decode(tokens[i:i + max_tokens]) for i in range(0, len(tokens), max_tokens)]
@@ -0,0 +1,21 @@
+import pytest
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    """Fresh SQLite database and blob store under tmp_path, with the catalog loaded and the fake chat model."""
+    from src.benchmarks import fake_llm
+    from src.repository.DBConnection import DBConnection
+    from src.repository.DBInit import DBInit
+
+    (tmp_path / "hash").mkdir()
+    monkeypatch.setenv("DB_PATH", str(tmp_path))
+    monkeypatch.setenv("HASH_PATH", str(tmp_path / "hash"))
+    monkeypatch.setenv("OPEN_API_KEY", "offline")
+    monkeypatch.delenv("DB_CONCURRENT", raising=False)
+    monkeypatch.delenv("PROMPT_BUDGET", raising=False)
+    monkeypatch.delenv("LLM_CACHE", raising=False)
+    fake_llm.install(fake_llm.FakeChatModel(latency=0, tokens_per_second=0, output_tokens=60))
+    connection = DBConnection()
+    DBInit(connection).initialize()
+    return connection
@@ -0,0 +1,61 @@
+import pytest
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, select
+
+from src.model.Article import Article
+from src.model.ArticleVersion import ArticleVersion
+from src.repository.ArticleRepository import ArticleRepository
+from src.repository.DBInit import DBInit
+from src.service.articles import ArticleService
+from src.service.markdown import MarkdownHandler
+from src.service.taxonomy import Taxonomy
+
+
+def generate_twice(connection):
+    with Session(connection.engine) as session:
+        feature = next(f for f in Taxonomy.for_session(session).features.values() if f.article_types)
+    service = ArticleService(connection.engine)
+    service.generate(feature, "# Search\n\nFind documents by name.\n")
+    service.generate(feature, "# Search\n\nFind documents by name or by tag.\n")
+    return feature, feature.article_types[0].type_id
+
+
+def test_every_commit_adds_a_version(database):
+    feature, type_id = generate_twice(database)
+    with Session(database.engine) as session:
+        repository = ArticleRepository(session)
+        latest = repository.get_latest(feature.feature_id, type_id)
+        versions = repository.list_versions(feature.feature_id, type_id)
+        assert latest.version == 2
+        assert [v.version for v in versions] == [2, 1]
+        assert versions[0].hash_file_article == latest.hash_file_article
+        assert [v.version for v in repository.list_versions(feature.feature_id, type_id, limit=1)] == [2]
+        assert repository.get_latest_many([feature.feature_id])[(feature.feature_id, type_id)].version == 2
+
+        diff = repository.diff_versions(feature.feature_id, type_id, 1, 2, MarkdownHandler(), field="hash_file_document")
+        assert "--- v1" in diff and "+++ v2" in diff and "+Find documents by name or by tag." in diff
+        with pytest.raises(ValueError):
+            repository.diff_versions(feature.feature_id, type_id, 1, 3, MarkdownHandler())
+
+
+def test_a_version_is_recorded_once(database):
+    feature, type_id = generate_twice(database)
+    with Session(database.engine) as session:
+        version = ArticleRepository(session).get_version(feature.feature_id, type_id, 1)
+        session.add(ArticleVersion(article_id=version.article_id, feature_id=feature.feature_id, type_id=type_id,
+                                   version=1))
+        with pytest.raises(IntegrityError):
+            session.commit()
+
+
+def test_migrate_backfills_the_history_of_older_databases(database):
+    feature, type_id = generate_twice(database)
+    with database.engine.begin() as connection:
+        connection.exec_driver_sql("DROP TABLE article_version")
+    DBInit(database).initialize()
+    with Session(database.engine) as session:
+        versions = session.exec(select(ArticleVersion)).all()
+        articles = session.exec(select(Article)).all()
+    # only the latest version of each article survived the older schema
+    assert sorted((v.feature_id, v.type_id, v.version) for v in versions) == \
+        sorted((a.feature_id, a.type_id, a.version) for a in articles)
@@ -0,0 +1,89 @@
+import gzip
+from hashlib import sha256
+
+import pytest
+
+from src.service import blobstore
+from src.service.blobstore import BlobStore
+
+TEXT = "# Title\r\n\r\nLine one.\rLine two.\n"
+NORMALIZED = "# Title\n\nLine one.\nLine two.\n"
+DIGEST = sha256(NORMALIZED.encode("utf-8")).hexdigest()
+
+
+def test_blobs_are_sharded_by_their_normalized_hash(tmp_path):
+    store = BlobStore(tmp_path, compression="none")
+    digest = store.put(TEXT)
+    assert digest == DIGEST
+    assert (tmp_path / digest[:2] / digest[2:4] / f"{digest}.md").read_text() == NORMALIZED
+    assert BlobStore(tmp_path, compression="none").get(digest) == NORMALIZED
+
+
+@pytest.mark.parametrize("compression", ["gzip", "zstd"])
+def test_compressed_round_trip(tmp_path, compression):
+    if compression == "zstd" and blobstore.zstandard is None:
+        pytest.skip("zstandard is not installed")
+    store = BlobStore(tmp_path, compression=compression)
+    digest = store.put(TEXT)
+    path = store.path_for(digest)
+    assert path.name.endswith(".gz" if compression == "gzip" else ".zst")
+    assert path.read_bytes() != NORMALIZED.encode("utf-8")
+    assert BlobStore(tmp_path, compression=compression, cache_entries=0).get(digest) == NORMALIZED
+
+
+def test_blobs_written_with_another_compression_or_the_flat_layout_are_read(tmp_path):
+    gzipped = BlobStore(tmp_path, compression="gzip").put("gzipped\n")
+    (tmp_path / f"{DIGEST}.md").write_text(NORMALIZED)
+    store = BlobStore(tmp_path, compression="none", cache_entries=0)
+    assert store.get(gzipped) == "gzipped\n"
+    assert store.get(DIGEST) == NORMALIZED
+    assert store.put(NORMALIZED) == DIGEST
+    assert not store.path_for(DIGEST).exists()  # an existing blob is not written again
+
+
+def test_put_many_and_get_many(tmp_path):
+    store = BlobStore(tmp_path, compression="gzip", cache_entries=0)
+    digests = store.put_many(["a\n", "b\n", "a\n"])
+    assert digests[0] == digests[2] != digests[1]
+    assert store.get_many(digests) == {digests[0]: "a\n", digests[1]: "b\n"}
+
+
+def test_missing_blob_raises(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        BlobStore(tmp_path).get("0" * 64)
+
+
+def test_delete_removes_the_file_and_the_cached_text(tmp_path):
+    store = BlobStore(tmp_path, compression="none")
+    digest = store.put(TEXT)
+    assert store.delete(digest)
+    assert not store.exists(digest)
+    assert not store.delete(digest)
+
+
+def test_lru_is_bounded(tmp_path):
+    store = BlobStore(tmp_path, compression="none", cache_entries=2)
+    digests = [store.put(f"text {i}\n") for i in range(3)]
+    assert list(store._cache) == digests[1:]
+
+
+@pytest.mark.parametrize("compression", ["none", "gzip"])
+def test_stream_matches_put(tmp_path, compression):
+    store = BlobStore(tmp_path, compression=compression, cache_entries=0)
+    with store.open_stream() as stream:
+        for piece in ("# Title\r", "\n\r\nLine one.\r", "Line two.\n"):  # "\r\n" split across two pieces
+            stream.write(piece)
+        digest = stream.commit()
+    assert digest == DIGEST
+    assert store.get(digest) == NORMALIZED
+    if compression == "gzip":
+        assert gzip.decompress(store.path_for(digest).read_bytes()).decode("utf-8") == NORMALIZED
+
+
+def test_aborted_stream_leaves_nothing(tmp_path):
+    store = BlobStore(tmp_path, compression="none")
+    with pytest.raises(RuntimeError):
+        with store.open_stream() as stream:
+            stream.write("partial")
+            raise RuntimeError("the LLM call failed")
+    assert list(tmp_path.rglob("*")) == []
@@ -0,0 +1,56 @@
+import logging
+
+from src.service.budget import PromptBudget
+from src.service.chunker import TextChunker
+
+
+def document(sections: int, words: int, marker: str = "") -> str:
+    parts = []
+    for i in range(sections):
+        parts.append(f"## Section {i}\n\n{marker}" + " ".join(f"word{i}_{j}" for j in range(words)))
+    return "# Title\n\n" + "\n\n".join(parts) + "\n"
+
+
+def test_untrimmed_input_is_passed_on_byte_for_byte():
+    text = "# Title\r\n\r\n<!-- CHANGED: Intro -->\r\n## Intro\r\n\r\n\r\nshort text   \r\n"
+    history = document(20, 200)
+    budget = PromptBudget(1500)
+    fitted, report = budget.fit({}, {"text": text, "history": history})
+    assert report.trimmed
+    assert {t.input for t in report.trims} == {"history"}
+    assert fitted["text"] is text
+    assert budget.count(fitted["history"]) < budget.count(history)
+
+
+def test_truncating_the_text_is_a_warning(caplog):
+    text = document(1, 3000)
+    with caplog.at_level(logging.INFO, logger="PromptBudget"):
+        fitted, report = PromptBudget(1000).fit({}, {"text": text})
+    assert any(t.action == "truncated" for t in report.trims)
+    assert [r.levelno for r in caplog.records] == [logging.WARNING]
+
+
+def test_outlining_history_is_only_info(caplog):
+    with caplog.at_level(logging.INFO, logger="PromptBudget"):
+        PromptBudget(1500).fit({}, {"text": "# Title\n\nnew\n", "history": document(20, 200)})
+    assert caplog.records and all(r.levelno == logging.INFO for r in caplog.records)
+
+
+def test_cleaner_chunks_fit_the_prompt_budget(monkeypatch):
+    from src.Agents.agents import DocumentCleanerAgent
+    from src.benchmarks import fake_llm
+
+    monkeypatch.setenv("OPEN_API_KEY", "offline")
+    monkeypatch.setenv("PROMPT_BUDGET", "3000")
+    monkeypatch.setenv("CLEANER_CHUNK_TOKENS", "4000")
+    monkeypatch.delenv("PROMPT_BUDGETS", raising=False)
+    fake_llm.install(fake_llm.FakeChatModel(latency=0, tokens_per_second=0))
+    agent = DocumentCleanerAgent()
+    chunker = agent._chunker()
+    assert chunker.max_tokens < 3000
+
+    raw = "\n".join(f"raw pdf line {i} without any heading at all" for i in range(3000))
+    for chunk in chunker.chunk(raw):
+        fitted, report = agent.budget.fit(agent._prompt, {"text": chunk})
+        assert not report.trimmed
+    assert TextChunker(4000).count(raw) > 4000
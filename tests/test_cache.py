@@ -0,0 +1,80 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from src.Agents.agents import ResponseCache
+
+PROMPT = {"system": "Summarize.", "text": "{text}"}
+
+
+def key(agent="Agent", model="model", prompt=PROMPT, **inputs):
+    return ResponseCache.make_key(agent, model, prompt, inputs or {"text": "hello", "history": None})
+
+
+def test_miss_then_hit(tmp_path, monkeypatch):
+    monkeypatch.setenv("DB_PATH", str(tmp_path))
+    cache = ResponseCache()
+    assert cache.get(key()) is None
+    cache.put(key(), "Agent", "model", "answer")
+    assert cache.get(key()) == "answer"
+    assert cache.stats() == {"hits": 1, "misses": 1, "hit_rate": 0.5, "entries": 1}
+
+
+def test_key_changes_with_prompt_model_agent_and_inputs():
+    base = key()
+    assert key() == base
+    assert key(prompt={"system": "Summarize briefly.", "text": "{text}"}) != base
+    assert key(model="other-model") != base
+    assert key(agent="OtherAgent") != base
+    assert key(text="hello!", history=None) != base
+    assert key(text="hello", history="") != base  # no history is not an empty history
+
+
+def test_expired_entries_are_misses(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.db"), max_age=0.05)
+    cache.put(key(), "Agent", "model", "answer")
+    time.sleep(0.1)
+    assert cache.get(key()) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_eviction_keeps_the_most_recently_used(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.db"), max_entries=2)
+    for i in range(3):
+        cache.put(key(text=str(i)), "Agent", "model", str(i))
+        time.sleep(0.01)
+    cache.get(key(text="0"))
+    cache.evict()
+    assert cache.get(key(text="0")) == "0"
+    assert cache.get(key(text="1")) is None
+    assert cache.get(key(text="2")) == "2"
+
+
+def test_concurrent_writers_share_one_file(tmp_path):
+    path = str(tmp_path / "cache.db")
+    caches = [ResponseCache(path), ResponseCache(path)]  # e.g. two processes of a batch run
+
+    def write(i: int):
+        caches[i % 2].put(key(text=str(i)), "Agent", "model", str(i))
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(write, range(200)))
+    reader = ResponseCache(path)
+    assert all(reader.get(key(text=str(i))) == str(i) for i in range(200))
+
+
+def test_agent_serves_a_repeated_prompt_from_the_cache(tmp_path, monkeypatch):
+    from src.Agents.agents import BaseAgent, DocumentCleanerAgent
+    from src.benchmarks import fake_llm
+    from src.service.metrics import metrics
+
+    monkeypatch.setenv("OPEN_API_KEY", "offline")
+    monkeypatch.delenv("PROMPT_BUDGET", raising=False)
+    fake_llm.install(fake_llm.FakeChatModel(latency=0, tokens_per_second=0))
+    monkeypatch.setattr(BaseAgent, "cache", ResponseCache(str(tmp_path / "cache.db")))
+    agent = DocumentCleanerAgent()
+    metrics.reset()
+    first = agent.invoke(text="# Title\n\nSome text.", context=None, history=None)
+    second = agent.invoke(text="# Title\n\nSome text.", context=None, history=None)
+    assert first == second
+    outcomes = {s["labels"]["outcome"]: s["value"] for s in metrics.to_dict()["kb_llm_calls_total"]["series"]}
+    assert outcomes == {"ok": 1, "cached": 1}
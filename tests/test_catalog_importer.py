@@ -0,0 +1,85 @@
+from sqlmodel import Session, select
+
+from src.model.Article import Article
+from src.model.ArticleType import ArticleType
+from src.model.Feature import Feature
+from src.model.Subject import Subject
+from src.repository.CatalogImporter import Catalog, CatalogImporter
+
+
+def small_catalog(feature_name: str = "Search") -> Catalog:
+    return Catalog.from_dict({"subjects": [
+        {"subject_id": 1, "name": "Core", "description": "Core functions",
+         "features": [{"feature_id": 1, "name": feature_name, "types": [1, 3]},
+                      {"feature_id": 2, "name": "Export", "types": [1]}]},
+    ]})
+
+
+def rows(connection):
+    with Session(connection.engine) as session:
+        return (sorted((s.subject_id, s.name) for s in session.exec(select(Subject)).all()),
+                sorted((f.feature_id, f.subject_id, f.name) for f in session.exec(select(Feature)).all()),
+                sorted((t.type_id, t.feature_id) for t in session.exec(select(ArticleType)).all()))
+
+
+def test_sync_writes_only_what_changed(database):
+    importer = CatalogImporter(database.engine)
+    importer.sync(small_catalog(), prune=True)
+    assert importer.sync(small_catalog()).empty
+
+    diff = importer.sync(small_catalog("Searching"))
+    assert diff.summary()["feature"] == {"inserts": 0, "updates": 1, "deletes": 0}
+    assert diff.summary()["subject"] == {"inserts": 0, "updates": 0, "deletes": 0}
+    assert (1, 1, "Searching") in rows(database)[1]
+
+
+def test_dry_run_changes_nothing(database):
+    before = rows(database)
+    diff = CatalogImporter(database.engine).sync(small_catalog(), prune=True, dry_run=True)
+    assert not diff.empty
+    assert rows(database) == before
+
+
+def test_prune_deletes_what_the_catalog_no_longer_has(database):
+    importer = CatalogImporter(database.engine)
+    importer.sync(small_catalog(), prune=True)
+    assert rows(database) == ([(1, "Core")], [(1, 1, "Search"), (2, 1, "Export")], [(1, 1), (1, 2), (3, 1)])
+
+    catalog = Catalog.from_dict({"subjects": [
+        {"subject_id": 2, "name": "Admin", "features": [{"feature_id": 3, "name": "Users", "types": [2]}]}]})
+    diff = importer.sync(catalog, prune=True)
+    assert diff.kept == []
+    assert rows(database) == ([(2, "Admin")], [(3, 2, "Users")], [(2, 3)])
+
+    # without prune nothing is deleted
+    importer.sync(small_catalog())
+    assert len(rows(database)[1]) == 3
+
+
+def test_csv_catalog(tmp_path):
+    path = tmp_path / "catalog.csv"
+    path.write_text("subject_id,subject,subject_description,feature_id,feature,types\n"
+                    "1,Core,Core functions,1,Search,1;3\n"
+                    "1,Core,,2,Export,1\n")
+    catalog = Catalog.load(path)
+    assert catalog.subjects == {1: ("Core", "Core functions")}
+    assert catalog.features == {1: (1, "Search"), 2: (1, "Export")}
+    assert catalog.types == {(1, 1), (3, 1), (1, 2)}
+
+
+def test_prune_keeps_features_and_types_with_articles(database):
+    importer = CatalogImporter(database.engine)
+    importer.sync(small_catalog(), prune=True)
+    with Session(database.engine) as session:
+        session.add(Article(feature_id=1, type_id=3, version=1))
+        session.add(Article(feature_id=2, type_id=1, version=1))
+        session.commit()
+
+    # feature 1 loses type 3, feature 2 leaves the catalog: both still have articles
+    catalog = Catalog.from_dict({"subjects": [
+        {"subject_id": 1, "name": "Core", "features": [{"feature_id": 1, "name": "Search", "types": [1]}]}]})
+    diff = importer.sync(catalog, prune=True)
+    assert diff.types.deletes == []
+    assert len(diff.kept) == 3
+    assert rows(database)[2] == [(1, 1), (1, 2), (3, 1)]
+    assert [f[0] for f in rows(database)[1]] == [1, 2]
@@ -0,0 +1,24 @@
+import sqlite3
+
+from sqlmodel import Session
+
+from src.model.Article import Article
+from src.model.StageCheckpoint import StageCheckpoint
+from src.repository.CheckpointRepository import CheckpointRepository
+
+
+def test_referenced_hashes_are_looked_up_in_chunks(database):
+    hashes = [f"{i:064x}" for i in range(2000)]
+    with Session(database.engine) as session:
+        session.add(Article(feature_id=1, type_id=1, version=1, hash_file_document=hashes[0], hash_file_article=hashes[499]))
+        session.add(StageCheckpoint(run_id="run", document="a.pdf", stage="parse", content_hash=hashes[1999]))
+        session.commit()
+        # the bound parameter limit of SQLite builds before 3.32
+        dbapi_connection = session.connection().connection.dbapi_connection
+        limit = dbapi_connection.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 999)
+        try:
+            repository = CheckpointRepository(session)
+            assert repository.get_referenced(hashes) == {hashes[0], hashes[499], hashes[1999]}
+            assert repository.get_referenced([]) == set()
+        finally:
+            dbapi_connection.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, limit)
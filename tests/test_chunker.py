@@ -0,0 +1,29 @@
+from src.service.chunker import TextChunker
+
+
+def long_paragraph(lines: int = 1500) -> str:
+    return "\n".join(f"this is line {i} of a long paragraph, with words." for i in range(lines))
+
+
+def test_paragraph_over_budget_followed_by_blank_line():
+    chunker = TextChunker(max_tokens=4000)
+    text = long_paragraph() + "\n\nSummary paragraph."
+    chunks = chunker.chunk(text)
+    assert len(chunks) > 1
+    assert "".join(chunks) == text
+    assert all(chunker.count(chunk) <= chunker.max_tokens for chunk in chunks)
+
+
+def test_paragraph_over_budget_followed_by_newline():
+    chunker = TextChunker(max_tokens=4000)
+    text = long_paragraph() + "\nSummary paragraph.\n"
+    chunks = chunker.chunk(text)
+    assert "".join(chunks) == text
+    assert all(chunker.count(chunk) <= chunker.max_tokens for chunk in chunks)
+
+
+def test_block_ending_with_its_separator():
+    chunker = TextChunker(max_tokens=200)
+    for separator in ("\n\n", "\n"):
+        block = "word " * 2000 + separator
+        assert "".join(chunker._fit(block)) == block
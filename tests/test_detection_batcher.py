@@ -0,0 +1,89 @@
+import time
+import threading
+
+from src.service.detection import DetectionBatcher
+
+
+class RecordingBatcher(DetectionBatcher):
+    """Resolves every document to its own text and records the batches instead of calling the LLM."""
+
+    def __init__(self, **kwargs):
+        self.batches = []
+        super().__init__(engine=None, **kwargs)
+
+    def _detect(self, batch):
+        self.batches.append([text for text, _ in batch])
+        for text, future in batch:
+            future.set_result(text)
+
+
+def timed(call):
+    started = time.perf_counter()
+    result = call()
+    return result, time.perf_counter() - started
+
+
+def test_nothing_expected_is_sent_at_once():
+    batcher = RecordingBatcher(batch_size=8, max_wait=5)
+    try:
+        result, seconds = timed(lambda: batcher.detect("a"))
+    finally:
+        batcher.close()
+    assert result == "a"
+    assert seconds < 1
+    assert batcher.batches == [["a"]]
+
+
+def test_batch_is_sent_once_every_expected_document_is_queued():
+    batcher = RecordingBatcher(batch_size=8, max_wait=5)
+    try:
+        batcher.expect()
+        batcher.expect()
+        first = batcher.submit("a", expected=True)
+        time.sleep(0.1)
+        assert not first.done()  # waits for the other document being cleaned
+        second, seconds = timed(lambda: batcher.detect("b", expected=True))
+    finally:
+        batcher.close()
+    assert (first.result(), second) == ("a", "b")
+    assert seconds < 1
+    assert batcher.batches == [["a", "b"]]
+
+
+def test_forgotten_document_is_not_waited_for():
+    batcher = RecordingBatcher(batch_size=8, max_wait=5)
+    try:
+        batcher.expect()
+        batcher.expect()
+        first = batcher.submit("a", expected=True)
+        threading.Timer(0.1, batcher.forget).start()  # the other document failed while cleaning
+        _, seconds = timed(first.result)
+    finally:
+        batcher.close()
+    assert seconds < 1
+    assert batcher.batches == [["a"]]
+
+
+def test_expected_document_is_waited_for_at_most_max_wait():
+    batcher = RecordingBatcher(batch_size=8, max_wait=0.2)
+    try:
+        batcher.expect()
+        batcher.expect()
+        _, seconds = timed(lambda: batcher.detect("a", expected=True))
+    finally:
+        batcher.close()
+    assert 0.15 < seconds < 1
+    assert batcher.batches == [["a"]]
+
+
+def test_full_batch_does_not_wait():
+    batcher = RecordingBatcher(batch_size=2, max_wait=5)
+    try:
+        for _ in range(3):
+            batcher.expect()
+        futures = [batcher.submit(text, expected=True) for text in ("a", "b")]
+        _, seconds = timed(lambda: [f.result() for f in futures])
+    finally:
+        batcher.close()
+    assert seconds < 1
+    assert batcher.batches[0] == ["a", "b"]
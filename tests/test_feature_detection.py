@@ -0,0 +1,63 @@
+import pytest
+from sqlmodel import Session
+
+from src.Agents.agents import AgentRegistry, FeatureDetectorAgent
+from src.repository.CatalogImporter import Catalog, CatalogImporter
+from src.service.detection import FeatureDetectionService
+from src.service.feature_index import FeatureIndex
+from src.service.taxonomy import Taxonomy
+
+CATALOG = {"subjects": [
+    {"subject_id": 1, "name": "Core", "features": [{"feature_id": 1, "name": "Search", "types": [1]},
+                                                   {"feature_id": 2, "name": "Export", "types": [1]},
+                                                   {"feature_id": 3, "name": "Import", "types": [1]}]},
+    {"subject_id": 2, "name": "Admin", "features": [{"feature_id": 4, "name": "Users", "types": [1]}]},
+]}
+
+
+@pytest.fixture
+def catalog(database, monkeypatch):
+    Taxonomy.invalidate()
+    CatalogImporter(database.engine).sync(Catalog.from_dict(CATALOG), prune=True)
+    contexts = []
+    agent = AgentRegistry.get(FeatureDetectorAgent)
+    invoke, detect_many = agent.invoke, agent.detect_many
+
+    def recording_invoke(**inputs):
+        contexts.append(inputs["context"])
+        return invoke(**inputs)
+
+    def recording_detect_many(texts, context):
+        contexts.append(context)
+        return detect_many(texts, context)
+
+    monkeypatch.setattr(agent, "invoke", recording_invoke)
+    monkeypatch.setattr(agent, "detect_many", recording_detect_many)
+    with Session(database.engine) as session:
+        yield session, contexts
+    Taxonomy.invalidate()
+
+
+def test_shortlist_has_no_zero_score_candidates():
+    index = FeatureIndex([(1, "Search", "Core", None), (2, "Export", "Core", None), (3, "Users", "Admin", None)])
+    assert sorted(c.feature_id for c in index.shortlist("export the search results", 3)) == [1, 2]
+    assert index.shortlist("nothing in common", 3) == []
+
+
+def test_detection_without_a_lexical_match_sees_the_whole_catalog(catalog):
+    session, contexts = catalog
+    service = FeatureDetectionService(session, top_k=2)
+    taxonomy = Taxonomy.for_session(session)
+
+    assert service.detect("How to export a report").feature_id == 2
+    assert contexts[-1] == "subject: Core\n   feature: Export"
+
+    service.detect("Unrelated words only")
+    assert contexts[-1] == taxonomy.context
+
+
+def test_batch_with_an_unmatched_document_sees_the_whole_catalog(catalog):
+    session, contexts = catalog
+    features = FeatureDetectionService(session, top_k=2).detect_many(["How to export a report", "Unrelated words"])
+    assert contexts == [Taxonomy.for_session(session).context]  # one batch call, no fallback
+    assert features[0].feature_id == 2 and features[1] is not None
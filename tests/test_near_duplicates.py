@@ -0,0 +1,93 @@
+import random
+
+import pytest
+from sqlmodel import Session
+
+from src.service.near_duplicates import MinHasher, NearDuplicateIndex, _MASK, match_source
+
+
+def words(count: int, seed: int):
+    rng = random.Random(seed)
+    return [f"w{rng.randrange(5000)}" for _ in range(count)]
+
+
+def jaccard(hasher: MinHasher, a: str, b: str) -> float:
+    x, y = hasher.shingles(a), hasher.shingles(b)
+    return len(x & y) / len(x | y)
+
+
+@pytest.fixture
+def index(database):
+    NearDuplicateIndex.invalidate()
+    with Session(database.engine) as session:
+        yield session, NearDuplicateIndex.for_session(session)
+    NearDuplicateIndex.invalidate()
+
+
+def test_similarity_estimates_the_jaccard_similarity():
+    hasher = MinHasher()
+    base = words(2000, seed=0)
+    text = " ".join(base)
+    assert MinHasher.similarity(hasher.signature(text), hasher.signature(text.upper())) == 1.0
+    assert MinHasher.similarity(hasher.signature(text), hasher.signature(" ".join(words(2000, seed=1)))) < 0.05
+    for changed in (20, 100, 300):
+        edited = list(base)
+        for i in range(0, 2000, 2000 // changed):
+            edited[i] = "edit"
+        edited = " ".join(edited)
+        estimate = MinHasher.similarity(hasher.signature(text), hasher.signature(edited))
+        assert abs(estimate - jaccard(hasher, text, edited)) < 0.12
+
+
+def test_short_texts_are_densified():
+    hasher = MinHasher()
+    short = hasher.signature("only a handful of words in this one")
+    assert _MASK not in short
+    assert short == hasher.signature("Only a handful of words, in this one!")
+    other = hasher.signature("a completely different short sentence here")
+    assert MinHasher.similarity(short, other) < 0.2
+
+
+def test_signature_bytes_round_trip():
+    signature = MinHasher().signature(" ".join(words(100, seed=2)))
+    assert MinHasher.from_bytes(MinHasher.to_bytes(signature)) == signature
+
+
+def test_index_finds_a_re_export_and_nothing_for_unrelated_text():
+    index = NearDuplicateIndex()
+    base = words(2000, seed=3)
+    index.add(1, 10, "a.pdf", index.hasher.signature(" ".join(base)))
+    index.add(2, 20, "b.pdf", index.hasher.signature(" ".join(words(2000, seed=4))))
+    reexport = ["exported", "on", "2025-09-01"] + base[3:]
+    found = index.query(index.hasher.signature(" ".join(reexport)))
+    assert (found.fingerprint_id, found.feature_id, found.latest) == (1, 10, True)
+    assert found.similarity > 0.95
+    assert index.query(index.hasher.signature(" ".join(words(2000, seed=5)))) is None
+
+
+def test_match_source_routes_and_skips_by_threshold(index):
+    session, near = index
+    base = words(2000, seed=6)
+    near.add(1, 10, "a.pdf", near.hasher.signature(" ".join(base)))
+    reexport = " ".join(["exported", "on", "2025-09-01"] + base[3:])
+    revised = list(base)
+    for i in range(0, 2000, 40):
+        revised[i] = "revised"
+    revised = " ".join(revised)
+
+    match = match_source(session, reexport, route_threshold=0.8, skip_threshold=0.98)
+    assert (match.feature_id, match.skip) == (10, True)
+
+    # similar enough to reuse the feature, not to skip the document
+    match = match_source(session, revised, route_threshold=0.5, skip_threshold=0.98)
+    assert match.duplicate.similarity < 0.98
+    assert (match.feature_id, match.skip) == (10, False)
+
+    # below the route threshold the feature is detected as usual
+    match = match_source(session, revised, route_threshold=0.99, skip_threshold=0.999)
+    assert (match.duplicate, match.feature_id, match.skip) == (None, None, False)
+
+    # a newer source of the feature was ingested since: re-exports of the older one are not skipped
+    near.add(2, 10, "a-v2.pdf", near.hasher.signature(" ".join(words(2000, seed=7))))
+    match = match_source(session, reexport, route_threshold=0.8, skip_threshold=0.98)
+    assert (match.feature_id, match.skip, match.duplicate.latest) == (10, False, False)
@@ -0,0 +1,70 @@
+import json
+import time
+
+from sqlalchemy import event
+from sqlmodel import Session, select
+
+from src.benchmarks import pdfs
+from src.model.Article import Article
+from src.model.ArticleVersion import ArticleVersion
+from src.service.markdown import MarkdownHandler
+from src.service.metrics import metrics
+from src.service.pipeline import IngestionPipeline
+
+
+def test_pipeline_end_to_end(database, tmp_path):
+    paths = pdfs.generate(tmp_path / "pdfs", "small", 2)
+    manifest = tmp_path / "run.jsonl"
+
+    results = IngestionPipeline(database, extract_workers=1, llm_concurrency=2).run(paths, manifest)
+
+    assert [r.status for r in results] == ["ok", "ok"]
+    lines = [json.loads(line) for line in manifest.read_text().splitlines()]
+    assert sorted(line["pdf_path"] for line in lines) == sorted(str(p) for p in paths)
+    for line in lines:
+        assert line["status"] == "ok" and line["feature"] and line["subject"] and line["error"] is None
+        assert line["articles"]
+
+    written = {(line["feature"], a["type"], a["version"]): a["hash_file_article"]
+               for line in lines for a in line["articles"]}
+    with Session(database.engine) as session:
+        latest = session.exec(select(Article)).all()
+        versions = session.exec(select(ArticleVersion)).all()
+    # one version row per article written by the run, and every article points at its newest text
+    assert len(versions) == len(written)
+    assert {a.hash_file_article for a in latest} <= set(written.values())
+    texts = MarkdownHandler().load_many(list(written.values()))
+    assert all(texts[digest].strip() for digest in written.values())
+
+    # the same sources again are recognised without any LLM call
+    metrics.reset()
+    again = IngestionPipeline(database, extract_workers=1, llm_concurrency=2).run(paths)
+    assert [r.status for r in again] == ["unchanged", "unchanged"]
+    assert not metrics.to_dict().get("kb_llm_calls_total", {}).get("series")
+
+
+def test_no_connection_is_held_during_llm_calls(database, tmp_path, monkeypatch):
+    from src import main
+    from src.benchmarks.fake_llm import FakeChatModel
+
+    held = set()
+    for engine in {database.engine, database.read_engine}:
+        event.listen(engine, "checkout", lambda dbapi_connection, record, proxy: held.add(id(record)))
+        event.listen(engine, "checkin", lambda dbapi_connection, record: held.discard(id(record)))
+    pinned = []
+    answer = FakeChatModel.answer
+
+    def slow_answer(self, messages):
+        # a connection checked out for the whole call was opened around it (short reads and commits of other
+        # threads come and go meanwhile)
+        before = set(held)
+        time.sleep(0.05)
+        pinned.append(len(before & held))
+        return answer(self, messages)
+
+    monkeypatch.setattr(FakeChatModel, "answer", slow_answer)
+    paths = pdfs.generate(tmp_path / "pdfs", "small", 3)
+    results = IngestionPipeline(database, extract_workers=1, llm_concurrency=2).run(paths[:2])  # batched detection
+    assert [r.status for r in results] == ["ok", "ok"]
+    main.process(str(paths[2]), database)
+    assert pinned and set(pinned) == {0}
@@ -0,0 +1,110 @@
+import pytest
+
+from src.benchmarks.stub_openai import StubOpenAI
+from src.service.ratelimit import AdaptiveConcurrency, LLMCallError, RateLimiter
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    """Start a stub API; the agent made by the returned function talks to it through the shared RateLimiter."""
+    from src.Agents.agents import AgentRegistry, BaseAgent
+    servers = []
+
+    def start(**kwargs):
+        server = StubOpenAI(latency=0.01, retry_after=0.01, **kwargs).start()
+        servers.append(server)
+        # a client per server: clients are cached per model and API key
+        monkeypatch.setenv("OPEN_API_KEY", f"stub-{server.server_address[1]}")
+        monkeypatch.setenv("OPENAI_BASE_URL", server.base_url)
+        monkeypatch.setenv("LLM_MAX_IN_FLIGHT", "8")
+        monkeypatch.setenv("LLM_MAX_RETRIES", "3")
+        monkeypatch.setenv("LLM_BACKOFF_MAX", "0.05")
+        RateLimiter.reset()
+        AgentRegistry.clear()
+        agent = BaseAgent(name="LimiterTest")
+        agent._prompt = {"system": "Answer ok.", "text": "{text}"}
+        return server, agent
+
+    yield start
+    for server in servers:
+        server.stop()
+    RateLimiter.reset()
+
+
+def test_throttled_call_is_retried_and_halves_the_limit(stub):
+    server, agent = stub(script=["throttled", "ok"])
+    assert agent.invoke(text="hi", context=None, history=None) == "ok"
+    assert server.counts == {"ok": 1, "throttled": 1, "unavailable": 0}
+    assert agent.limiter.concurrency.limit == 4
+    assert agent.limiter.concurrency.in_flight == 0
+
+
+def test_gives_up_with_llm_call_error_after_the_retries(stub):
+    server, agent = stub(script=["unavailable"] * 10)
+    with pytest.raises(LLMCallError) as error:
+        agent.invoke(text="hi", context=None, history=None)
+    assert error.value.attempts == 4
+    assert server.counts["unavailable"] == 4
+    assert agent.limiter.concurrency.in_flight == 0
+
+
+def test_stream_holds_its_slot_until_exhausted(stub):
+    server, agent = stub(script=["throttled"])
+    stream = agent.stream(text="hi", context=None, history=None)
+    assert next(stream) == "ok"
+    assert agent.limiter.concurrency.in_flight == 1
+    assert "".join(stream) == ""
+    assert agent.limiter.concurrency.in_flight == 0
+    assert server.counts["throttled"] == 1
+
+
+def test_stream_closed_early_releases_its_slot(stub):
+    _, agent = stub()
+    stream = agent.stream(text="hi", context=None, history=None)
+    next(stream)
+    stream.close()
+    assert agent.limiter.concurrency.in_flight == 0
+
+
+def test_interrupted_call_releases_its_slot():
+    limiter = RateLimiter(max_in_flight=2, max_retries=0)
+
+    def interrupted():
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        limiter.call("test", interrupted)
+    assert limiter.concurrency.in_flight == 0
+    assert limiter.concurrency.limit == 2
+
+
+def test_non_retryable_error_is_raised_at_once():
+    limiter = RateLimiter(max_in_flight=2, max_retries=5)
+    calls = []
+
+    def invalid():
+        calls.append(1)
+        raise ValueError("bad request")
+
+    with pytest.raises(LLMCallError):
+        limiter.call("test", invalid)
+    assert len(calls) == 1
+    assert limiter.concurrency.in_flight == 0
+
+
+def test_adaptive_concurrency_shrinks_and_grows():
+    concurrency = AdaptiveConcurrency(initial=8, minimum=1, maximum=8)
+    assert concurrency.acquire(deadline=float("inf"))
+    concurrency.release(throttled=True)
+    assert concurrency.limit == 4
+    for _ in range(4):
+        assert concurrency.acquire(deadline=float("inf"))
+        concurrency.release()
+    assert concurrency.limit == 5
+    assert concurrency.acquire(deadline=float("inf"))
+    concurrency.release(succeeded=False)  # a failure is neither a throttle nor a success
+    assert concurrency.limit == 5
+    for _ in range(10):
+        assert concurrency.acquire(deadline=float("inf"))
+        concurrency.release(throttled=True)
+    assert concurrency.limit == 1
@@ -0,0 +1,106 @@
+import asyncio
+
+import pytest
+
+from src.service.ratelimit import LLMCallError
+from src.service.sections import SectionMerger, diff_sections, parse_sections
+
+HISTORY = """# Guide
+
+Intro text.
+
+## Install
+
+Run the installer.
+
+## Configure
+
+Edit the file.
+
+## Legacy
+
+Old way.
+"""
+
+TEXT = """# Guide
+
+Intro text.
+
+## Install
+
+Run the new installer.
+
+## Configure
+
+Edit   the
+file.
+
+## Upgrade
+
+Upgrade steps.
+"""
+
+
+class EchoAgent:
+    """Merge agent answering with the new section text, prefixed to show it was called."""
+
+    def __init__(self, fail: str = None):
+        self.calls = []
+        self.fail = fail
+
+    def invoke(self, text, history, context):
+        self.calls.append(text)
+        if self.fail and self.fail in text:
+            raise LLMCallError("DocumentMergeAgent", "out of retries", attempts=3)
+        return text.replace("Run", "Merged: run")
+
+    async def ainvoke(self, text, history, context):
+        return self.invoke(text, history, context)
+
+
+def test_diff_ignores_whitespace_only_changes():
+    diff = diff_sections(parse_sections(HISTORY), parse_sections(TEXT))
+    titles = lambda keys: [key[1] for key in keys]
+    assert titles(diff.unchanged) == ["guide", "configure"]
+    assert titles(diff.changed) == ["install"]
+    assert titles(diff.added) == ["upgrade"]
+    assert titles(diff.removed) == ["legacy"]
+
+
+def test_merge_assembles_unchanged_changed_added_and_removed_sections():
+    agent = EchoAgent()
+    merged = SectionMerger(agent).merge(HISTORY, TEXT)
+    assert agent.calls == ["## Install\nRun the new installer."]  # only the changed section reaches the agent
+    assert merged == (
+        "# Guide\nIntro text.\n\n"
+        "<!-- CHANGED: Install -->\n## Install\nMerged: run the new installer.\n\n"
+        "## Configure\nEdit the file.\n\n"
+        "<!-- ADDED: Upgrade -->\n## Upgrade\nUpgrade steps.\n\n"
+        "<!-- DEPRECATED: Legacy -->\n## Legacy\n> **Deprecated:** This section is no longer applicable.\n\nOld way.\n"
+    )
+
+
+def test_async_merge_matches_merge():
+    assert asyncio.run(SectionMerger(EchoAgent()).amerge(HISTORY, TEXT)) == SectionMerger(EchoAgent()).merge(HISTORY, TEXT)
+
+
+def test_failed_section_merge_raises():
+    text = TEXT.replace("Edit   the\nfile.", "Edit the other file.")
+    for merge in (lambda m: m.merge(HISTORY, text), lambda m: asyncio.run(m.amerge(HISTORY, text))):
+        agent = EchoAgent(fail="Configure")
+        with pytest.raises(LLMCallError, match="1/2 section"):
+            merge(SectionMerger(agent))
+        assert len(agent.calls) == 2  # the other changed section was still merged
+
+
+def test_without_agent_the_new_text_is_taken():
+    merged = SectionMerger().merge(HISTORY, TEXT)
+    assert "<!-- CHANGED: Install -->\n## Install\nRun the new installer." in merged
+
+
+def test_deprecated_section_keeps_its_marker_on_the_next_merge():
+    merger = SectionMerger(EchoAgent())
+    first = merger.merge(HISTORY, TEXT)
+    second = merger.merge(first, TEXT)
+    assert second.count("<!-- DEPRECATED: Legacy -->\n## Legacy\n> **Deprecated:**") == 1
+    assert second.count("This section is no longer applicable") == 1
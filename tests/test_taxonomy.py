@@ -0,0 +1,63 @@
+import pytest
+from sqlmodel import Session
+
+from src.repository.CatalogImporter import Catalog, CatalogImporter
+from src.service.taxonomy import Taxonomy, normalize_name
+
+CATALOG = {"subjects": [
+    {"subject_id": 1, "name": "Core", "features": [{"feature_id": 1, "name": "Search & Filter", "types": [1]},
+                                                   {"feature_id": 2, "name": "Export", "types": [1]}]},
+    {"subject_id": 2, "name": "Admin", "features": [{"feature_id": 3, "name": "Export", "types": [2]}]},
+]}
+
+
+@pytest.fixture
+def catalog(database):
+    Taxonomy.invalidate()
+    CatalogImporter(database.engine).sync(Catalog.from_dict(CATALOG), prune=True)
+    yield database
+    Taxonomy.invalidate()
+
+
+def test_snapshot_is_shared_until_the_catalog_changes(catalog):
+    with Session(catalog.engine) as session:
+        first = Taxonomy.for_session(session, check_interval=0)
+        assert Taxonomy.for_session(session, check_interval=0) is first
+        assert sorted(first.features) == [1, 2, 3]
+        assert "subject: Core\n   feature: Export\n   feature: Search & Filter" in first.context
+
+    data = {"subjects": CATALOG["subjects"] + [
+        {"subject_id": 3, "name": "Billing", "features": [{"feature_id": 4, "name": "Invoices", "types": [1]}]}]}
+    CatalogImporter(catalog.engine).sync(Catalog.from_dict(data))
+    with Session(catalog.engine) as session:
+        # within the check interval the cached snapshot is served without looking at the database
+        assert Taxonomy.for_session(session, check_interval=60) is first
+        reloaded = Taxonomy.for_session(session, check_interval=0)
+    assert reloaded is not first
+    assert sorted(reloaded.features) == [1, 2, 3, 4]
+    assert sorted(first.features) == [1, 2, 3]  # snapshots are immutable
+
+
+def test_features_are_usable_after_the_session_closed(catalog):
+    with Session(catalog.engine) as session:
+        taxonomy = Taxonomy.for_session(session, check_interval=0)
+    feature = taxonomy.features[3]
+    assert feature.subject.name == "Admin"
+    assert [t.type_id for t in feature.article_types] == [2]
+
+
+def test_resolve(catalog):
+    with Session(catalog.engine) as session:
+        taxonomy = Taxonomy.for_session(session, check_interval=0)
+    assert taxonomy.resolve("core", "search and filter").feature_id == 1
+    assert taxonomy.resolve("Wrong subject", "Search & Filter").feature_id == 1  # unique feature name
+    assert taxonomy.resolve("Wrong subject", "Export") is None  # ambiguous without its subject
+    assert taxonomy.resolve("ADMIN", "export").feature_id == 3
+    assert taxonomy.resolve_json('```json\n{"subject": "Core", "feature": "Export"}\n```').feature_id == 2
+    with pytest.raises(ValueError):
+        taxonomy.resolve_json('{"feature": "Export"}')
+
+
+def test_normalize_name():
+    assert normalize_name("  Search &  Filtering!! ") == "search and filtering"
+    assert normalize_name("Ｅｘｐｏｒｔ") == "export"